@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+mesh-bench.py
+
+Ingest benchmark for mesh-logger.py, without radios: replays a packet source
+through pubsub with meshreplay.ReplayInterface into the logger's own
+on_receive and LogWriter (text log, segments and reading store, written to a
+scratch directory), then reports
+
+- sustained packets/s: packets written / time until the writer drained
+- callback latency: time each packet spends in on_receive on the radio
+  thread (p50 / p99 / max)
+- dropped packets: callback found the writer queue full
+- lag: how far the replay fell behind its schedule
+
+Sources: meshtastic_log.json, meshtastic_log.txt, a segment directory, or
+synthetic:COUNT[:WORKERS] soil reports (default).
+
+Usage examples:
+  python mesh-bench.py
+  python mesh-bench.py synthetic:200000:32 --rate 2000 --burst 50
+  python mesh-bench.py meshtastic_log.json --repeat 500 --queue-max 1000
+  python mesh-bench.py meshlog --speed 3600 --no-store
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from pubsub import pub
+
+import meshreplay
+
+DEFAULT_SOURCE = "synthetic:20000:8"
+
+
+def load_logger():
+    """
+    mesh-logger.py has a dash in its name, so import it by path.
+    """
+    path = Path(__file__).resolve().parent / "mesh-logger.py"
+    spec = importlib.util.spec_from_file_location("mesh_logger", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Replay packets into mesh-logger.py and measure ingest headroom.")
+    ap.add_argument("source", nargs="?", default=DEFAULT_SOURCE,
+                    help=f"meshtastic_log.json/.txt, a segment directory, or synthetic:COUNT[:WORKERS] (default: {DEFAULT_SOURCE})")
+    ap.add_argument("--rate", type=float, default=0.0, help="Packets per second (default: 0 = as fast as possible)")
+    ap.add_argument("--burst", type=int, default=1, help="With --rate, packets published back to back (default: 1)")
+    ap.add_argument("--speed", type=float, default=None, help="Keep recorded gaps, sped up this many times")
+    ap.add_argument("--repeat", type=int, default=1, help="Play the source this many times (default: 1)")
+    ap.add_argument("--queue-max", type=int, default=None, help="Logger queue size (default: mesh-logger's QUEUE_MAX)")
+    ap.add_argument("--no-store", action="store_true", help="Don't decode soil reports into a reading store")
+    ap.add_argument("--keep", default=None, help="Write the logs here and keep them (default: a temp dir, removed)")
+    args = ap.parse_args()
+
+    try:
+        packets = meshreplay.load_source(args.source)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {args.source}: {e}", file=sys.stderr)
+        return 2
+    if not packets:
+        print(f"ERROR: no packets in {args.source}", file=sys.stderr)
+        return 2
+
+    logger = load_logger()
+    if args.queue_max:
+        logger.QUEUE_MAX = args.queue_max
+    out_dir = args.keep or tempfile.mkdtemp(prefix="mesh-bench-")
+    os.makedirs(out_dir, exist_ok=True)
+
+    writer = logger.LogWriter(
+        txt_path=os.path.join(out_dir, logger.LOG_TXT),
+        log_dir=os.path.join(out_dir, logger.LOG_DIR),
+        store_path=None if args.no_store else os.path.join(out_dir, "soil_live.sqlite3"),
+        echo=False,
+    )
+    logger.log_writer = writer
+    writer.start()
+    pub.subscribe(logger.on_receive, "meshtastic.receive")
+
+    total = len(packets) * max(1, args.repeat)
+    pace = f"{args.speed:g}x recorded" if args.speed else (f"{args.rate:g} pkt/s, bursts of {args.burst}" if args.rate else "max rate")
+    print(f"Replaying {total} packets from {args.source} ({pace})...")
+    t0 = time.monotonic()
+    iface = meshreplay.ReplayInterface(packets, args.rate, args.burst, args.speed, args.repeat)
+    try:
+        iface.wait()
+    except KeyboardInterrupt:
+        print("\nStopped early.")
+    finally:
+        iface.close()
+        t_replay = time.monotonic() - t0
+        writer.stop()
+        t_total = time.monotonic() - t0
+        pub.unsubscribe(logger.on_receive, "meshtastic.receive")
+        if not args.keep:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+    lat = sorted(iface.callback_ns)
+    us = lambda ns: f"{ns / 1000:.1f} us"
+    print(f"  published     {iface.published} packets in {t_replay:.2f}s ({iface.published / max(t_replay, 1e-9):.0f} pkt/s)")
+    print(f"  written       {writer.written} packets, drained after {t_total:.2f}s")
+    print(f"  sustained     {writer.written / max(t_total, 1e-9):.0f} pkt/s")
+    print(f"  callback      p50 {us(percentile(lat, 0.50))}  p99 {us(percentile(lat, 0.99))}  max {us(lat[-1] if lat else 0)}")
+    print(f"  dropped       {writer.dropped} (queue size {logger.QUEUE_MAX})")
+    if not args.no_store:
+        print(f"  readings      {writer.readings} soil readings stored")
+    if args.rate or args.speed:
+        print(f"  replay lag    {iface.behind_s * 1000:.1f} ms behind schedule at worst")
+    if args.keep:
+        print(f"  logs in       {out_dir}")
+    return 1 if writer.dropped else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,54 +1,302 @@
 #!/usr/bin/env python3
+"""
+mesh-logger.py
+
+Log every Meshtastic packet seen on the serial interface to
+meshtastic_log.txt (one line per packet, for reading) and to compact binary
+segments in meshlog/ (parsed fields only, see meshlog.py, for querying).
+Soil reports (Moist/Temp/Batt payloads) are also decoded into the local
+reading store soil_live.sqlite3 (soildata/livestore.py), which
+check_timestamp_gaps.py and graph-batteries.py accept in place of a
+ThingSpeak export. The writer also keeps the store's hour/day rollups
+current (every few minutes), which soil-api.py serves as they are.
+
+The pubsub callback only timestamps the packet and puts it on a queue.
+A writer thread drains the queue in batches into files that stay open,
+flushing (and fsync'ing) every few seconds, so bursts from many workers
+reporting at once don't stall the radio thread. The main thread just waits.
+
+Segments rotate by size and age (--segment-mb / --segment-hours); the text
+log rotates by size to meshtastic_log.txt.1 ... .N.
+"""
 import meshtastic
 import meshtastic.serial_interface
-from datetime import datetime
-import json
+import argparse
+import sys
+from pathlib import Path
+import os
+import queue
+import signal
+import sqlite3
+import threading
+import time
 from pubsub import pub
 
+import meshlog
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'Web-Interface'))
+from soildata.livestore import DEFAULT_STORE_PATH, LiveStore, parse_payload
+from soildata.rollup import update_rollups
+
+LOG_TXT = 'meshtastic_log.txt'
+LOG_DIR = 'meshlog'
+TXT_MAX_BYTES = 10 * 1024 * 1024   # rotate the text log past this size
+TXT_BACKUPS = 5                    # rotated text logs kept
+
+QUEUE_MAX = 100000        # packets buffered before the callback starts dropping
+BATCH_MAX = 500           # packets written per batch
+FLUSH_INTERVAL_S = 2.0    # flush + fsync at least this often
+ROLLUP_INTERVAL_S = 300.0  # fold new readings into the hour/day rollups this often
+
+
+def format_entry(time_ms, packet):
+    """
+    Build the text line, segment record and console line for one packet.
+    """
+    rec = meshlog.record_from_packet(packet, time_ms)
+    from_id = packet.get('fromId') or rec.from_id
+    to_id = packet.get('toId') or rec.to_id
+    timestamp = rec.time_str
+
+    text_line = f"{timestamp} | From: {from_id} | To: {to_id} | {rec.text}\n"
+    console_line = f"[{timestamp}] {from_id}: {rec.text}"
+    return text_line, rec, console_line
+
+
+def soil_readings(records):
+    """
+    Typed soil readings for the records that carry a report payload.
+    """
+    out = []
+    for rec in records:
+        reading = parse_payload(rec.text, rec.from_num, rec.time_ms // 1000, rec.packet_id)
+        if reading is not None:
+            out.append(reading)
+    return out
+
+
+def rotate_text_log(path, backups=TXT_BACKUPS):
+    """
+    meshtastic_log.txt -> .1 -> .2 ... dropping the oldest.
+    """
+    for i in range(backups - 1, 0, -1):
+        src = f"{path}.{i}"
+        if os.path.exists(src):
+            os.replace(src, f"{path}.{i + 1}")
+    if os.path.exists(path):
+        os.replace(path, f"{path}.1")
+
+
+class LogWriter(threading.Thread):
+    """
+    Background writer: drains queued packets into persistent file handles.
+    """
+
+    def __init__(self, txt_path=LOG_TXT, log_dir=LOG_DIR,
+                 segment_bytes=meshlog.DEFAULT_SEGMENT_BYTES,
+                 segment_seconds=meshlog.DEFAULT_SEGMENT_SECONDS,
+                 txt_max_bytes=TXT_MAX_BYTES, store_path=DEFAULT_STORE_PATH,
+                 batch_max=BATCH_MAX, flush_interval=FLUSH_INTERVAL_S,
+                 rollup_interval=ROLLUP_INTERVAL_S, echo=True):
+        super().__init__(name='mesh-log-writer', daemon=True)
+        self.txt_path = txt_path
+        self.txt_max_bytes = txt_max_bytes
+        self.segments = meshlog.SegmentLog(log_dir, segment_bytes, segment_seconds)
+        self.store_path = store_path    # None disables the reading store
+        self.readings = 0
+        self.batch_max = batch_max
+        self.flush_interval = flush_interval
+        self.rollup_interval = rollup_interval
+        self.echo = echo
+        self.queue = queue.Queue(maxsize=QUEUE_MAX)
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0         # packets a write error kept out of the logs
+        self.error = None       # set if the writer thread died
+        self._last_error = None
+        self._sentinel = object()
+
+    def submit(self, time_ms, packet):
+        """
+        Called from the pubsub callback; never blocks.
+        """
+        if self.error is not None:
+            self.dropped += 1
+            return
+        try:
+            self.queue.put_nowait((time_ms, packet))
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self, timeout=30.0):
+        """
+        Write everything still queued, close the files and wait for the thread.
+        Doesn't hang if the writer has died or stopped draining.
+        """
+        if not self.is_alive():
+            return
+        try:
+            self.queue.put(self._sentinel, timeout=timeout)
+        except queue.Full:
+            print("ERROR: log writer is not draining; queued packets were not written", file=sys.stderr)
+            return
+        self.join(timeout)
+
+    def _next_batch(self):
+        """
+        Block for the first item (up to flush_interval), then take whatever else is queued.
+        """
+        batch = []
+        try:
+            batch.append(self.queue.get(timeout=self.flush_interval))
+        except queue.Empty:
+            return batch
+        while len(batch) < self.batch_max:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _report(self, what, e, count):
+        """
+        Print a write error once (not once per batch while the disk stays full).
+        """
+        msg = f"{what}: {type(e).__name__}: {e}"
+        if msg != self._last_error:
+            print(f"ERROR: {msg} (logging continues)", file=sys.stderr)
+            self._last_error = msg
+        self.failed += count
+
+    def run(self):
+        try:
+            self._run()
+        except Exception as e:
+            # Can't even open the logs: make it visible, and have submit() stop queueing
+            self.error = e
+            print(f"ERROR: log writer stopped: {type(e).__name__}: {e}", file=sys.stderr)
+
+    def _run(self):
+        ftxt = open(self.txt_path, 'a', encoding='utf-8')
+        # sqlite connections belong to the thread that opened them
+        store = LiveStore(self.store_path) if self.store_path else None
+        try:
+            last_flush = 0.0
+            last_rollup = 0.0
+            dirty = False
+            stopping = False
+
+            while not stopping:
+                batch = self._next_batch()
+                if any(item is self._sentinel for item in batch):
+                    batch = [item for item in batch if item is not self._sentinel]
+                    stopping = True
+
+                if batch:
+                    entries = [format_entry(ts, pkt) for ts, pkt in batch]
+                    records = [e[1] for e in entries]
+                    try:
+                        ftxt.write(''.join(e[0] for e in entries))
+                        self.segments.append(records)
+                        self.written += len(entries)
+                        dirty = True
+
+                        if ftxt.tell() >= self.txt_max_bytes:
+                            ftxt.close()
+                            rotate_text_log(self.txt_path)
+                            ftxt = open(self.txt_path, 'a', encoding='utf-8')
+                    except OSError as e:    # disk full, file removed, ...
+                        self._report("writing the packet log", e, len(entries))
+                        if ftxt.closed:
+                            ftxt = open(self.txt_path, 'a', encoding='utf-8')
+                    if store is not None:
+                        try:
+                            self.readings += store.append(soil_readings(records))
+                        except (OSError, sqlite3.Error) as e:
+                            self._report("writing the reading store", e, 0)
+                    if self.echo:
+                        print('\n'.join(e[2] for e in entries))
+
+                now = time.monotonic()
+                if dirty and (stopping or now - last_flush >= self.flush_interval):
+                    try:
+                        ftxt.flush()
+                        os.fsync(ftxt.fileno())
+                        self.segments.flush()
+                    except OSError as e:
+                        self._report("flushing the packet log", e, 0)
+                    last_flush = now
+                    dirty = False
+                if store is not None and (stopping or now - last_rollup >= self.rollup_interval):
+                    try:
+                        update_rollups(store.conn)  # no write when nothing new came in
+                    except sqlite3.Error as e:
+                        self._report("updating the rollups", e, 0)
+                    last_rollup = now
+        finally:
+            ftxt.close()
+            self.segments.close()
+            if store is not None:
+                store.close()
+
+
+log_writer = None
+
+
 def on_receive(packet, interface):
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
-    # Extract message details
-    from_id = packet.get('fromId', 'Unknown')
-    to_id = packet.get('toId', 'Unknown')
-    message = ''
-    
-    if 'decoded' in packet:
-        decoded = packet['decoded']
-        if 'text' in decoded:
-            message = decoded['text']
-    
-    log_entry = {
-        'timestamp': timestamp,
-        'from': from_id,
-        'to': to_id,
-        'message': message,
-        'raw': str(packet)
-    }
-    
-    # Log to file
-    with open('meshtastic_log.txt', 'a', encoding='utf-8') as f:
-        f.write(f"{timestamp} | From: {from_id} | To: {to_id} | {message}\n")
-    
-    # Also log full JSON for detailed records
-    with open('meshtastic_log.json', 'a', encoding='utf-8') as f:
-        f.write(json.dumps(log_entry) + '\n')
-    
-    print(f"[{timestamp}] {from_id}: {message}")
-
-# Subscribe to receive messages
-pub.subscribe(on_receive, "meshtastic.receive")
-
-# Connect via serial/USB
-print("Connecting to Meshtastic device...")
-interface = meshtastic.serial_interface.SerialInterface()
-
-print("Listening for Meshtastic messages... Press Ctrl+C to stop")
-
-# Keep the script running
-try:
-    while True:
-        pass
-except KeyboardInterrupt:
-    print("\nStopping logger...")
-    interface.close()
\ No newline at end of file
+    log_writer.submit(int(time.time() * 1000), packet)
+
+
+def main():
+    global log_writer
+
+    ap = argparse.ArgumentParser(description="Log Meshtastic packets from the serial interface.")
+    ap.add_argument("--log-dir", default=LOG_DIR, help=f"Segment directory (default: {LOG_DIR})")
+    ap.add_argument("--segment-mb", type=float, default=meshlog.DEFAULT_SEGMENT_BYTES / 2**20,
+                    help="Start a new segment past this size (default: 8)")
+    ap.add_argument("--segment-hours", type=float, default=meshlog.DEFAULT_SEGMENT_SECONDS / 3600,
+                    help="Start a new segment after this many hours (default: 24)")
+    ap.add_argument("--store", default=DEFAULT_STORE_PATH,
+                    help=f"Soil reading store (default: {DEFAULT_STORE_PATH})")
+    ap.add_argument("--no-store", action="store_true", help="Don't decode soil reports into the store")
+    args = ap.parse_args()
+
+    log_writer = LogWriter(
+        log_dir=args.log_dir,
+        segment_bytes=int(args.segment_mb * 2**20),
+        segment_seconds=args.segment_hours * 3600,
+        store_path=None if args.no_store else args.store,
+    )
+    log_writer.start()
+
+    # Subscribe to receive messages
+    pub.subscribe(on_receive, "meshtastic.receive")
+
+    # Connect via serial/USB
+    print("Connecting to Meshtastic device...")
+    interface = meshtastic.serial_interface.SerialInterface()
+
+    print("Listening for Meshtastic messages... Press Ctrl+C to stop")
+
+    # Keep the script running without spinning the CPU.
+    # (Short waits so Ctrl+C is still delivered on Windows.)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())  # e.g. systemd stop on the gateway
+    try:
+        while not stop.wait(1.0):
+            if not log_writer.is_alive():
+                break   # the writer already printed why
+    except KeyboardInterrupt:
+        print("\nStopping logger...")
+    finally:
+        interface.close()
+        log_writer.stop()
+        if log_writer.dropped:
+            print(f"WARNING: dropped {log_writer.dropped} packets (queue full or writer stopped)")
+        if log_writer.failed:
+            print(f"WARNING: {log_writer.failed} packets could not be written (see errors above)")
+    return 1 if log_writer.error is not None else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
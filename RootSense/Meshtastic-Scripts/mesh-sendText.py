@@ -1,14 +1,112 @@
+#!/usr/bin/env python3
+"""
+mesh-sendText.py
+
+Send text messages (worker commands such as "@w1q Sleep 3600") over
+Meshtastic through the airtime-aware queue in meshsend.py: messages go out
+by priority, metered by estimated time on air, and are resent until acked.
+The script blocks until every message is delivered or has failed, then
+prints a delivery table. A direct message that only a neighbour's rebroadcast
+confirmed (no ack from the destination itself) is listed as "relayed" and
+counts as not delivered in the exit code.
+
+Batch files hold one message per line: "PRIORITY DEST TEXT [=> REPLY]"
+(see meshsend.parse_batch).
+
+Usage examples:
+  python mesh-sendText.py "hello mesh"
+  python mesh-sendText.py "@w1q Sleep 3600" --dest !a1b2c3d4 --expect "Status Sleeping" --port COM8
+  python mesh-sendText.py --batch commands.txt --preset LONG_FAST --duty 0.05
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+
 import meshtastic
 import meshtastic.serial_interface
+from pubsub import pub
+
+import meshsend
+
+
+def print_table(messages, t0):
+    print(f"{'State':<10}{'Dest':<12}{'Tries':>6}{'Airtime':>9}{'Done':>8}  Text / error")
+    for m in messages:
+        done = f"{m.done_at - t0:.1f}s" if m.done_at is not None else "-"
+        note = f"  ({m.error})" if m.error and m.state != "delivered" else ""
+        print(f"{m.state:<10}{m.dest:<12}{m.attempts:>6}{m.airtime_s:>8.2f}s{done:>8}  {m.text}{note}")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Send text messages over Meshtastic with airtime limiting and ack tracking.")
+    ap.add_argument("text", nargs="?", default=None, help="Message to send (or use --batch)")
+    ap.add_argument("--batch", default=None, help="File of messages, one 'PRIORITY DEST TEXT [=> REPLY]' per line")
+    ap.add_argument("--dest", default=meshsend.BROADCAST, help="Destination node id, e.g. !a1b2c3d4 (default: ^all)")
+    ap.add_argument("--priority", type=int, default=5, help="Lower goes first (default: 5)")
+    ap.add_argument("--expect", default=None, help="Wait for a reply from --dest containing this text")
+    ap.add_argument("--no-ack", action="store_true", help="Don't request acks (fire and forget)")
+    ap.add_argument("--channel", type=int, default=0, help="Channel index (default: 0)")
+    ap.add_argument("--port", default=None, help="Serial port, e.g. COM8 or /dev/ttyUSB0 (default: auto-detect)")
+    ap.add_argument("--preset", default=meshsend.DEFAULT_PRESET, choices=sorted(meshsend.PRESETS),
+                    help=f"Channel modem preset, for airtime estimates (default: {meshsend.DEFAULT_PRESET})")
+    ap.add_argument("--duty", type=float, default=meshsend.DEFAULT_DUTY,
+                    help=f"Share of airtime this sender may use (default: {meshsend.DEFAULT_DUTY})")
+    ap.add_argument("--burst", type=float, default=meshsend.DEFAULT_BURST_S,
+                    help=f"Seconds of airtime that may go out back to back (default: {meshsend.DEFAULT_BURST_S})")
+    ap.add_argument("--ack-timeout", type=float, default=meshsend.DEFAULT_ACK_TIMEOUT_S,
+                    help=f"Seconds to wait for an ack before resending (default: {meshsend.DEFAULT_ACK_TIMEOUT_S:.0f})")
+    ap.add_argument("--reply-timeout", type=float, default=meshsend.DEFAULT_REPLY_TIMEOUT_S,
+                    help=f"Seconds to wait for an --expect reply (default: {meshsend.DEFAULT_REPLY_TIMEOUT_S:.0f})")
+    ap.add_argument("--attempts", type=int, default=meshsend.DEFAULT_MAX_ATTEMPTS,
+                    help=f"Sends per message before giving up (default: {meshsend.DEFAULT_MAX_ATTEMPTS})")
+    args = ap.parse_args()
+
+    if args.batch:
+        try:
+            with open(args.batch, "r", encoding="utf-8") as f:
+                messages = meshsend.parse_batch(f)
+        except (OSError, ValueError) as e:
+            print(f"ERROR: {args.batch}: {e}", file=sys.stderr)
+            return 2
+    else:
+        messages = [meshsend.OutMessage(text=args.text or "hello mesh", dest=args.dest,
+                                        priority=args.priority, expect=args.expect)]
+    for m in messages:
+        m.want_ack = not args.no_ack
+        m.channel = args.channel
+        m.max_attempts = args.attempts
+    if not messages:
+        print("NOTE: nothing to send")
+        return 0
+
+    print("Connecting to Meshtastic device...")
+    interface = meshtastic.serial_interface.SerialInterface(devPath=args.port)
+    sender = meshsend.Sender(interface, args.preset, args.duty, args.burst, args.ack_timeout, args.reply_timeout)
+    pub.subscribe(sender.handle_routing, "meshtastic.receive.routing")
+    pub.subscribe(sender.handle_text, "meshtastic.receive.text")
+
+    total = sum(meshsend.message_airtime_s(m.text, args.preset) for m in messages)
+    print(f"Sending {len(messages)} message(s), ~{total:.1f}s airtime at {args.duty:.0%} duty ({args.preset})")
+    t0 = time.monotonic()
+    sender.start()
+    for m in messages:
+        sender.submit(m)
+    try:
+        # Short waits so Ctrl+C is still delivered on Windows
+        while not sender.wait(1.0):
+            pass
+    except KeyboardInterrupt:
+        print("\nStopped; unsent messages are left queued.")
+    finally:
+        sender.stop()
+        interface.close()
 
-# By default will try to find a meshtastic device,
-# otherwise provide a device path like /dev/ttyUSB0
-# interface = meshtastic.serial_interface.SerialInterface()
-# or something like this
-interface = meshtastic.serial_interface.SerialInterface(devPath='COM8')
+    print_table(messages, t0)
+    return 0 if all(m.state in ("delivered", "sent") for m in messages) else 1
 
-# or sendData to send binary data, see documentations for other options.
-interface.sendText("hello mesh")
 
-while True:
-    continue
\ No newline at end of file
+if __name__ == "__main__":
+    raise SystemExit(main())
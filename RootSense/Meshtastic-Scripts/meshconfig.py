@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+meshconfig.py
+
+Declarative Meshtastic node configuration: describe the settings a node
+should have in one file, and apply only what differs.
+
+    {
+      "config":        {"lora": {"region": "US", "hop_limit": 3}},
+      "module_config": {"serial": {"enabled": true, "mode": "TEXTMSG", "baud": "BAUD_38400"}},
+      "channels":      [{"index": 0, "name": "RootSense", "psk": "file:psk-secret.txt"}]
+    }
+
+- Field names are the protobuf names (as in `meshtastic --set lora.region US`);
+  enums are given by name. Unknown sections/fields are rejected before
+  anything is written.
+- channel psk: "base64:<key>", "file:<path>" (a file holding the base64 key,
+  relative to the desired-state file) or "none"/"default".
+- The device state is read once (config, module config and channels) into a
+  snapshot, diffed field by field, and every changed section and channel is
+  written inside one settings transaction, so the node commits (and
+  reboots) once instead of after every --set.
+- Snapshots are cached per node id (meshconfig_cache.json). With
+  --trust-cache SECONDS a node whose recent snapshot already matches is
+  reported UNCHANGED from the cache instead of its live config. The node
+  is still connected (that is how its id is learned, and the connect
+  downloads its config), so this saves the diff, not the download.
+  Channel keys and every key under config.security are cached as hashes
+  only.
+
+Usage examples:
+  python meshconfig.py rootsense-node.json --port COM14 --plan   (same settings as mesh-set-private-chan.bat)
+  python meshconfig.py rootsense-node.json --port COM14
+  python meshconfig.py rootsense-node.json --trust-cache 86400
+  python meshconfig.py --dump --port COM14 > current.json
+
+YAML desired-state files work too (PyYAML comes with the meshtastic package).
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List
+
+DEFAULT_CACHE_PATH = "meshconfig_cache.json"
+AREAS = ("config", "module_config")
+CHANNEL_KEYS = ("index", "role", "name", "psk", "uplink_enabled", "downlink_enabled")
+SECRET_SECTION = "security"   # config.security: private/public/admin keys
+
+
+@dataclass
+class Change:
+    area: str             # config, module_config or channels
+    section: str          # lora, serial, ... or the channel index as text
+    path: str             # dotted field path inside the section
+    old: Any
+    new: Any
+
+    def __str__(self) -> str:
+        where = f"channel[{self.section}]" if self.area == "channels" else self.section
+        if self.path == "psk" or (self.area == "config" and self.section == SECRET_SECTION):
+            return f"{where}.{self.path}: (key changed)"  # never print key material
+        return f"{where}.{self.path}: {self.old!r} -> {self.new!r}"
+
+
+# ---- Protobuf <-> plain values ----
+
+def _repeated(field) -> bool:
+    # protobuf >= 5 has is_repeated; `label` is gone in 7
+    flag = getattr(field, "is_repeated", None)
+    return flag if flag is not None else field.label == field.LABEL_REPEATED
+
+
+def message_to_dict(msg) -> Dict[str, Any]:
+    """
+    Every field of a protobuf message (defaults included), enums by name,
+    bytes as base64, so snapshots diff and cache as plain JSON.
+    """
+    out = {}
+    for field in msg.DESCRIPTOR.fields:
+        value = getattr(msg, field.name)
+        if _repeated(field):
+            if field.message_type is not None:
+                out[field.name] = [message_to_dict(v) for v in value]
+            else:
+                out[field.name] = [_scalar(field, v) for v in value]
+        elif field.message_type is not None:
+            out[field.name] = message_to_dict(value)
+        else:
+            out[field.name] = _scalar(field, value)
+    return out
+
+
+def _scalar(field, value):
+    if field.enum_type is not None:
+        named = field.enum_type.values_by_number.get(value)
+        return named.name if named is not None else value
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("ascii")
+    return value
+
+
+def set_fields(msg, values: Dict[str, Any], where: str = "") -> None:
+    """
+    Assign plain values (enums by name) onto a protobuf message, recursing into sub-messages.
+    """
+    fields = msg.DESCRIPTOR.fields_by_name
+    for name, value in values.items():
+        field = fields.get(name)
+        if field is None:
+            raise KeyError(f"{where}{name}: no such field")
+        if field.message_type is not None and not _repeated(field):
+            set_fields(getattr(msg, name), value, f"{where}{name}.")
+        elif _repeated(field):
+            target = getattr(msg, name)
+            del target[:]
+            target.extend(_to_proto(field, v) for v in value)
+        else:
+            setattr(msg, name, _to_proto(field, value))
+
+
+def _to_proto(field, value):
+    if field.enum_type is not None and isinstance(value, str):
+        named = field.enum_type.values_by_name.get(value)
+        if named is None:
+            raise ValueError(f"{field.name}: {value!r} is not one of {list(field.enum_type.values_by_name)}")
+        return named.number
+    if field.type == field.TYPE_BYTES and isinstance(value, str):
+        return base64.b64decode(value)
+    return value
+
+
+# ---- Desired state ----
+
+def load_desired(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+
+            desired = yaml.safe_load(f) or {}
+        else:
+            desired = json.load(f)
+    unknown = set(desired) - set(AREAS) - {"channels"}
+    if unknown:
+        raise ValueError(f"{path}: unknown top-level keys {sorted(unknown)}")
+
+    base = Path(path).resolve().parent
+    for ch in desired.get("channels", []):
+        if "index" not in ch:
+            raise ValueError(f"{path}: every channel needs an index")
+        bad = set(ch) - set(CHANNEL_KEYS)
+        if bad:
+            raise ValueError(f"{path}: channel {ch['index']}: unknown keys {sorted(bad)}")
+        if "psk" in ch:
+            ch["psk"] = resolve_psk(ch["psk"], base)
+    return desired
+
+
+def resolve_psk(value: str, base: Path) -> str:
+    """
+    Desired psk -> base64 of the raw key bytes (the snapshot's form).
+    """
+    v = str(value).strip()
+    if v.lower() == "none":
+        return base64.b64encode(b"\x00").decode("ascii")
+    if v.lower() == "default":
+        return base64.b64encode(b"\x01").decode("ascii")
+    if v.startswith("file:"):
+        v = "base64:" + (base / v[5:]).read_text(encoding="utf-8").strip()
+    if v.startswith("base64:"):
+        key = base64.b64decode(v[7:], validate=True)
+        return base64.b64encode(key).decode("ascii")
+    raise ValueError(f"psk must be base64:<key>, file:<path>, none or default (got {value!r})")
+
+
+# ---- Snapshot / diff ----
+
+def node_id(iface) -> str:
+    num = getattr(getattr(iface, "myInfo", None), "my_node_num", None)
+    return f"!{num:08x}" if isinstance(num, int) else "unknown"
+
+
+def snapshot(iface) -> Dict[str, Any]:
+    """
+    One read of the node's whole configuration as plain values.
+    """
+    local = iface.localNode
+    local.waitForConfig()
+    channels = []
+    for ch in local.channels or []:
+        entry = {"index": ch.index, "role": _scalar(ch.DESCRIPTOR.fields_by_name["role"], ch.role)}
+        entry.update(message_to_dict(ch.settings))
+        channels.append(entry)
+    return {
+        "node": node_id(iface),
+        "time": int(time.time()),
+        "config": message_to_dict(local.localConfig),
+        "module_config": message_to_dict(local.moduleConfig),
+        "channels": channels,
+    }
+
+
+def _diff_section(area: str, section: str, want: Dict[str, Any], have: Dict[str, Any], prefix: str = "") -> List[Change]:
+    out = []
+    for name, value in want.items():
+        if name not in have:
+            raise KeyError(f"{area}.{section}.{prefix}{name}: no such field")
+        cur = have[name]
+        if isinstance(value, dict) and isinstance(cur, dict):
+            out += _diff_section(area, section, value, cur, f"{prefix}{name}.")
+        elif value != cur:
+            out.append(Change(area, section, prefix + name, cur, value))
+    return out
+
+
+def diff(desired: Dict[str, Any], snap: Dict[str, Any]) -> List[Change]:
+    """
+    Minimal list of field changes that turn `snap` into `desired`.
+    """
+    changes: List[Change] = []
+    for area in AREAS:
+        for section, want in (desired.get(area) or {}).items():
+            have = snap[area].get(section)
+            if have is None:
+                raise KeyError(f"{area}.{section}: no such section")
+            changes += _diff_section(area, section, want, have)
+
+    by_index = {c["index"]: c for c in snap.get("channels", [])}
+    for want in desired.get("channels", []):
+        have = by_index.get(want["index"])
+        if have is None:
+            raise KeyError(f"channel index {want['index']} out of range ({len(by_index)} slots)")
+        fields = {k: v for k, v in want.items() if k != "index"}
+        changes += _diff_section("channels", str(want["index"]), fields, have)
+    return changes
+
+
+def apply_to_snapshot(snap: Dict[str, Any], changes: List[Change]) -> None:
+    """
+    Update a snapshot in place to what the node holds after `changes`.
+    """
+    for c in changes:
+        if c.area == "channels":
+            target = next(ch for ch in snap["channels"] if str(ch["index"]) == c.section)
+        else:
+            target = snap[c.area][c.section]
+        *parents, leaf = c.path.split(".")
+        for p in parents:
+            target = target[p]
+        target[leaf] = c.new
+    snap["time"] = int(time.time())
+
+
+# ---- Device writes ----
+
+def _nested(path: str, value: Any) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    cur = out
+    *parents, leaf = path.split(".")
+    for p in parents:
+        cur = cur.setdefault(p, {})
+    cur[leaf] = value
+    return out
+
+
+def apply_changes(iface, changes: List[Change]) -> int:
+    """
+    Write every changed section and channel inside one settings transaction.
+    Returns the number of write requests sent (sections + channels).
+    """
+    local = iface.localNode
+    sections: Dict[tuple, List[Change]] = {}
+    for c in changes:
+        sections.setdefault((c.area, c.section), []).append(c)
+
+    # Stage everything locally first; a bad value fails before the first write
+    for (area, section), items in sections.items():
+        if area == "channels":
+            ch = local.channels[int(section)]
+            for c in items:
+                if c.path == "role":
+                    ch.role = _to_proto(ch.DESCRIPTOR.fields_by_name["role"], c.new)
+                else:
+                    set_fields(ch.settings, _nested(c.path, c.new), f"channel[{section}].")
+        else:
+            msg = getattr(local.localConfig if area == "config" else local.moduleConfig, section)
+            for c in items:
+                set_fields(msg, _nested(c.path, c.new), f"{section}.")
+
+    local.beginSettingsTransaction()
+    for area, section in sections:
+        if area == "channels":
+            local.writeChannel(int(section))
+        else:
+            local.writeConfig(section)
+    local.commitSettingsTransaction()
+    return len(sections)
+
+
+# ---- Snapshot cache ----
+
+def _hash_key(value: Any) -> Any:
+    if isinstance(value, list):
+        return [_hash_key(v) for v in value]
+    if not isinstance(value, str) or value.startswith("sha256:"):
+        return value
+    return "sha256:" + hashlib.sha256(value.encode("ascii")).hexdigest()
+
+
+def redact_keys(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copy of a snapshot/desired state with channel keys and config.security
+    keys replaced by their hashes: the cache can still be diffed but holds
+    no key material. Every string in the security section is a bytes field
+    (base64), so all of them are hashed; the flags are left as they are.
+    """
+    out = dict(state)
+    out["channels"] = [
+        {**ch, "psk": _hash_key(ch["psk"])} if "psk" in ch else ch
+        for ch in state.get("channels", [])
+    ]
+    config = state.get("config") or {}
+    if SECRET_SECTION in config:
+        out["config"] = {**config, SECRET_SECTION: {k: _hash_key(v) for k, v in config[SECRET_SECTION].items()}}
+    return out
+
+
+def load_cache(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_cache(path: str, cache: Dict[str, Any]) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Apply a desired-state config file to a Meshtastic node, writing only what differs.")
+    ap.add_argument("desired", nargs="?", help="Desired-state file (.json, .yaml)")
+    ap.add_argument("--port", default=None, help="Serial port/device path (e.g., COM5, /dev/ttyUSB0).")
+    ap.add_argument("--plan", action="store_true", help="Show the changes without writing them.")
+    ap.add_argument("--dump", action="store_true", help="Print the node's current state as JSON and exit.")
+    ap.add_argument("--cache", default=DEFAULT_CACHE_PATH, help=f"Snapshot cache file (default: {DEFAULT_CACHE_PATH}).")
+    ap.add_argument("--trust-cache", type=float, default=0, metavar="SECONDS",
+                    help="Report a node UNCHANGED from its cached snapshot if that is this recent and matches "
+                         "(the node is still connected and its config downloaded).")
+    args = ap.parse_args()
+
+    if not args.dump and not args.desired:
+        ap.error("a desired-state file is required (or --dump)")
+    try:
+        desired = load_desired(args.desired) if args.desired else {}
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 2
+
+    import meshtastic.serial_interface
+
+    try:
+        iface = meshtastic.serial_interface.SerialInterface(devPath=args.port) if args.port \
+            else meshtastic.serial_interface.SerialInterface()
+    except Exception as e:
+        print(f"ERROR: Failed to connect to Meshtastic device: {e}", file=sys.stderr)
+        return 2
+
+    try:
+        node = node_id(iface)
+        cache = load_cache(args.cache)
+        cached = cache.get(node)
+        if (not args.dump and args.trust_cache and cached
+                and time.time() - cached.get("time", 0) <= args.trust_cache):
+            try:
+                if not diff(redact_keys(desired), cached):
+                    print(f"{node}: UNCHANGED (cached snapshot from {time.ctime(cached['time'])} matches)")
+                    return 0
+            except KeyError:
+                pass  # cache from other firmware; read the node
+
+        snap = snapshot(iface)
+        cache[node] = redact_keys(snap)
+        if args.dump:
+            save_cache(args.cache, cache)
+            print(json.dumps({k: snap[k] for k in AREAS + ("channels",)}, indent=2))
+            return 0
+
+        try:
+            changes = diff(desired, snap)
+        except KeyError as e:
+            print(f"ERROR: {e.args[0]}", file=sys.stderr)
+            return 2
+
+        if not changes:
+            save_cache(args.cache, cache)
+            print(f"{node}: UNCHANGED (device already matches)")
+            return 0
+        print(f"{node}: {len(changes)} change(s):")
+        for c in changes:
+            print("  ", c)
+        if args.plan:
+            save_cache(args.cache, cache)
+            return 0
+
+        try:
+            writes = apply_changes(iface, changes)
+        except (KeyError, ValueError) as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return 2
+        apply_to_snapshot(snap, changes)
+        cache[node] = redact_keys(snap)
+        save_cache(args.cache, cache)
+        print(f"{node}: CHANGED ({writes} write(s) in one transaction)")
+        return 0
+    finally:
+        try:
+            iface.close()
+        except Exception:
+            pass
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+meshlog.py
+
+Compact append-only packet log for mesh-logger.py, with rotation and a
+segment index.
+
+Each packet is stored as one length-prefixed binary record holding only the
+parsed fields (time, from, to, packet id, RSSI, SNR, hop limit, port, text),
+instead of a stringified copy of the whole packet. Records go into segment
+files that rotate by size and by age; index.json lists every segment with the
+time range it covers, so reading one day's traffic only opens the segments
+that overlap that day.
+
+Layout of a log directory:
+    index.json
+    seg-20260206T090530.bin
+    seg-20260207T000000.bin
+    ...
+
+Stdlib only. Dump a time range from the command line:
+    python meshlog.py meshlog --start 2026-02-06 --end 2026-02-07
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import struct
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Tuple
+
+MAGIC = b"RSML1\n"
+INDEX_NAME = "index.json"
+
+# length (bytes after this field), rx time ms, from, to, packet id,
+# rssi, snr, hop limit, port name length, text length
+_HEAD = struct.Struct("<IqIIIhfBBH")
+
+NO_RSSI = -32768
+NO_HOP = 255
+
+DEFAULT_SEGMENT_BYTES = 8 * 1024 * 1024
+DEFAULT_SEGMENT_SECONDS = 24 * 3600
+
+
+@dataclass
+class MeshRecord:
+    time_ms: int                 # gateway receive time, UTC epoch ms
+    from_num: int
+    to_num: int
+    packet_id: int = 0
+    rssi: Optional[int] = None
+    snr: Optional[float] = None
+    hop_limit: Optional[int] = None
+    port: str = ""
+    text: str = ""
+
+    @property
+    def from_id(self) -> str:
+        return f"!{self.from_num:08x}"
+
+    @property
+    def to_id(self) -> str:
+        return "^all" if self.to_num == 0xFFFFFFFF else f"!{self.to_num:08x}"
+
+    @property
+    def time_str(self) -> str:
+        return datetime.fromtimestamp(self.time_ms / 1000).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def record_from_packet(packet: dict, time_ms: Optional[int] = None) -> MeshRecord:
+    """
+    Pick the fields we keep out of a meshtastic packet dict.
+    """
+    decoded = packet.get("decoded") or {}
+    return MeshRecord(
+        time_ms=int(time.time() * 1000) if time_ms is None else time_ms,
+        from_num=int(packet.get("from") or 0) & 0xFFFFFFFF,
+        to_num=int(packet.get("to") or 0) & 0xFFFFFFFF,
+        packet_id=int(packet.get("id") or 0) & 0xFFFFFFFF,
+        rssi=packet.get("rxRssi"),
+        snr=packet.get("rxSnr"),
+        hop_limit=packet.get("hopLimit"),
+        port=str(decoded.get("portnum") or ""),
+        text=decoded.get("text") or "",
+    )
+
+
+def encode(rec: MeshRecord) -> bytes:
+    port = rec.port.encode("utf-8")[:255]
+    text = rec.text.encode("utf-8")[:65535]
+    head = _HEAD.pack(
+        _HEAD.size - 4 + len(port) + len(text),
+        rec.time_ms,
+        rec.from_num,
+        rec.to_num,
+        rec.packet_id,
+        NO_RSSI if rec.rssi is None else max(-32767, min(32767, int(rec.rssi))),
+        math.nan if rec.snr is None else float(rec.snr),
+        NO_HOP if rec.hop_limit is None else min(254, int(rec.hop_limit)),
+        len(port),
+        len(text),
+    )
+    return head + port + text
+
+
+def decode_stream(data: bytes) -> Iterator[MeshRecord]:
+    """
+    Records from a segment's bytes. A torn record at the end (power loss) is ignored.
+    """
+    pos = len(MAGIC) if data.startswith(MAGIC) else 0
+    end = len(data)
+    while pos + _HEAD.size <= end:
+        length, t, frm, to, pid, rssi, snr, hop, plen, tlen = _HEAD.unpack_from(data, pos)
+        nxt = pos + 4 + length
+        if nxt > end:
+            break
+        body = pos + _HEAD.size
+        yield MeshRecord(
+            time_ms=t,
+            from_num=frm,
+            to_num=to,
+            packet_id=pid,
+            rssi=None if rssi == NO_RSSI else rssi,
+            snr=None if math.isnan(snr) else round(snr, 2),
+            hop_limit=None if hop == NO_HOP else hop,
+            port=data[body:body + plen].decode("utf-8", "replace"),
+            text=data[body + plen:body + plen + tlen].decode("utf-8", "replace"),
+        )
+        pos = nxt
+
+
+@dataclass
+class SegmentInfo:
+    name: str
+    first_ms: Optional[int] = None
+    last_ms: Optional[int] = None
+    count: int = 0
+    size: int = 0        # file bytes the entry accounts for
+
+    def overlaps(self, start_ms: Optional[int], end_ms: Optional[int]) -> bool:
+        if self.first_ms is None:
+            return False
+        if start_ms is not None and self.last_ms < start_ms:
+            return False
+        if end_ms is not None and self.first_ms >= end_ms:
+            return False
+        return True
+
+
+def load_index(log_dir: str) -> List[SegmentInfo]:
+    try:
+        with open(os.path.join(log_dir, INDEX_NAME), "r", encoding="utf-8") as f:
+            return [SegmentInfo(**s) for s in json.load(f)["segments"]]
+    except FileNotFoundError:
+        return []
+
+
+def scan_segment(log_dir: str, name: str) -> SegmentInfo:
+    """
+    Index entry rebuilt from the segment's records.
+    """
+    with open(os.path.join(log_dir, name), "rb") as f:
+        data = f.read()
+    seg = SegmentInfo(name=name, size=len(data))
+    for rec in decode_stream(data):
+        seg.first_ms = rec.time_ms if seg.first_ms is None else min(seg.first_ms, rec.time_ms)
+        seg.last_ms = rec.time_ms if seg.last_ms is None else max(seg.last_ms, rec.time_ms)
+        seg.count += 1
+    return seg
+
+
+def repair_index(log_dir: str, segments: List[SegmentInfo]) -> Tuple[List[SegmentInfo], bool]:
+    """
+    The index is only saved on flush, so after a crash the last segment's
+    entry can be missing records (or all of them: first_ms None), and a
+    segment created just before the crash may not be listed at all.
+    Rescan every segment whose file size doesn't match its entry, add
+    unlisted ones, drop entries whose file is gone. Returns (segments, changed).
+    """
+    out, changed = [], False
+    listed = set()
+    for seg in segments:
+        listed.add(seg.name)
+        try:
+            size = os.path.getsize(os.path.join(log_dir, seg.name))
+        except FileNotFoundError:
+            changed = True
+            continue
+        if seg.first_ms is None or size != seg.size:
+            seg = scan_segment(log_dir, seg.name)
+            changed = True
+        out.append(seg)
+    for name in sorted(os.listdir(log_dir)):
+        if name.startswith("seg-") and name.endswith(".bin") and name not in listed:
+            out.append(scan_segment(log_dir, name))
+            changed = True
+    if changed:
+        out.sort(key=lambda s: s.name)
+    return out, changed
+
+
+def save_index(log_dir: str, segments: List[SegmentInfo]) -> None:
+    path = os.path.join(log_dir, INDEX_NAME)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"segments": [asdict(s) for s in segments]}, f, indent=1)
+    os.replace(tmp, path)
+
+
+class SegmentLog:
+    """
+    Appender for one log directory. Not thread-safe: use from the writer thread only.
+    """
+
+    def __init__(
+        self,
+        log_dir: str,
+        max_bytes: int = DEFAULT_SEGMENT_BYTES,
+        max_age_s: float = DEFAULT_SEGMENT_SECONDS,
+    ):
+        self.log_dir = log_dir
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        os.makedirs(log_dir, exist_ok=True)
+        self.segments, changed = repair_index(log_dir, load_index(log_dir))
+        if changed:
+            save_index(log_dir, self.segments)
+        self._f = None
+        self._opened_at = 0.0
+        self._size = 0
+
+    @property
+    def current(self) -> Optional[SegmentInfo]:
+        return self.segments[-1] if self._f is not None else None
+
+    def _open_new(self, time_ms: int) -> None:
+        self._close_file()
+        stamp = datetime.fromtimestamp(time_ms / 1000, timezone.utc).strftime("%Y%m%dT%H%M%S")
+        name = f"seg-{stamp}.bin"
+        n = 1
+        while os.path.exists(os.path.join(self.log_dir, name)):
+            name = f"seg-{stamp}-{n}.bin"
+            n += 1
+        self._f = open(os.path.join(self.log_dir, name), "ab")
+        self._f.write(MAGIC)
+        self._size = len(MAGIC)
+        self._opened_at = time.monotonic()
+        self.segments.append(SegmentInfo(name=name, size=self._size))
+        save_index(self.log_dir, self.segments)
+
+    def _close_file(self) -> None:
+        if self._f is not None:
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self._f.close()
+            self._f = None
+
+    def _needs_rotation(self) -> bool:
+        return (
+            self._f is None
+            or self._size >= self.max_bytes
+            or time.monotonic() - self._opened_at >= self.max_age_s
+        )
+
+    def append(self, records: List[MeshRecord]) -> None:
+        """
+        Append a batch (one write call per batch).
+        """
+        if not records:
+            return
+        if self._needs_rotation():
+            self._open_new(records[0].time_ms)
+
+        blob = b"".join(encode(r) for r in records)
+        self._f.write(blob)
+        self._size += len(blob)
+
+        seg = self.segments[-1]
+        times = [r.time_ms for r in records]
+        seg.first_ms = min(times) if seg.first_ms is None else min(seg.first_ms, min(times))
+        seg.last_ms = max(times) if seg.last_ms is None else max(seg.last_ms, max(times))
+        seg.count += len(records)
+        seg.size = self._size
+
+    def flush(self, fsync: bool = True) -> None:
+        """
+        Push written records to disk and persist the index.
+        """
+        if self._f is not None:
+            self._f.flush()
+            if fsync:
+                os.fsync(self._f.fileno())
+        save_index(self.log_dir, self.segments)
+
+    def close(self) -> None:
+        self._close_file()
+        save_index(self.log_dir, self.segments)
+
+
+def read_range(log_dir: str, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> Iterator[MeshRecord]:
+    """
+    Records with start_ms <= time_ms < end_ms, reading only overlapping segments.
+    Entries not up to date with their file (the live segment, or a crash)
+    are rescanned in memory; the writer owns index.json.
+    """
+    if not os.path.isdir(log_dir):
+        return
+    segments, _ = repair_index(log_dir, load_index(log_dir))
+    for seg in segments:
+        if not seg.overlaps(start_ms, end_ms):
+            continue
+        with open(os.path.join(log_dir, seg.name), "rb") as f:
+            data = f.read()
+        for rec in decode_stream(data):
+            if start_ms is not None and rec.time_ms < start_ms:
+                continue
+            if end_ms is not None and rec.time_ms >= end_ms:
+                continue
+            yield rec
+
+
+def _parse_local_ms(s: Optional[str]) -> Optional[int]:
+    if not s:
+        return None
+    return int(datetime.fromisoformat(s).timestamp() * 1000)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Print packets from a mesh-logger segment directory.")
+    ap.add_argument("log_dir", help="Directory with index.json and seg-*.bin files")
+    ap.add_argument("--start", default=None, help="Local start time (ISO), e.g. 2026-02-06 or 2026-02-06T09:00")
+    ap.add_argument("--end", default=None, help="Local end time (ISO, exclusive)")
+    ap.add_argument("--json", action="store_true", help="Print JSON lines instead of text")
+    args = ap.parse_args()
+
+    for rec in read_range(args.log_dir, _parse_local_ms(args.start), _parse_local_ms(args.end)):
+        if args.json:
+            print(json.dumps(asdict(rec)))
+        else:
+            print(f"{rec.time_str} | From: {rec.from_id} | To: {rec.to_id} | {rec.text}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,334 @@
+"""
+meshreplay.py
+
+Stand-in for meshtastic.serial_interface.SerialInterface that replays
+recorded or synthetic packets through pubsub, for running mesh-logger.py's
+on_receive and the senders (meshsend.py) without radios attached.
+
+Packet sources (each yields (time_ms, packet dict) in recorded order):
+- json_log_packets:    meshtastic_log.json (one JSON object per line, as
+                       written by the old logger)
+- text_log_packets:    meshtastic_log.txt ("time | From: | To: | text")
+- segment_packets:     a mesh-logger segment directory (meshlog.read_range)
+- synthetic_packets:   soil reports ("@w1r<TAB>Moist,...<TAB>Temp,...<TAB>Batt,4.12")
+                       from a given number of fake workers
+
+ReplayInterface publishes them on the same topics the real interface uses
+("meshtastic.receive.text", ".telemetry", ...), so subscribers of
+"meshtastic.receive" see every packet. Pacing:
+- speed:  keep the recorded gaps, divided by speed (60 = an hour per minute)
+- rate:   packets per second, ignoring recorded times (0 = as fast as possible)
+- burst:  with rate, publish this many back to back, then pause burst/rate
+- repeat: play the source this many times (packet ids renumbered after the first)
+
+pub.sendMessage runs every subscriber on the replay thread, the way the
+radio thread does; how long each call takes is kept in callback_ns.
+
+sendText()/sendData() record what was sent and, with auto_ack, answer with a
+routing packet after ack_delay_s (ack_loss drops that fraction of acks), so
+a Sender sees the same ack traffic as on air.
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pubsub import pub
+
+import meshlog
+
+BROADCAST_NUM = 0xFFFFFFFF
+GATEWAY_NUM = 0x699AE830    # the node the replay pretends to be
+
+# portnum -> pubsub subtopic, as the meshtastic library names them
+TOPICS: Dict[str, str] = {
+    "TEXT_MESSAGE_APP": "text",
+    "POSITION_APP": "position",
+    "NODEINFO_APP": "user",
+    "ROUTING_APP": "routing",
+    "TELEMETRY_APP": "telemetry",
+    "ADMIN_APP": "admin",
+    "TRACEROUTE_APP": "traceroute",
+    "NEIGHBORINFO_APP": "neighborinfo",
+}
+
+Timed = Tuple[int, dict]     # (recorded time ms, packet)
+
+
+def node_num(node_id: str) -> int:
+    if node_id == "^all":
+        return BROADCAST_NUM
+    return int(node_id.lstrip("!"), 16) & 0xFFFFFFFF
+
+
+def topic_for(packet: dict) -> str:
+    port = (packet.get("decoded") or {}).get("portnum") or ""
+    if port in TOPICS:
+        return f"meshtastic.receive.{TOPICS[port]}"
+    return f"meshtastic.receive.data.{port}" if port else "meshtastic.receive"
+
+
+def make_packet(from_num: int, to_num: int, text: str = "", port: str = "TEXT_MESSAGE_APP",
+                packet_id: int = 0, rssi: Optional[int] = None, snr: Optional[float] = None,
+                hop_limit: Optional[int] = None) -> dict:
+    """
+    A packet dict shaped like the ones meshtastic hands to pubsub.
+    """
+    decoded = {"portnum": port}
+    if port == "TEXT_MESSAGE_APP":
+        decoded["payload"] = text.encode("utf-8")
+        decoded["text"] = text
+    packet = {
+        "from": from_num,
+        "to": to_num,
+        "decoded": decoded,
+        "id": packet_id,
+        "fromId": f"!{from_num:08x}",
+        "toId": "^all" if to_num == BROADCAST_NUM else f"!{to_num:08x}",
+    }
+    for key, value in (("rxRssi", rssi), ("rxSnr", snr), ("hopLimit", hop_limit)):
+        if value is not None:
+            packet[key] = value
+    return packet
+
+
+def _local_ms(stamp: str) -> int:
+    return int(datetime.strptime(stamp, "%Y-%m-%d %H:%M:%S").timestamp() * 1000)
+
+
+# ---- Sources ----
+
+# The logged "raw" field is a repr() whose nested protobufs aren't literals,
+# so the few fields we need are picked out with patterns.
+_RAW_INT = {k: re.compile(rf"'{k}': (-?\d+)") for k in ("from", "to", "id", "rxRssi", "hopLimit")}
+_RAW_SNR = re.compile(r"'rxSnr': (-?[\d.]+)")
+_RAW_PORT = re.compile(r"'portnum': '(\w+)'")
+
+
+def json_log_packets(path: str) -> Iterator[Timed]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+                t = _local_ms(entry["timestamp"])
+            except (ValueError, KeyError):
+                continue
+            raw = str(entry.get("raw") or "")
+            nums = {}
+            for key, pattern in _RAW_INT.items():
+                found = pattern.findall(raw)
+                if found:
+                    nums[key] = int(found[-1] if key == "id" else found[0])  # packet id follows decoded{}
+            snr = _RAW_SNR.search(raw)
+            port = _RAW_PORT.search(raw)
+            yield t, make_packet(
+                nums.get("from", node_num(entry.get("from") or "!0")),
+                nums.get("to", node_num(entry.get("to") or "^all")),
+                entry.get("message") or "",
+                port.group(1) if port else "TEXT_MESSAGE_APP",
+                nums.get("id", 0),
+                nums.get("rxRssi"),
+                float(snr.group(1)) if snr else None,
+                nums.get("hopLimit"),
+            )
+
+
+_TEXT_LINE = re.compile(r"^\s*(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d) \| From: (\S+) \| To: (\S+) \| ?(.*)$")
+
+
+def text_log_packets(path: str) -> Iterator[Timed]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            m = _TEXT_LINE.match(line.rstrip("\n"))
+            if m is None:
+                continue
+            try:
+                yield _local_ms(m.group(1)), make_packet(node_num(m.group(2)), node_num(m.group(3)), m.group(4))
+            except ValueError:
+                continue
+
+
+def segment_packets(log_dir: str, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> Iterator[Timed]:
+    for rec in meshlog.read_range(log_dir, start_ms, end_ms):
+        yield rec.time_ms, make_packet(rec.from_num, rec.to_num, rec.text, rec.port or "TEXT_MESSAGE_APP",
+                                       rec.packet_id, rec.rssi, rec.snr, rec.hop_limit)
+
+
+def synthetic_packets(count: int, workers: int = 8, interval_s: float = 60.0, seed: int = 0) -> Iterator[Timed]:
+    """
+    `count` soil reports, workers taking turns, one report per worker every
+    interval_s (recorded time), with 8-depth moisture/temperature and a
+    slowly draining battery.
+    """
+    rng = random.Random(seed)
+    nodes = [0x43000000 + n for n in range(1, workers + 1)]
+    t0 = int(time.time() * 1000)
+    for i in range(count):
+        w = i % workers
+        moist = ",".join(f"{rng.uniform(1, 30):+07.2f}" for _ in range(8))
+        temp = ",".join(f"{rng.uniform(5, 30):+07.2f}" for _ in range(8))
+        batt = 4.2 - 0.0001 * (i // workers)
+        text = f"@w{w + 1}r\tMoist,{moist}\tTemp,{temp}\tBatt,{batt:.2f}"
+        t = t0 + int((i // workers) * interval_s * 1000 + w * interval_s * 1000 / workers)
+        yield t, make_packet(nodes[w], BROADCAST_NUM, text, packet_id=i + 1,
+                             rssi=rng.randint(-120, -40), snr=round(rng.uniform(-15, 10), 2), hop_limit=3)
+
+
+def load_source(spec: str) -> List[Timed]:
+    """
+    Source from a command-line spec: a .json log, a .txt log, a segment
+    directory, or "synthetic:COUNT[:WORKERS]".
+    """
+    if spec.startswith("synthetic:"):
+        parts = spec.split(":")
+        workers = int(parts[2]) if len(parts) > 2 else 8
+        return list(synthetic_packets(int(parts[1]), workers))
+    if spec.endswith(".json") or spec.endswith(".jsonl"):
+        return list(json_log_packets(spec))
+    if spec.endswith(".txt"):
+        return list(text_log_packets(spec))
+    return list(segment_packets(spec))
+
+
+# ---- Interface ----
+
+@dataclass
+class SentPacket:
+    id: int
+    to: str
+    text: str
+    want_ack: bool
+    channel: int
+
+
+class ReplayInterface:
+    """
+    Publishes `packets` from a background thread, like a SerialInterface
+    receiving them over the air. wait() blocks until the replay is done.
+    """
+
+    def __init__(
+        self,
+        packets: Iterable[Timed],
+        rate: float = 0.0,
+        burst: int = 1,
+        speed: Optional[float] = None,
+        repeat: int = 1,
+        auto_ack: bool = True,
+        ack_delay_s: float = 0.5,
+        ack_loss: float = 0.0,
+        seed: int = 0,
+        devPath: Optional[str] = None,
+        start: bool = True,
+    ):
+        self.devPath = devPath
+        self.packets = list(packets)
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.speed = speed
+        self.repeat = max(1, repeat)
+        self.auto_ack = auto_ack
+        self.ack_delay_s = ack_delay_s
+        self.ack_loss = ack_loss
+        self.rng = random.Random(seed)
+        self.published = 0
+        self.callback_ns: List[int] = []     # duration of each pub.sendMessage
+        self.behind_s = 0.0                  # worst lag behind the schedule
+        self.sent: List[SentPacket] = []
+        self._ids = itertools.count(0x10000000)
+        self._closed = threading.Event()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="mesh-replay", daemon=True)
+        self.elapsed_s = 0.0
+        if start:
+            self.start()
+
+    def start(self) -> None:
+        pub.sendMessage("meshtastic.connection.established", interface=self)
+        self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def getMyNodeInfo(self) -> dict:
+        return {"num": GATEWAY_NUM, "user": {"id": f"!{GATEWAY_NUM:08x}"}}
+
+    def _publish(self, packet: dict) -> None:
+        t0 = time.perf_counter_ns()
+        pub.sendMessage(topic_for(packet), packet=packet, interface=self)
+        self.callback_ns.append(time.perf_counter_ns() - t0)
+        self.published += 1
+
+    def _schedule(self) -> Iterator[Tuple[float, dict]]:
+        """
+        (seconds after start, packet) for every packet to publish.
+        """
+        n, offset = 0, 0.0
+        for loop in range(self.repeat):
+            base = self.packets[0][0] if self.packets else 0
+            span = 0.0
+            for t_ms, packet in self.packets:
+                if loop:
+                    packet = dict(packet, id=next(self._ids))
+                if self.speed:
+                    span = (t_ms - base) / 1000 / self.speed
+                    at = offset + span
+                elif self.rate > 0:
+                    at = (n // self.burst) * self.burst / self.rate
+                else:
+                    at = 0.0
+                n += 1
+                yield at, packet
+            offset += span
+
+    def _run(self) -> None:
+        t0 = time.monotonic()
+        try:
+            for at, packet in self._schedule():
+                delay = at - (time.monotonic() - t0)
+                if delay > 0:
+                    if self._closed.wait(delay):
+                        break
+                else:
+                    self.behind_s = max(self.behind_s, -delay)
+                    if self._closed.is_set():
+                        break
+                self._publish(packet)
+        finally:
+            self.elapsed_s = time.monotonic() - t0
+            self._done.set()
+
+    # ---- Sending (for meshsend.Sender and friends) ----
+
+    def sendText(self, text: str, destinationId="^all", wantAck: bool = False, wantResponse: bool = False,
+                 onResponse=None, channelIndex: int = 0, **kw):
+        return self.sendData(text.encode("utf-8"), destinationId, wantAck=wantAck, channelIndex=channelIndex)
+
+    def sendData(self, data: bytes, destinationId="^all", portNum=None, wantAck: bool = False,
+                 channelIndex: int = 0, **kw):
+        dest = destinationId if isinstance(destinationId, str) else f"!{int(destinationId):08x}"
+        pkt = SentPacket(next(self._ids), dest, data.decode("utf-8", "replace"), wantAck, channelIndex)
+        self.sent.append(pkt)
+        if wantAck and self.auto_ack and self.rng.random() >= self.ack_loss:
+            ack = make_packet(GATEWAY_NUM if dest == "^all" else node_num(dest), GATEWAY_NUM, port="ROUTING_APP")
+            ack["decoded"].update(requestId=pkt.id, routing={"errorReason": "NONE"})
+            timer = threading.Timer(self.ack_delay_s, pub.sendMessage, (topic_for(ack),), {"packet": ack, "interface": self})
+            timer.daemon = True
+            timer.start()
+        return pkt
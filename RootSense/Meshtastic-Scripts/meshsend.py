@@ -0,0 +1,392 @@
+"""
+meshsend.py
+
+Airtime-aware send queue for pushing text commands ("@w1q Sleep 3600",
+"@wtq Reset", ...) to many RootSense workers without flooding the LoRa
+channel.
+
+- Messages go into a priority queue (lower number = sooner, FIFO within a
+  priority).
+- A token bucket meters airtime rather than packets: each send costs its
+  estimated time on air for the channel's modem preset (Semtech LoRa airtime
+  formula), and the bucket refills at --duty seconds of airtime per second.
+- Messages sent with want_ack are tracked by packet id. A routing reply
+  with no error from the destination marks them delivered. A NAK or no
+  answer within ack_timeout_s puts them back on the queue until
+  max_attempts, with exponential backoff.
+- The local node also emits an ack when it hears a neighbour rebroadcast
+  the packet (an implicit ack). For a broadcast that is all there is, but
+  for a direct message it only means "relayed": the message stays pending
+  until the destination acks it, and if that never happens it ends as
+  "relayed" rather than "delivered".
+- A message can also name the reply it expects from the worker (e.g.
+  "Status Sleeping"). Once acked, it stays open until a text from the
+  destination contains that reply, or reply_timeout_s runs out. The command
+  is not resent then, because it already arrived.
+- Everything waits on one condition variable: no polling loops.
+
+The interface only needs sendText(text, destinationId=, wantAck=, channelIndex=)
+returning something with an `id`. Routing packets (pubsub topic
+"meshtastic.receive.routing") go to handle_routing() and text packets
+("meshtastic.receive.text") to handle_text(). A stub interface works just as
+well as a SerialInterface.
+
+Stdlib only.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+BROADCAST = "^all"
+
+# Meshtastic modem presets: (spreading factor, bandwidth Hz, coding rate denominator 4/x)
+PRESETS: Dict[str, Tuple[int, float, int]] = {
+    "SHORT_TURBO": (7, 500e3, 5),
+    "SHORT_FAST": (7, 250e3, 5),
+    "SHORT_SLOW": (8, 250e3, 5),
+    "MEDIUM_FAST": (9, 250e3, 5),
+    "MEDIUM_SLOW": (10, 250e3, 5),
+    "LONG_FAST": (11, 250e3, 5),
+    "LONG_MODERATE": (11, 125e3, 8),
+    "LONG_SLOW": (12, 125e3, 8),
+    "VERY_LONG_SLOW": (12, 62.5e3, 8),
+}
+DEFAULT_PRESET = "LONG_FAST"
+PREAMBLE_SYMBOLS = 16           # Meshtastic uses a 16-symbol preamble
+PACKET_OVERHEAD_BYTES = 32      # 16-byte mesh header + Data protobuf framing (approx.)
+
+DEFAULT_DUTY = 0.10             # share of airtime this sender may use
+DEFAULT_BURST_S = 5.0           # airtime that may go out back to back
+DEFAULT_ACK_TIMEOUT_S = 45.0
+DEFAULT_REPLY_TIMEOUT_S = 120.0
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_BACKOFF_S = 10.0
+
+
+def airtime_s(payload_bytes: int, preset: str = DEFAULT_PRESET) -> float:
+    """
+    Time on air of one LoRa packet (explicit header, CRC on).
+    """
+    sf, bw, cr = PRESETS[preset]
+    t_sym = (2 ** sf) / bw
+    de = 1 if t_sym > 0.016 else 0    # low data rate optimisation
+    n_payload = 8 + max(math.ceil((8 * payload_bytes - 4 * sf + 28 + 16) / (4 * (sf - 2 * de))) * cr, 0)
+    return (PREAMBLE_SYMBOLS + 4.25 + n_payload) * t_sym
+
+
+def message_airtime_s(text: str, preset: str = DEFAULT_PRESET) -> float:
+    return airtime_s(len(text.encode("utf-8")) + PACKET_OVERHEAD_BYTES, preset)
+
+
+class AirtimeBucket:
+    """
+    Token bucket in seconds of airtime. Not thread-safe on its own; the
+    Sender calls it under its lock.
+    """
+
+    def __init__(self, duty: float = DEFAULT_DUTY, burst_s: float = DEFAULT_BURST_S, clock=time.monotonic):
+        self.rate = duty
+        self.capacity = burst_s
+        self.tokens = burst_s
+        self.clock = clock
+        self.stamp = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait_time(self, cost: float) -> float:
+        """
+        Seconds until `cost` can be spent (0 when it can go now). A packet
+        costing more than the whole bucket waits for a full bucket.
+        """
+        self._refill()
+        need = min(cost, self.capacity) - self.tokens
+        return max(need / self.rate, 0.0) if self.rate > 0 else (0.0 if need <= 0 else math.inf)
+
+    def spend(self, cost: float) -> None:
+        self._refill()
+        self.tokens -= min(cost, self.capacity)
+
+
+@dataclass
+class OutMessage:
+    text: str
+    dest: str = BROADCAST
+    priority: int = 5
+    want_ack: bool = True
+    channel: int = 0
+    expect: Optional[str] = None   # reply text to wait for after the ack
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    attempts: int = 0
+    state: str = "queued"          # queued, sent, relayed, acked, delivered, failed
+    packet_id: Optional[int] = None
+    error: str = ""
+    airtime_s: float = 0.0
+    sent_at: List[float] = field(default_factory=list)
+    done_at: Optional[float] = None
+
+
+class Sender:
+    """
+    Priority queue + airtime bucket + ack tracking around one interface.
+    Call start(), submit() messages, then wait() for them to finish.
+    """
+
+    def __init__(
+        self,
+        iface,
+        preset: str = DEFAULT_PRESET,
+        duty: float = DEFAULT_DUTY,
+        burst_s: float = DEFAULT_BURST_S,
+        ack_timeout_s: float = DEFAULT_ACK_TIMEOUT_S,
+        reply_timeout_s: float = DEFAULT_REPLY_TIMEOUT_S,
+        clock=time.monotonic,
+    ):
+        if preset not in PRESETS:
+            raise ValueError(f"preset must be one of {sorted(PRESETS)}")
+        self.iface = iface
+        self.preset = preset
+        self.ack_timeout_s = ack_timeout_s
+        self.reply_timeout_s = reply_timeout_s
+        self.clock = clock
+        self.bucket = AirtimeBucket(duty, burst_s, clock)
+        self.cond = threading.Condition()
+        self.heap: List[Tuple[int, float, int, OutMessage]] = []   # (priority, not_before, seq, msg)
+        self.pending: Dict[int, Tuple[float, OutMessage]] = {}     # packet id -> (ack deadline, msg)
+        self.awaiting: List[Tuple[float, OutMessage]] = []         # acked, waiting for msg.expect
+        self.messages: List[OutMessage] = []
+        self._seq = itertools.count()
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- Producer side ----
+
+    def submit(self, msg: OutMessage) -> OutMessage:
+        msg.airtime_s = message_airtime_s(msg.text, self.preset)
+        with self.cond:
+            self.messages.append(msg)
+            heapq.heappush(self.heap, (msg.priority, 0.0, next(self._seq), msg))
+            self.cond.notify_all()
+        return msg
+
+    def send(self, text: str, dest: str = BROADCAST, priority: int = 5, want_ack: bool = True, **kw) -> OutMessage:
+        return self.submit(OutMessage(text=text, dest=dest, priority=priority, want_ack=want_ack, **kw))
+
+    def local_node_num(self) -> Optional[int]:
+        """
+        Node number of the radio we send through (None if the interface
+        doesn't say, e.g. a stub).
+        """
+        num = getattr(getattr(self.iface, "localNode", None), "nodeNum", None)
+        if not isinstance(num, int):
+            num = getattr(getattr(self.iface, "myInfo", None), "my_node_num", None)
+        return num if isinstance(num, int) else None
+
+    def handle_routing(self, packet: dict, interface=None) -> None:
+        """
+        pubsub "meshtastic.receive.routing" handler: settle the message the
+        routing reply refers to (errorReason NONE = delivered). An ack from
+        our own node for a direct message is only the implicit ack for a
+        neighbour's rebroadcast: the message is marked relayed and stays
+        pending.
+        """
+        decoded = packet.get("decoded") or {}
+        request_id = decoded.get("requestId")
+        reason = (decoded.get("routing") or {}).get("errorReason", "NONE")
+        local = self.local_node_num()
+        with self.cond:
+            entry = self.pending.get(request_id)
+            if entry is None:
+                return
+            msg = entry[1]
+            if (reason == "NONE" and msg.dest != BROADCAST
+                    and local is not None and packet.get("from") == local):
+                msg.state = "relayed"
+                self.cond.notify_all()
+                return
+            del self.pending[request_id]
+            if reason != "NONE":
+                self._retry(msg, f"NAK {reason}")
+            elif msg.expect:
+                msg.state = "acked"
+                self.awaiting.append((self.clock() + self.reply_timeout_s, msg))
+            else:
+                self._finish(msg, "delivered")
+            self.cond.notify_all()
+
+    def handle_text(self, packet: dict, interface=None) -> None:
+        """
+        pubsub "meshtastic.receive.text" handler: close the oldest message to
+        that node still waiting for a reply the text contains.
+        """
+        text = (packet.get("decoded") or {}).get("text") or ""
+        sender = packet.get("fromId")
+        with self.cond:
+            for i, (_, msg) in enumerate(self.awaiting):
+                if msg.dest in (sender, BROADCAST) and msg.expect in text:
+                    del self.awaiting[i]
+                    self._finish(msg, "delivered")
+                    self.cond.notify_all()
+                    return
+
+    # ---- Worker ----
+
+    def start(self) -> "Sender":
+        self._thread = threading.Thread(target=self._run, name="mesh-sender", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        with self.cond:
+            self._stop = True
+            self.cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until every submitted message is delivered or failed.
+        """
+        deadline = None if timeout is None else self.clock() + timeout
+        with self.cond:
+            while self.heap or self.pending or self.awaiting:
+                left = None if deadline is None else deadline - self.clock()
+                if left is not None and left <= 0:
+                    return False
+                self.cond.wait(left)
+        return True
+
+    def _finish(self, msg: OutMessage, state: str, error: str = "") -> None:
+        msg.state, msg.done_at = state, self.clock()
+        if error:
+            msg.error = error
+
+    def _retry(self, msg: OutMessage, error: str) -> None:
+        msg.error = error
+        if msg.attempts >= msg.max_attempts:
+            self._finish(msg, "failed")
+            return
+        msg.state = "queued"
+        backoff = RETRY_BACKOFF_S * (2 ** (msg.attempts - 1))
+        heapq.heappush(self.heap, (msg.priority, self.clock() + backoff, next(self._seq), msg))
+
+    def _expire(self, now: float) -> Optional[float]:
+        """
+        Retry messages whose ack timed out and fail those whose reply did;
+        returns the next deadline, if any.
+        """
+        deadlines = []
+        for pid, (deadline, msg) in list(self.pending.items()):
+            if deadline <= now:
+                del self.pending[pid]
+                if msg.state != "relayed":
+                    self._retry(msg, "no ack")
+                elif msg.attempts >= msg.max_attempts:
+                    self._finish(msg, "relayed", "relayed by a neighbour, no ack from the destination")
+                else:
+                    self._retry(msg, "relayed, no ack from the destination")
+            else:
+                deadlines.append(deadline)
+        still = []
+        for deadline, msg in self.awaiting:
+            if deadline <= now:
+                self._finish(msg, "failed", f"no reply containing {msg.expect!r}")
+            else:
+                still.append((deadline, msg))
+                deadlines.append(deadline)
+        self.awaiting = still
+        return min(deadlines) if deadlines else None
+
+    def _next_ready(self, now: float) -> Tuple[Optional[OutMessage], Optional[float]]:
+        """
+        Pop the best message that may go now, or (None, when to look again).
+        Messages waiting out a retry backoff don't hold up others.
+        """
+        deferred, msg, wake = [], None, None
+        while self.heap:
+            item = heapq.heappop(self.heap)
+            if item[1] <= now:
+                msg = item[3]
+                break
+            deferred.append(item)
+            wake = item[1] if wake is None else min(wake, item[1])
+        for item in deferred:
+            heapq.heappush(self.heap, item)
+        return msg, wake
+
+    def _run(self) -> None:
+        with self.cond:
+            while not self._stop:
+                now = self.clock()
+                ack_wake = self._expire(now)
+                msg, retry_wake = self._next_ready(now)
+                send_wake = None
+                if msg is not None:
+                    delay = self.bucket.wait_time(msg.airtime_s)
+                    if delay > 0:
+                        heapq.heappush(self.heap, (msg.priority, 0.0, next(self._seq), msg))
+                        send_wake = now + delay
+                    else:
+                        self.bucket.spend(msg.airtime_s)
+                        self._transmit(msg)
+                        self.cond.notify_all()
+                        continue
+                wakes = [w for w in (ack_wake, retry_wake, send_wake) if w is not None]
+                self.cond.notify_all()
+                self.cond.wait(max(min(wakes) - now, 0.0) if wakes else None)
+
+    def _transmit(self, msg: OutMessage) -> None:
+        msg.attempts += 1
+        msg.sent_at.append(self.clock())
+        try:
+            pkt = self.iface.sendText(msg.text, destinationId=msg.dest, wantAck=msg.want_ack, channelIndex=msg.channel)
+        except Exception as e:
+            self._retry(msg, f"{type(e).__name__}: {e}")
+            return
+        msg.packet_id = getattr(pkt, "id", None)
+        if msg.want_ack and msg.packet_id is not None:
+            msg.state = "sent"
+            self.pending[msg.packet_id] = (self.clock() + self.ack_timeout_s, msg)
+        elif msg.expect:
+            msg.state = "sent"
+            self.awaiting.append((self.clock() + self.reply_timeout_s, msg))
+        else:
+            # Fire-and-forget (or no packet id to match an ack against)
+            self._finish(msg, "sent")
+
+
+def parse_batch(lines) -> List[OutMessage]:
+    """
+    Batch file: one message per line as "PRIORITY DEST TEXT [=> REPLY]", e.g.
+
+        # reset everyone first, then stagger sleeps
+        0 ^all      @wtq Reset
+        5 !a1b2c3d4 @w1q Sleep 3600 => Status Sleeping
+
+    REPLY is the text to wait for from the destination (OutMessage.expect).
+    Blank lines and lines starting with # are skipped.
+    """
+    out = []
+    for n, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        parts = line.split(None, 2)
+        if len(parts) < 3:
+            raise ValueError(f"line {n}: expected PRIORITY DEST TEXT, got {line!r}")
+        try:
+            priority = int(parts[0])
+        except ValueError:
+            raise ValueError(f"line {n}: priority must be an integer, got {parts[0]!r}") from None
+        text, _, expect = parts[2].partition("=>")
+        out.append(OutMessage(text=text.strip(), dest=parts[1], priority=priority, expect=expect.strip() or None))
+    return out
@@ -5,11 +5,20 @@ Ensure a Meshtastic device has a private (encrypted) channel configured.
 - If a matching private channel already exists, do nothing (idempotent).
 - Otherwise, set the channel name and generate a new AES-256 PSK, then write it.
 
+Fleet mode (--fleet) provisions every attached device at once: ports are
+enumerated (or given with --ports), each device is opened and configured on
+its own worker thread with a per-device timeout, and all of them get the same
+PSK (--psk, required; "--psk random" generates one for a new fleet). Devices
+that already carry the channel with another key are rewritten to this one.
+A result table is printed at the end.
+
 Usage examples:
   python ensure_private_channel.py --name "MyPrivateChannel"
   python ensure_private_channel.py --name "MyPrivateChannel" --port COM5
   python ensure_private_channel.py --name "MyPrivateChannel" --index 1
   python ensure_private_channel.py --name "MyPrivateChannel" --index 0 --force-regen
+  python ensure_private_channel.py --name "MyPrivateChannel" --fleet --psk random
+  python ensure_private_channel.py --name "MyPrivateChannel" --fleet --ports COM5,COM6 --psk <base64>
 """
 
 from __future__ import annotations
@@ -18,7 +27,10 @@ import argparse
 import base64
 import binascii
 import sys
-from typing import Optional, Tuple
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
 
 import meshtastic
 import meshtastic.serial_interface
@@ -75,9 +87,13 @@ def ensure_private_channel(
     name: str,
     preferred_index: Optional[int],
     force_regen: bool,
+    psk: Optional[bytes] = None,
 ) -> Tuple[int, bytes, bool]:
     """
     Returns: (channel_index_used, psk_bytes, changed?)
+
+    With `psk`, the channel must carry exactly that key (fleet mode: every
+    device shares one PSK); a different key is overwritten.
     """
     local = iface.localNode
 
@@ -98,7 +114,8 @@ def ensure_private_channel(
 
     # If we found an existing channel by name, check if it's already private.
     if existing_idx is not None and is_private_psk(current_psk) and not force_regen:
-        return idx, current_psk, False
+        if psk is None or bytes(current_psk) == psk:
+            return idx, current_psk, False
 
     # If name matches preferred slot but PSK isn't private, we will set/upgrade it.
     changed = False
@@ -107,7 +124,12 @@ def ensure_private_channel(
         ch.settings.name = name
         changed = True
 
-    if force_regen or not is_private_psk(current_psk):
+    if psk is not None:
+        new_psk = psk
+        if bytes(current_psk) != psk:
+            ch.settings.psk = psk
+            changed = True
+    elif force_regen or not is_private_psk(current_psk):
         new_psk = meshtastic.util.genPSK256()  # 32 random bytes (AES-256)
         ch.settings.psk = new_psk
         changed = True
@@ -120,14 +142,235 @@ def ensure_private_channel(
     return idx, new_psk, changed
 
 
+# ---- Fleet mode ----
+
+DEFAULT_FLEET_WORKERS = 8
+DEFAULT_DEVICE_TIMEOUT_S = 90.0
+
+
+@dataclass
+class DeviceResult:
+    port: str
+    status: str = "PENDING"     # CHANGED, UNCHANGED, TIMEOUT, SKIPPED, ERROR
+    node: str = ""
+    index: Optional[int] = None
+    seconds: float = 0.0
+    error: str = ""
+
+
+def enumerate_ports() -> List[str]:
+    """
+    Serial ports that look like Meshtastic devices (known USB vendor ids),
+    falling back to every port pyserial lists.
+    """
+    ports = list(meshtastic.util.findPorts(True))
+    if not ports:
+        from serial.tools import list_ports
+
+        ports = [p.device for p in list_ports.comports()]
+    return sorted(ports)
+
+
+def node_id(iface) -> str:
+    num = getattr(getattr(iface, "myInfo", None), "my_node_num", None)
+    return f"!{num:08x}" if isinstance(num, int) else ""
+
+
+def provision_device(
+    port: str,
+    name: str,
+    preferred_index: Optional[int],
+    psk: bytes,
+    connect: Callable[..., object],
+    register: Callable[[str, object], bool],
+    close: Callable[[str], None],
+) -> DeviceResult:
+    """
+    Worker body: open one device, ensure the shared private channel, close.
+    The open interface is handed to `register` so a timed-out device can be
+    closed from the main thread; `register` returns False if the port has
+    already timed out. `close` closes it unless that already happened.
+    """
+    result = DeviceResult(port=port)
+    t0 = time.monotonic()
+    try:
+        iface = connect(devPath=port)
+        if not register(port, iface):
+            raise TimeoutError("connected after the device timeout")
+        result.node = node_id(iface)
+        idx, _, changed = ensure_private_channel(iface, name, preferred_index, force_regen=False, psk=psk)
+        result.index = idx
+        result.status = "CHANGED" if changed else "UNCHANGED"
+    except Exception as e:
+        result.status, result.error = "ERROR", f"{type(e).__name__}: {e}"
+    finally:
+        result.seconds = time.monotonic() - t0
+        close(port)
+    return result
+
+
+def provision_fleet(
+    ports: List[str],
+    name: str,
+    preferred_index: Optional[int],
+    psk: bytes,
+    workers: int = DEFAULT_FLEET_WORKERS,
+    timeout_s: float = DEFAULT_DEVICE_TIMEOUT_S,
+    connect: Callable[..., object] = meshtastic.serial_interface.SerialInterface,
+) -> List[DeviceResult]:
+    """
+    Provision every port, at most `workers` at a time. A device that takes
+    longer than timeout_s (from when its worker started) is reported as
+    TIMEOUT and its interface is closed, which usually unblocks the worker.
+    The worker keeps its slot until its thread actually returns, so no more
+    than `workers` ports are ever open. If every slot is still held by a
+    timed-out worker another timeout_s later, the ports that never got a
+    slot are reported as SKIPPED.
+
+    Workers are daemon threads: a wedged serial port can't keep the process
+    alive after the table is printed. `connect` is the interface factory
+    (SerialInterface; tests can pass a fake).
+    """
+    results = {p: DeviceResult(port=p) for p in ports}
+    ifaces: Dict[str, object] = {}
+    started: Dict[str, float] = {}
+    running = set()
+    finished = set()
+    slots = threading.BoundedSemaphore(max(1, workers))
+    lock = threading.Lock()
+
+    def finish(port: str, result: DeviceResult) -> None:
+        # First one wins: a worker that answers after its timeout is ignored
+        with lock:
+            if port not in finished:
+                finished.add(port)
+                results[port] = result
+
+    def register(port: str, iface) -> bool:
+        with lock:
+            ifaces[port] = iface
+            return port not in finished
+
+    def close(port: str) -> None:
+        # Whoever takes the interface out of `ifaces` closes it, so it is
+        # closed exactly once. close() itself runs outside the lock: a wedged
+        # port can block it, and that must not stall the other workers.
+        with lock:
+            iface = ifaces.pop(port, None)
+        if iface is not None:
+            try:
+                iface.close()
+            except Exception:
+                pass
+
+    def run(port: str) -> None:
+        slots.acquire()
+        try:
+            with lock:
+                if port in finished:  # SKIPPED while waiting for a slot
+                    return
+                started[port] = time.monotonic()
+                running.add(port)
+            result = DeviceResult(port=port, status="ERROR", error="worker failed")
+            try:
+                result = provision_device(port, name, preferred_index, psk, connect, register, close)
+            finally:
+                finish(port, result)
+        finally:
+            with lock:
+                running.discard(port)
+            slots.release()
+
+    for p in ports:
+        threading.Thread(target=run, args=(p,), name=f"provision-{p}", daemon=True).start()
+
+    while True:
+        now = time.monotonic()
+        with lock:
+            pending = [p for p in ports if p not in finished]
+            overdue = [p for p in pending if p in started and now - started[p] > timeout_s]
+            nodes = {p: node_id(ifaces[p]) if p in ifaces else "" for p in overdue}
+            wedged = len(running) >= max(1, workers) and all(now - started[p] > 2 * timeout_s for p in running)
+        for p in overdue:
+            finish(p, DeviceResult(port=p, status="TIMEOUT", node=nodes[p],
+                                   seconds=timeout_s, error=f"no answer within {timeout_s:g}s"))
+            close(p)
+        if wedged:
+            for p in pending:
+                if p not in started:
+                    finish(p, DeviceResult(port=p, status="SKIPPED",
+                                           error=f"all {workers} worker(s) stuck on timed-out devices"))
+        if len(pending) == len(overdue) or wedged:
+            break
+        time.sleep(0.1)
+
+    with lock:
+        return [results[p] for p in ports]
+
+
+def print_fleet_table(results: List[DeviceResult]) -> None:
+    print(f"\n{'port':<16}{'node':<12}{'status':<11}{'index':>6}{'secs':>7}  error")
+    for r in results:
+        index = "" if r.index is None else str(r.index)
+        print(f"{r.port:<16}{r.node:<12}{r.status:<11}{index:>6}{r.seconds:>7.1f}  {r.error}")
+    counts = {}
+    for r in results:
+        counts[r.status] = counts.get(r.status, 0) + 1
+    print("\n" + ", ".join(f"{n} {s.lower()}" for s, n in sorted(counts.items())))
+
+
+def run_fleet(args) -> int:
+    ports = [p.strip() for p in args.ports.split(",") if p.strip()] if args.ports else enumerate_ports()
+    if not ports:
+        print("ERROR: No serial ports found.", file=sys.stderr)
+        return 2
+
+    # A key generated per run would overwrite the channel on devices that
+    # already have it and split the fleet, so the key is always explicit.
+    if not args.psk:
+        print("ERROR: Fleet mode needs --psk: the fleet's key as base64, or 'random' for a new fleet.", file=sys.stderr)
+        return 2
+    if args.psk == "random":
+        psk = meshtastic.util.genPSK256()
+    else:
+        try:
+            psk = base64.b64decode(args.psk, validate=True)
+        except binascii.Error as e:
+            print(f"ERROR: --psk is not valid base64: {e}", file=sys.stderr)
+            return 2
+        if not is_private_psk(psk):
+            print("ERROR: --psk must be a 16- or 32-byte AES key.", file=sys.stderr)
+            return 2
+
+    print(f"Provisioning {len(ports)} device(s) with channel {args.name!r} ({args.workers} at a time)...")
+    results = provision_fleet(ports, args.name, args.index, psk, workers=args.workers, timeout_s=args.device_timeout)
+    print_fleet_table(results)
+
+    print("\nShared PSK (keep it; every device above uses it):")
+    print("  base64:", b64(psk))
+    print("  hex:   ", hexstr(psk))
+    return 0 if all(r.status in ("CHANGED", "UNCHANGED") for r in results) else 1
+
+
 def main() -> int:
     ap = argparse.ArgumentParser(description="Ensure a Meshtastic private (encrypted) channel exists on a device.")
     ap.add_argument("--name", required=True, help="Channel name (must match across devices).")
     ap.add_argument("--port", default=None, help="Serial port/device path (e.g., COM5, /dev/ttyUSB0).")
     ap.add_argument("--index", type=int, default=None, help="Preferred channel index (default: 0).")
     ap.add_argument("--force-regen", action="store_true", help="Force-generate a new PSK even if already private.")
+    ap.add_argument("--fleet", action="store_true", help="Provision every attached device with one shared PSK.")
+    ap.add_argument("--ports", default=None, help="Fleet mode: comma-separated ports instead of auto-detection.")
+    ap.add_argument("--psk", default=None,
+                    help="Fleet mode (required): shared PSK as base64, or 'random' to generate one for a new fleet.")
+    ap.add_argument("--workers", type=int, default=DEFAULT_FLEET_WORKERS,
+                    help=f"Fleet mode: devices configured at once (default: {DEFAULT_FLEET_WORKERS}).")
+    ap.add_argument("--device-timeout", type=float, default=DEFAULT_DEVICE_TIMEOUT_S,
+                    help=f"Fleet mode: seconds allowed per device (default: {DEFAULT_DEVICE_TIMEOUT_S:g}).")
     args = ap.parse_args()
 
+    if args.fleet:
+        return run_fleet(args)
+
     # Connect
     try:
         if args.port:
@@ -0,0 +1,135 @@
+"""
+test_meshsend.py
+
+meshsend.Sender against a stub radio that answers each packet with scripted
+routing replies (acks, NAKs, a neighbour's implicit ack) and worker texts.
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import meshsend
+
+LOCAL = 1
+WORKER = "!00000002"
+
+
+class Radio:
+    """
+    Stub interface. `script(packet_id, text, dest, attempt)` returns
+    the packets to hand the sender shortly after a send, as (topic, packet)
+    pairs; see ack() and reply().
+    """
+
+    def __init__(self, script):
+        self.script = script
+        self.localNode = SimpleNamespace(nodeNum=LOCAL)
+        self.sender = None
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def sendText(self, text, destinationId, wantAck, channelIndex):
+        with self.lock:
+            self.sent.append((text, destinationId))
+            pid = 100 + len(self.sent)
+            attempt = sum(t == text for t, _ in self.sent)
+        answers = self.script(pid, text, destinationId, attempt)
+        threading.Timer(0.02, self._deliver, (answers,)).start()
+        return SimpleNamespace(id=pid)
+
+    def _deliver(self, answers):
+        for topic, packet in answers:
+            if topic == "routing":
+                self.sender.handle_routing(packet)
+            else:
+                self.sender.handle_text(packet)
+
+
+def ack(pid, frm=2, reason="NONE"):
+    return "routing", {"from": frm, "decoded": {"requestId": pid, "routing": {"errorReason": reason}}}
+
+
+def reply(text, frm=WORKER):
+    return "text", {"fromId": frm, "decoded": {"text": text}}
+
+
+@pytest.fixture(autouse=True)
+def quick_backoff(monkeypatch):
+    monkeypatch.setattr(meshsend, "RETRY_BACKOFF_S", 0.02)
+
+
+def run(script, *messages, ack_timeout_s=0.3, reply_timeout_s=0.3):
+    radio = Radio(script)
+    sender = meshsend.Sender(radio, duty=1.0, ack_timeout_s=ack_timeout_s, reply_timeout_s=reply_timeout_s)
+    radio.sender = sender
+    out = [sender.submit(m) for m in messages]  # all queued before the worker starts
+    sender.start()
+    try:
+        assert sender.wait(10)
+    finally:
+        sender.stop()
+    return radio, out
+
+
+def test_ack_from_the_destination_delivers():
+    radio, [msg] = run(lambda pid, *_: [ack(pid)], meshsend.OutMessage("@w1q Sleep 60", WORKER))
+    assert (msg.state, msg.attempts) == ("delivered", 1)
+
+
+def test_nak_is_retried_until_max_attempts():
+    radio, [msg] = run(lambda pid, *_: [ack(pid, reason="MAX_RETRANSMIT")],
+                       meshsend.OutMessage("@w1q Sleep 60", WORKER, max_attempts=3))
+    assert msg.state == "failed"
+    assert msg.attempts == len(radio.sent) == 3
+    assert msg.error == "NAK MAX_RETRANSMIT"
+
+
+def test_unanswered_packet_is_resent():
+    script = lambda pid, text, dest, attempt: [] if attempt == 1 else [ack(pid)]
+    radio, [msg] = run(script, meshsend.OutMessage("@w1q Sleep 60", WORKER))
+    assert (msg.state, msg.attempts) == ("delivered", 2)
+
+
+def test_implicit_ack_alone_ends_as_relayed():
+    radio, [msg] = run(lambda pid, *_: [ack(pid, frm=LOCAL)],
+                       meshsend.OutMessage("@w1q Sleep 60", WORKER, max_attempts=2))
+    assert msg.state == "relayed"
+    assert msg.attempts == 2
+    assert "no ack from the destination" in msg.error
+
+
+def test_implicit_ack_then_destination_ack_delivers():
+    radio, [msg] = run(lambda pid, *_: [ack(pid, frm=LOCAL), ack(pid)],
+                       meshsend.OutMessage("@w1q Sleep 60", WORKER))
+    assert (msg.state, msg.attempts) == ("delivered", 1)
+
+
+def test_implicit_ack_delivers_a_broadcast():
+    radio, [msg] = run(lambda pid, *_: [ack(pid, frm=LOCAL)], meshsend.OutMessage("@wtq Reset"))
+    assert (msg.state, msg.attempts) == ("delivered", 1)
+
+
+def test_expected_reply_closes_the_message_without_a_resend():
+    script = lambda pid, text, dest, attempt: [ack(pid)] + ([reply("@w1r Status Sleeping")] if "w1q" in text else [])
+    radio, (answered, silent) = run(
+        script,
+        meshsend.OutMessage("@w1q Sleep 60", WORKER, expect="Status Sleeping"),
+        meshsend.OutMessage("@w2q Sleep 60", "!00000003", expect="Status Sleeping"),
+    )
+    assert answered.state == "delivered"
+    assert silent.state == "failed" and "no reply" in silent.error
+    assert (answered.attempts, silent.attempts) == (1, 1)
+
+
+def test_higher_priority_goes_first():
+    radio, _ = run(lambda pid, *_: [ack(pid)],
+                   meshsend.OutMessage("later", WORKER, priority=5),
+                   meshsend.OutMessage("first", WORKER, priority=0))
+    assert [text for text, _ in radio.sent] == ["first", "later"]
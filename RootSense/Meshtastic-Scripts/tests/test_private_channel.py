@@ -0,0 +1,135 @@
+"""
+test_private_channel.py
+
+private-chanel.py fleet mode (provision_fleet) against fake serial
+interfaces that can hang, so the TIMEOUT and SKIPPED paths run without
+hardware.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("meshtastic")
+
+_spec = importlib.util.spec_from_file_location(
+    "private_chanel", Path(__file__).resolve().parent.parent / "private-chanel.py")
+pc = importlib.util.module_from_spec(_spec)
+sys.modules[_spec.name] = pc  # dataclasses look their module up there
+_spec.loader.exec_module(pc)
+
+PSK = bytes(range(32))
+
+
+class Fleet:
+    """
+    Fake SerialInterface factory. A port in `hang` blocks in waitForConfig
+    until its event is set; `release_on_close` ports are released by close()
+    (as closing a real serial port usually does). A port in `slow_connect`
+    only connects after that many seconds.
+    """
+
+    def __init__(self, hang=(), release_on_close=(), slow_connect=None):
+        self.hang = {p: threading.Event() for p in hang}
+        self.release_on_close = set(release_on_close)
+        self.slow_connect = slow_connect or {}
+        self.lock = threading.Lock()
+        self.open = 0
+        self.peak = 0
+        self.closes = {}
+
+    def release(self):
+        for event in self.hang.values():
+            event.set()
+
+    def __call__(self, devPath):
+        time.sleep(self.slow_connect.get(devPath, 0))
+        with self.lock:
+            self.open += 1
+            self.peak = max(self.peak, self.open)
+        return FakeInterface(self, devPath)
+
+
+class FakeInterface:
+    def __init__(self, fleet, port):
+        self.fleet = fleet
+        self.port = port
+        self.myInfo = SimpleNamespace(my_node_num=int(port[1:]) + 1)
+        settings = [SimpleNamespace(settings=SimpleNamespace(name="", psk=b"\x01")) for _ in range(8)]
+        self.localNode = SimpleNamespace(channels=settings, waitForConfig=self.wait, writeChannel=lambda i: None)
+
+    def wait(self, what):
+        if self.port in self.fleet.hang:
+            self.fleet.hang[self.port].wait()
+
+    def close(self):
+        fleet = self.fleet
+        with fleet.lock:
+            fleet.closes[self.port] = fleet.closes.get(self.port, 0) + 1
+            fleet.open -= 1
+        if self.port in fleet.release_on_close:
+            fleet.hang[self.port].set()
+
+
+def provision(fleet, ports, workers, timeout_s):
+    try:
+        return {r.port: r for r in pc.provision_fleet(ports, "farm", None, PSK, workers=workers,
+                                                      timeout_s=timeout_s, connect=fleet)}
+    finally:
+        fleet.release()
+
+
+def settle(fleet, closed, wait_s=3.0):
+    # Worker threads outlive provision_fleet() when their device timed out
+    deadline = time.monotonic() + wait_s
+    while (len(fleet.closes) < closed or fleet.open) and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+
+def test_hung_device_times_out_and_is_closed_once():
+    fleet = Fleet(hang=["p1"], release_on_close=["p1"])
+    ports = [f"p{i}" for i in range(5)]
+
+    results = provision(fleet, ports, workers=2, timeout_s=0.3)
+    settle(fleet, closed=5)
+
+    assert results["p1"].status == "TIMEOUT"
+    assert results["p1"].node == "!00000002"
+    assert all(results[p].status == "CHANGED" for p in ports if p != "p1")
+    assert fleet.closes == {p: 1 for p in ports}
+    assert fleet.peak <= 2
+
+
+def test_ports_behind_wedged_workers_are_skipped():
+    ports = [f"p{i}" for i in range(5)]
+    fleet = Fleet(hang=ports)  # closing doesn't help: the first two wedge both slots
+
+    t0 = time.monotonic()
+    results = provision(fleet, ports, workers=2, timeout_s=0.2)
+
+    assert time.monotonic() - t0 < 2.0
+    timed_out = [p for p in ports if results[p].status == "TIMEOUT"]
+    assert len(timed_out) == 2
+    assert all(results[p].status == "SKIPPED" for p in ports if p not in timed_out)
+    settle(fleet, closed=2)
+    assert fleet.closes == {p: 1 for p in timed_out}
+    assert fleet.peak == 2
+
+
+def test_device_that_connects_after_its_timeout_is_closed_by_its_worker():
+    fleet = Fleet(slow_connect={"p0": 0.6})
+
+    results = provision(fleet, ["p0", "p1"], workers=2, timeout_s=0.2)
+    settle(fleet, closed=2)
+
+    assert results["p0"].status == "TIMEOUT"
+    assert results["p1"].status == "CHANGED"
+    assert fleet.closes == {"p0": 1, "p1": 1}
+    assert fleet.open == 0
@@ -1,79 +1,57 @@
-from datetime import datetime
-import csv
+from pathlib import Path
+import argparse
 import sys
 
-def parse_timestamp(ts: str) -> datetime:
-    """
-    Convert a timestamp like '01/22/2026, 14:30:50'
-    into a Python datetime object.
-    """
-    return datetime.strptime(ts, "%m/%d/%Y, %H:%M:%S")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from soildata.devices import GROUP_KEYS, group_devices
+from soildata.gaps import IntervalProfile, find_gaps, parse_profile
+from soildata.livestore import load_source
 
 
 # ---- Command-line argument handling ----
-if len(sys.argv) != 2:
-    print(f"Usage: python {sys.argv[0]} <input_csv>")
-    sys.exit(1)
-
-csv_filename = sys.argv[1]
+ap = argparse.ArgumentParser(description="Report gaps between consecutive reports of each sensor.")
+ap.add_argument("input_csv", help="ThingSpeak CSV export, or a mesh-logger reading store (.sqlite3)")
+ap.add_argument("--interval", type=int, default=3600, help="Expected seconds between reports (default: 3600)")
+ap.add_argument("--tolerance", type=int, default=300, help="Allowed lateness in seconds (default: 300)")
+ap.add_argument(
+    "--profile",
+    action="append",
+    default=[],
+    metavar="SENSOR=SECONDS[:TOLERANCE]",
+    help="Per-sensor expected interval, e.g. --profile hub=1800:120 (repeatable)",
+)
+ap.add_argument(
+    "--group-by",
+    choices=GROUP_KEYS,
+    default="role",
+    help="Group reports by worker role (worker1, hub, ...), mesh node id, or raw label (default: role)",
+)
+ap.add_argument("--csv", default=None, help="Also write the gap table to this CSV file")
+ap.add_argument("--quiet", action="store_true", help="Only print the per-sensor summary")
+args = ap.parse_args()
 # ---------------------------------------
 
 
-sensors = {
-    "hub": [],
-    "worker1": [],
-    "worker2": []
-}
-
-with open(csv_filename, newline="", encoding="utf-8") as file:
-    reader = csv.DictReader(file)
-    for row in reader:
-        if not row["Device (field1)"]:
-            continue
-
-        if "hub" in row["Device (field1)"]:
-            sensors["hub"].append(row)
-        if "@w1r" in row["Device (field1)"]:
-            sensors["worker1"].append(row)
-        if "@w2r" in row["Device (field1)"]:
-            sensors["worker2"].append(row)
-
-
-total_gaps = 0
-for sensor in sensors.keys():
-    lastTime = datetime.min
-    first = True  # skip first row of each sensor
-
-    for row in sensors[sensor]:
-        thisTime = parse_timestamp(row["Created (Chicago)"])
-        delta = thisTime - lastTime
-        lastTime = thisTime
+records = load_source(args.input_csv)
 
-        if first:
-            first = False
-            continue
+# Every device label found in the export becomes a sensor
+sensors = group_devices(records, key=args.group_by)
 
-        if delta.total_seconds() > 3900:  # 65 minutes
-            print(
-                "Gap detected at row entry",
-                row["Entry ID"],
-                "with a gap of",
-                delta,
-                "for sensor",
-                sensor,
-                "at time",
-                row["Created (Chicago)"],
-                "with",
-                row["Battery (field4)"]
-            )
-            total_gaps += 1
+gaps = find_gaps(
+    records,
+    group_codes=sensors.group_codes,
+    group_names=sensors.names,
+    profiles=dict(parse_profile(p) for p in args.profile),
+    default=IntervalProfile(expected_s=args.interval, tolerance_s=args.tolerance),
+)
 
+if not args.quiet and len(gaps):
+    sys.stdout.write("\n".join(gaps.format_lines()) + "\n")
 
-print("Scan complete. Detected", total_gaps, "gaps.")
+if args.csv:
+    gaps.write_csv(args.csv)
+    print("Wrote", args.csv)
 
-# Debug printing
-# for sensor in sensors.keys():
-#     print(sensor)
-#     for row in sensors[sensor]:
-#         print(row)
-#     print("=" * 126)
+for sensor, count in gaps.counts().items():
+    print(f"  {sensor}: {count} gaps")
+print("Scan complete. Detected", len(gaps), "gaps.")
@@ -1,86 +1,85 @@
-from datetime import datetime
-import csv
+from pathlib import Path
+import argparse
 import sys
 import plotly.graph_objects as go
 
-def parse_timestamp(ts: str) -> datetime:
-    """
-    Convert a timestamp like '01/22/2026, 14:30:50'
-    into a Python datetime object.
-    """
-    return datetime.strptime(ts, "%m/%d/%Y, %H:%M:%S")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from soildata.devices import group_devices
+from soildata.downsample import METHODS, downsample
+from soildata.livestore import load_source
+from soildata.records import utc_to_local_datetime64
 
 
 # ---- Command-line argument handling ----
-if len(sys.argv) != 2:
-    print(f"Usage: python {sys.argv[0]} <input_csv>")
-    sys.exit(1)
-
-csv_filename = sys.argv[1]
+ap = argparse.ArgumentParser(description="Plot battery voltage over time for every sensor.")
+ap.add_argument("input_csv", help="ThingSpeak CSV export, or a mesh-logger reading store (.sqlite3)")
+ap.add_argument("--points", type=int, default=2000, help="Max points drawn per sensor (default: 2000)")
+ap.add_argument("--method", choices=METHODS, default="lttb", help="Downsampling: lttb (default), minmax, or none")
+ap.add_argument("--per-sensor", action="store_true", help="One figure per sensor (old behaviour) instead of one combined figure")
+ap.add_argument("--out", default=None,
+                help="Write the figure(s) to this file instead of opening a browser: .html, or .png/.svg/.pdf (needs kaleido). "
+                     "With --per-sensor the sensor name is added to the file name.")
+args = ap.parse_args()
 # ---------------------------------------
 
 
-sensors = {
-    "hub": [],
-    "worker1": [],
-    "worker2": []
-}
-
-# Read CSV and sort rows by sensor
-with open(csv_filename, newline="", encoding="utf-8") as file:
-    reader = csv.DictReader(file)
-    for row in reader:
-        if not row["Device (field1)"]:
-            continue
-
-        if "hub" in row["Device (field1)"]:
-            sensors["hub"].append(row)
-        if "@w1r" in row["Device (field1)"]:
-            sensors["worker1"].append(row)
-        if "@w2r" in row["Device (field1)"]:
-            sensors["worker2"].append(row)
+# Read CSV once into columns, then split rows by sensor (hub, worker1, worker2, ...)
+records = load_source(args.input_csv)
+sensors = group_devices(records)
 
+if len(sensors) == 0:
+    print("No sensor data present.")
 
-for sensor in sensors.keys():
-    # Parse the data
-    timestamps = []
-    voltages = []
 
-    if len(sensors[sensor]) == 0:
-        print("Sensor data from", sensor, "is not present.")
-        continue
-
-    for row in sensors[sensor]:
-        # Parse timestamp
-        timestamp_str = row["Created (Chicago)"]
-        timestamp = datetime.strptime(timestamp_str, '%m/%d/%Y, %H:%M:%S')
-        timestamps.append(timestamp)
-        
-        # Parse voltage (remove 'Batt,' prefix and convert to float)
-        voltage_str = row["Battery (field4)"]
-        voltage = float(voltage_str.split(',')[1])
-        voltages.append(voltage)
-
-    # Create the plot
-    fig = go.Figure()
-
-    fig.add_trace(go.Scatter(
-        x=timestamps,
-        y=voltages,
-        mode='lines+markers',
+def sensor_trace(sensor, rows):
+    # Local (Chicago) time for the x axis, volts for the y axis,
+    # reduced to at most --points samples (dips are kept)
+    keep = downsample(records.timestamps[rows], records.battery[rows], args.points, args.method)
+    rows = rows[keep]
+    return go.Scatter(
+        x=utc_to_local_datetime64(records.timestamps[rows]),
+        y=records.battery[rows],
+        mode='lines+markers' if len(rows) <= 300 else 'lines',
         name=sensor + ' Battery Voltage',
-        line=dict(color='blue', width=2),
+        line=dict(width=2),
         marker=dict(size=6)
-    ))
+    )
+
 
-    # Update layout
+def finish(fig, title, suffix=""):
     fig.update_layout(
-        title='Battery Voltage of ' + sensor + ' Over Time',
+        title=title,
         xaxis_title='Time',
         yaxis_title='Voltage (V)',
         hovermode='x unified',
         template='plotly_white'
     )
-
-    # Show the plot
-    fig.show()
\ No newline at end of file
+    if not args.out:
+        fig.show()
+        return
+
+    out = Path(args.out)
+    if suffix:
+        out = out.with_name(f"{out.stem}-{suffix}{out.suffix}")
+    if out.suffix.lower() in (".html", ".htm"):
+        fig.write_html(out, include_plotlyjs="cdn")
+    else:
+        try:
+            fig.write_image(out)
+        except (ValueError, ImportError, RuntimeError) as e:
+            print(f"ERROR: static export failed: {str(e).strip().splitlines()[0]} Install with: pip install kaleido", file=sys.stderr)
+            sys.exit(1)
+    print("Wrote", out)
+
+
+if args.per_sensor:
+    for sensor, rows in sensors:
+        fig = go.Figure()
+        fig.add_trace(sensor_trace(sensor, rows))
+        finish(fig, 'Battery Voltage of ' + sensor + ' Over Time', suffix=sensor)
+elif len(sensors):
+    # All sensors in one figure (click legend entries to hide/show)
+    fig = go.Figure()
+    for sensor, rows in sensors:
+        fig.add_trace(sensor_trace(sensor, rows))
+    finish(fig, 'Battery Voltage Over Time')
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+report-devices.py
+
+Headless per-device report: battery voltage, the 8-depth moisture profile and
+a temperature heatmap for every device in an export, written as HTML (or
+PNG/SVG through kaleido) plus an index.html linking them all.
+
+- Devices are rendered in parallel on a process pool
+- Each device's data is hashed; devices whose data (and plot settings) are
+  unchanged since the last run are skipped (report-manifest.json), so a
+  nightly run over all nodes only redraws the ones that reported
+- Long series are downsampled (LTTB for lines, time-binned means for the
+  heatmap) so files stay small
+
+File names follow the hand-saved ones:
+    hub-batteryGraph-2026-01-27_2026-01-29.html
+    hub-moistureProfile-2026-01-27_2026-01-29.html
+    hub-tempHeatmap-2026-01-27_2026-01-29.html
+
+Usage examples:
+  python report-devices.py export.csv --out-dir reports
+  python report-devices.py soil_live.sqlite3 --out-dir reports --format png --processes 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import html
+import json
+import os
+import re
+import sys
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from soildata.devices import GROUP_KEYS, group_devices
+from soildata.downsample import downsample
+from soildata.livestore import load_source
+from soildata.records import DEPTHS, utc_to_local_datetime64
+
+MANIFEST = "report-manifest.json"
+REPORT_VERSION = 1  # bump when the plots change, to force a full redraw
+KINDS = ("batteryGraph", "moistureProfile", "tempHeatmap")
+
+
+def data_hash(ts, battery, moisture, temperature, settings) -> str:
+    h = hashlib.sha1(json.dumps(settings, sort_keys=True).encode())
+    for a in (ts, battery, moisture, temperature):
+        h.update(np.ascontiguousarray(a).tobytes())
+    return h.hexdigest()
+
+
+def time_bins(ts: np.ndarray, values: np.ndarray, bins: int):
+    """
+    Mean of `values` rows over up to `bins` equal-count time bins -> (bin start times, means).
+    """
+    n = len(ts)
+    if n <= bins:
+        return ts, values
+    starts = np.linspace(0, n, bins, endpoint=False).astype(np.int64)
+    finite = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(finite, values, 0.0), starts, axis=0)
+    hits = np.add.reduceat(finite.astype(np.int64), starts, axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(hits > 0, sums / np.maximum(hits, 1), np.nan)
+    return ts[starts], means
+
+
+def render_device(job: dict) -> dict:
+    """
+    Process-pool worker: draw and write one device's three figures.
+    """
+    import plotly.graph_objects as go
+
+    name, ts = job["name"], job["ts"]
+    points, fmt = job["points"], job["format"]
+    local = utc_to_local_datetime64(ts)
+    layout = dict(xaxis_title="Time", hovermode="x unified", template="plotly_white")
+
+    figs = {}
+
+    keep = downsample(ts, job["battery"], points)
+    fig = go.Figure(go.Scatter(x=local[keep], y=job["battery"][keep], mode="lines", name="Battery"))
+    fig.update_layout(title=f"Battery Voltage of {name} Over Time", yaxis_title="Voltage (V)", **layout)
+    figs["batteryGraph"] = fig
+
+    # One LTTB pick on the depth mean so every depth shares the same x values
+    moist = job["moisture"]
+    with np.errstate(invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN rows
+        keep = downsample(ts, np.nanmean(moist, axis=1), points)
+    fig = go.Figure()
+    for d in range(moist.shape[1]):
+        fig.add_trace(go.Scatter(x=local[keep], y=moist[keep, d], mode="lines", name=f"Depth {d + 1}"))
+    fig.update_layout(title=f"Soil Moisture Profile of {name}", yaxis_title="Moisture", **layout)
+    figs["moistureProfile"] = fig
+
+    bt, temps = time_bins(ts, job["temperature"], points)
+    fig = go.Figure(go.Heatmap(
+        x=utc_to_local_datetime64(bt),
+        y=[f"Depth {d + 1}" for d in range(temps.shape[1])],
+        z=temps.T,
+        colorscale="RdYlBu_r",
+        colorbar=dict(title="°C"),
+    ))
+    fig.update_layout(title=f"Soil Temperature of {name}", yaxis=dict(autorange="reversed"), **layout)
+    figs["tempHeatmap"] = fig
+
+    files = []
+    for kind, fig in figs.items():
+        path = Path(job["out_dir"]) / f"{job['stem']}-{kind}-{job['span']}.{fmt}"
+        if fmt == "html":
+            fig.write_html(path, include_plotlyjs="cdn")
+        else:
+            fig.write_image(path)
+        files.append(path.name)
+    return {"name": name, "hash": job["hash"], "files": files}
+
+
+def write_index(out_dir: Path, rows: list) -> Path:
+    """
+    index.html: one table row per device with links to its figures.
+    """
+    body = []
+    for r in rows:
+        links = " ".join(
+            f'<a href="{html.escape(f)}">{html.escape(k)}</a>' for k, f in zip(KINDS, r["files"])
+        )
+        body.append(
+            f"<tr><td>{html.escape(r['name'])}</td><td>{r['count']}</td><td>{html.escape(r['last'])}</td>"
+            f"<td>{r['battery']}</td><td>{links}</td><td>{'redrawn' if r['rendered'] else 'unchanged'}</td></tr>"
+        )
+    page = (
+        "<!doctype html><html><head><meta charset='utf-8'><title>RootSense device report</title>"
+        "<style>body{font-family:sans-serif}td,th{padding:4px 10px;text-align:left}"
+        "tr:nth-child(even){background:#f3f3f3}</style></head><body>"
+        "<h1>RootSense device report</h1><table><tr><th>Device</th><th>Readings</th>"
+        "<th>Last reading (local)</th><th>Last battery (V)</th><th>Figures</th><th>This run</th></tr>"
+        + "".join(body) + "</table></body></html>"
+    )
+    path = out_dir / "index.html"
+    path.write_text(page, encoding="utf-8")
+    return path
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Render battery/moisture/temperature reports for every device.")
+    ap.add_argument("input_csv", help="ThingSpeak CSV export, or a mesh-logger reading store (.sqlite3)")
+    ap.add_argument("--out-dir", default="reports", help="Output directory (default: reports)")
+    ap.add_argument("--format", choices=("html", "png", "svg"), default="html", help="Figure format; png/svg need kaleido (default: html)")
+    ap.add_argument("--points", type=int, default=2000, help="Max points per line / heatmap columns (default: 2000)")
+    ap.add_argument("--group-by", choices=GROUP_KEYS, default="role", help="How to split devices (default: role)")
+    ap.add_argument("--processes", type=int, default=None, help="Worker processes (default: one per CPU)")
+    ap.add_argument("--force", action="store_true", help="Redraw every device even if its data is unchanged")
+    args = ap.parse_args()
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / MANIFEST
+    try:
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        manifest = {}
+
+    records = load_source(args.input_csv)
+    sensors = group_devices(records, key=args.group_by)
+    if len(sensors) == 0:
+        print("No sensor data present.")
+        return 1
+
+    settings = {"v": REPORT_VERSION, "points": args.points, "format": args.format}
+    jobs, index_rows = [], []
+    for name, rows in sensors:
+        ts = records.timestamps[rows]
+        battery, moisture, temperature = records.battery[rows], records.moisture[rows], records.temperature[rows]
+        digest = data_hash(ts, battery, moisture, temperature, settings)
+        local = utc_to_local_datetime64(ts[[0, -1]]).astype("datetime64[D]")
+        span = f"{local[0]}_{local[1]}"
+        stem = re.sub(r"[^A-Za-z0-9_-]+", "_", name).strip("_") or "device"
+
+        prev = manifest.get(name, {})
+        fresh = (
+            not args.force
+            and prev.get("hash") == digest
+            and all((out_dir / f).exists() for f in prev.get("files", []))
+        )
+        finite = battery[~np.isnan(battery)]
+        index_rows.append({
+            "name": name,
+            "count": len(rows),
+            "last": str(utc_to_local_datetime64(ts[-1:])[0]).replace("T", " "),
+            "battery": f"{finite[-1]:.2f}" if len(finite) else "",
+            "files": prev.get("files", []) if fresh else [],
+            "rendered": not fresh,
+        })
+        if not fresh:
+            jobs.append({
+                "name": name, "stem": stem, "span": span, "hash": digest,
+                "ts": ts, "battery": battery, "moisture": moisture[:, :DEPTHS], "temperature": temperature[:, :DEPTHS],
+                "points": args.points, "format": args.format, "out_dir": str(out_dir),
+            })
+
+    results = []
+    if jobs:
+        try:
+            if args.processes == 1 or len(jobs) == 1:
+                results = [render_device(j) for j in jobs]
+            else:
+                with ProcessPoolExecutor(max_workers=args.processes) as pool:
+                    results = list(pool.map(render_device, jobs))
+        except (ValueError, ImportError, RuntimeError) as e:
+            print(f"ERROR: rendering failed: {str(e).strip().splitlines()[0]}", file=sys.stderr)
+            if args.format != "html":
+                print("Static formats need kaleido: pip install kaleido", file=sys.stderr)
+            return 1
+
+    for res in results:
+        old = set(manifest.get(res["name"], {}).get("files", [])) - set(res["files"])
+        for f in old:  # figures for an older date span
+            try:
+                os.remove(out_dir / f)
+            except FileNotFoundError:
+                pass
+        manifest[res["name"]] = {"hash": res["hash"], "files": res["files"]}
+        for r in index_rows:
+            if r["name"] == res["name"]:
+                r["files"] = res["files"]
+
+    tmp = manifest_path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+    os.replace(tmp, manifest_path)
+
+    index = write_index(out_dir, index_rows)
+    print(f"Rendered {len(results)} device(s), {len(index_rows) - len(results)} unchanged. Index: {index}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+update-rollups.py
+
+Maintain hourly/daily min/mean/max rollups (soildata/rollup.py) in a reading
+store. Only buckets that received new readings since the last run are
+recomputed, so this is cheap to run from cron after every logger batch or
+export download.
+
+Usage examples:
+  python update-rollups.py soil_live.sqlite3
+  python update-rollups.py thingspeak_feeds.csv            (imports into soil_export.sqlite3)
+  python update-rollups.py soil_live.sqlite3 --show day --device w2r
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from soildata.livestore import DEFAULT_EXPORT_STORE_PATH, LiveStore, is_store_path
+from soildata.rollup import RESOLUTIONS, import_records, query_rollups, update_rollups
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Incrementally update hourly/daily rollups of the soil readings.")
+    ap.add_argument("input", help="Reading store (.sqlite3), or a ThingSpeak CSV export to import into --store first")
+    ap.add_argument("--store", default=DEFAULT_EXPORT_STORE_PATH,
+                    help=f"Store to import a CSV export into (default: {DEFAULT_EXPORT_STORE_PATH}; "
+                         "keep it apart from the logger's live store)")
+    ap.add_argument("--rebuild", action="store_true", help="Drop and recompute every bucket")
+    ap.add_argument("--show", choices=tuple(RESOLUTIONS), default=None, help="Print the rollup rows afterwards")
+    ap.add_argument("--device", default=None, help="With --show, only devices whose label contains this text")
+    args = ap.parse_args()
+
+    if is_store_path(args.input):
+        if not Path(args.input).exists():
+            print(f"ERROR: no such store: {args.input}", file=sys.stderr)
+            return 2
+        path = args.input
+    else:
+        from soildata.records import load_export
+
+        path = args.store
+        records = load_export(args.input)
+        with LiveStore(path) as store:
+            added = import_records(store, records)
+        print(f"Imported {added} new of {len(records)} rows into {path}")
+
+    with LiveStore(path) as store:
+        t0 = time.perf_counter()
+        counts = update_rollups(store.conn, rebuild=args.rebuild)
+        took = time.perf_counter() - t0
+        print("Recomputed " + ", ".join(f"{n} {name}" for name, n in counts.items())
+              + f" bucket(s) in {took:.2f}s")
+
+        if args.show:
+            cols = ("device", "bucket_s", "n", "battery_min", "battery_mean", "battery_max", "moist1_mean", "temp1_mean")
+            print(f"{'device':<14}{'bucket (UTC)':<22}{'n':>5}{'batt min':>10}{'mean':>8}{'max':>8}{'moist1':>9}{'temp1':>8}")
+            for row in query_rollups(store.conn, args.show, device=args.device, columns=cols):
+                stamp = time.strftime("%Y-%m-%d %H:%M", time.gmtime(row[1]))
+                vals = "".join(f"{v:>{w}.2f}" if v is not None else f"{'':>{w}}" for v, w in zip(row[3:], (10, 8, 8, 9, 8)))
+                print(f"{row[0]:<14}{stamp:<22}{row[2]:>5}{vals}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
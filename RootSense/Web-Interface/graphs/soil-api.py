@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+"""
+soil-api.py
+
+Local, quota-free stand-in for ThingSpeak's feeds.json, served from the
+mesh-logger reading store and its rollups, the ThingSpeak feed cache
+(soildata/feedcache.py) or a ThingSpeak CSV export. The server only reads
+those files.
+
+    GET /channels/<id>/feeds.json   same shape as api.thingspeak.com
+    GET /feeds.json                 same, without a channel id
+    GET /devices.json               device labels and the time span on file
+    GET /                           thingspeak-graphs.html, pointed at this server
+
+feeds.json parameters (all optional):
+    results=N          newest N rows after filtering (as on ThingSpeak)
+    start=, end=       ISO-8601 (naive = UTC) or epoch seconds; start <= t < end
+    device=TEXT        only devices whose label contains TEXT
+    resolution=        raw (default), hour or day (hour/day read the rollups)
+    points=N           downsample each device to about N rows (LTTB on mean moisture)
+    split=0            leave out the pre-split arrays
+
+Each feed keeps field1..field4 ("Moist,+001.91,..." strings) so the page
+works unchanged, and by default also carries moist/temp arrays and battery
+as numbers so clients don't have to parse strings. Rollup feeds hold the
+bucket means in the fields and add *_min/*_max arrays and n.
+
+Responses have an ETag (If-None-Match gets a 304) and are gzipped when the
+client accepts it. Rendered responses are cached until the file changes.
+hour/day read the store's rollup tables as they are: mesh-logger.py updates
+them as it writes, update-rollups.py does it for other stores.
+
+Usage examples:
+  python soil-api.py soil_live.sqlite3
+  python soil-api.py thingspeak_cache.sqlite3 --channel 3002040
+  python soil-api.py thingspeak_feeds.csv --port 8090
+  curl 'http://127.0.0.1:8089/feeds.json?device=w2r&resolution=hour&start=2026-01-10'
+
+Requires NumPy. Stdlib HTTP (asyncio), no web framework.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import sys
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import formatdate
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from soildata.downsample import downsample
+from soildata.feedcache import FeedCache
+from soildata.livestore import MOIST_COLS, TEMP_COLS, LiveStore, is_store_path, sqlite_tables
+from soildata.records import from_feeds, load_export
+from soildata.rollup import RESOLUTIONS, has_rollups, import_records, query_rollups, update_rollups
+
+PAGE = Path(__file__).with_name("thingspeak-graphs.html")
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8089
+RESPONSE_CACHE_SIZE = 64
+MAX_RESULTS = 1_000_000
+MAX_HEADER_BYTES = 64 * 1024
+GZIP_MIN_BYTES = 1024
+
+STATUS_TEXT = {200: "OK", 304: "Not Modified", 302: "Found", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class BadRequest(ValueError):
+    pass
+
+
+# ---- Data source ----
+
+class Source:
+    """
+    Owns the SQLite connections. Every method runs on the single DB thread
+    (sqlite3 connections stay on the thread that opened them).
+
+    - A reading store is read in place, read-only: its rollups are kept up
+      to date by mesh-logger.py or update-rollups.py, never by the server.
+    - A FeedCache file (feedcache.py, thingspeak_cache.sqlite3) and a CSV
+      export are imported into an in-memory store per channel, with its own
+      rollups. When the file changes, only new cache entries are imported
+      (a CSV is re-imported; duplicates are ignored).
+
+    Any other SQLite file is refused.
+    """
+
+    def __init__(self, path: str, channel: Optional[int] = None):
+        self.path = path
+        self.channel = channel
+        self.kind = "csv"
+        if is_store_path(path):
+            tables = sqlite_tables(path)
+            if "readings" in tables:
+                self.kind = "store"
+            elif {"feeds", "channels"} <= tables:
+                self.kind = "feedcache"
+            else:
+                raise ValueError(f"{path} is neither a reading store nor a ThingSpeak feed cache")
+        self.store: Optional[LiveStore] = None
+        self.cache: Optional[FeedCache] = None
+        self.memory: Dict[Optional[int], list] = {}  # channel -> [store, file version, last entry id]
+
+    def version(self) -> Tuple:
+        stats = []
+        for p in (self.path,) if self.kind == "csv" else (self.path, self.path + "-wal"):
+            try:
+                st = os.stat(p)
+                stats.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                stats.append(None)
+        return tuple(stats)
+
+    def channel_id(self, channel: Optional[str]) -> Optional[int]:
+        if self.kind != "feedcache":
+            return None
+        if channel:
+            if not channel.isdigit():
+                raise BadRequest(f"bad channel id {channel!r}")
+            return int(channel)
+        if self.channel is not None:
+            return self.channel
+        ids = self.cache.channel_ids()
+        if len(ids) != 1:
+            raise BadRequest(f"the cache holds channels {ids}: use /channels/<id>/feeds.json or --channel")
+        return ids[0]
+
+    def open(self, channel: Optional[str] = None) -> LiveStore:
+        if self.kind == "store":
+            if self.store is None:
+                self.store = LiveStore(self.path, readonly=True)
+            return self.store
+        if self.kind == "feedcache" and self.cache is None:
+            self.cache = FeedCache(self.path, readonly=True)
+        key = self.channel_id(channel)
+        entry = self.memory.setdefault(key, [None, None, 0])
+        version = self.version()
+        if entry[0] is None or version != entry[1]:
+            if entry[0] is None:
+                entry[0] = LiveStore(":memory:")
+            if self.kind == "feedcache":
+                feeds = self.cache.entries_after(key, entry[2])
+                if feeds:
+                    import_records(entry[0], from_feeds(feeds))
+                    entry[2] = feeds[-1]["entry_id"]
+            else:
+                import_records(entry[0], load_export(self.path))  # duplicates are ignored
+            update_rollups(entry[0].conn)  # no-op when nothing new came in
+            entry[1] = version
+        return entry[0]
+
+    def devices(self, channel: Optional[str]) -> dict:
+        store = self.open(channel)
+        rows = store.conn.execute(
+            "SELECT device, COUNT(*), MIN(time_s), MAX(time_s) FROM readings GROUP BY device ORDER BY device"
+        ).fetchall()
+        return {
+            "devices": [
+                {"device": d, "count": n, "first": iso_utc(first), "last": iso_utc(last)}
+                for d, n, first, last in rows
+            ]
+        }
+
+    def feeds(self, q: Dict[str, str], channel: Optional[str]) -> dict:
+        store = self.open(channel)
+        start, end = parse_time(q.get("start")), parse_time(q.get("end"))
+        device = q.get("device") or None
+        results = parse_int(q, "results", MAX_RESULTS, 1, MAX_RESULTS)
+        points = parse_int(q, "points", 0, 0, MAX_RESULTS)
+        split = q.get("split", "1") not in ("0", "false", "no")
+        resolution = q.get("resolution", "raw")
+
+        if resolution == "raw":
+            feeds = raw_feeds(store.records(start, end, device), results, points, split)
+        elif resolution in RESOLUTIONS:
+            if not has_rollups(store.conn, resolution):
+                raise BadRequest(f"{Path(self.path).name} has no {resolution} rollups yet: "
+                                 "run update-rollups.py on it (mesh-logger.py keeps them current)")
+            feeds = rollup_feeds(query_rollups(store.conn, resolution, start, end, device), results, split)
+        else:
+            raise BadRequest(f"resolution must be raw or one of {tuple(RESOLUTIONS)}")
+
+        return {
+            "channel": {
+                "id": int(channel) if channel and channel.isdigit() else channel,
+                "name": f"RootSense local ({Path(self.path).name})",
+                "field1": "Device", "field2": "Soil Moist", "field3": "Soil Temp", "field4": "Battery",
+                "last_entry_id": feeds[-1]["entry_id"] if feeds else None,
+            },
+            "feeds": feeds,
+        }
+
+
+# ---- Feed formatting ----
+
+def iso_utc(epoch_s) -> Optional[str]:
+    if epoch_s is None:
+        return None
+    return datetime.fromtimestamp(int(epoch_s), tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def parse_time(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    v = value.strip()
+    if v.lstrip("-").isdigit():
+        return int(v)
+    try:
+        dt = datetime.fromisoformat(v.replace(" ", "T").replace("Z", "+00:00"))
+    except ValueError:
+        raise BadRequest(f"bad time {value!r}: use ISO-8601 or epoch seconds") from None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def parse_int(q: Dict[str, str], name: str, default: int, lo: int, hi: int) -> int:
+    if not q.get(name):
+        return default
+    try:
+        return min(max(int(q[name]), lo), hi)
+    except ValueError:
+        raise BadRequest(f"{name} must be an integer") from None
+
+
+def _nums(values) -> list:
+    return [None if v != v else round(v, 3) for v in values]
+
+
+def _field(prefix: str, values: list) -> Optional[str]:
+    if all(v is None for v in values):
+        return None
+    return prefix + "," + ",".join("nan" if v is None else f"{v:+07.2f}" for v in values)
+
+
+def raw_feeds(records, results: int, points: int, split: bool) -> list:
+    idx = np.arange(len(records))[-results:]
+    if points:
+        keep = []
+        for code in np.unique(records.device_codes[idx]):
+            rows = idx[records.device_codes[idx] == code]
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN rows
+                y = np.nanmean(records.moisture[rows], axis=1)
+            keep.append(rows[downsample(records.timestamps[rows], y, points)])
+        idx = np.sort(np.concatenate(keep)) if keep else idx[:0]
+
+    stamps = np.char.add(np.datetime_as_string(records.timestamps[idx].astype("datetime64[s]"), unit="s"), "Z")
+    moist = records.moisture[idx].tolist()
+    temp = records.temperature[idx].tolist()
+    batt = records.battery[idx].tolist()
+    feeds = []
+    for j, i in enumerate(idx.tolist()):
+        m, t, b = _nums(moist[j]), _nums(temp[j]), None if batt[j] != batt[j] else round(batt[j], 3)
+        feed = {
+            "created_at": str(stamps[j]),
+            "entry_id": int(records.entry_ids[i]),
+            "field1": records.devices[records.device_codes[i]],
+            "field2": _field("Moist", m),
+            "field3": _field("Temp", t),
+            "field4": None if b is None else f"Batt,{b:.2f}",
+        }
+        if split:
+            feed.update(moist=m, temp=t, battery=b)
+        feeds.append(feed)
+    return feeds
+
+
+def rollup_feeds(rows: list, results: int, split: bool) -> list:
+    # Column offsets in ROLLUP_COLUMNS: device, bucket_s, n, then (min, mean, max) per value column
+    def stat(row, cols, k):
+        base = {c: 3 + 3 * i for i, c in enumerate(MOIST_COLS + TEMP_COLS + ("battery",))}
+        return [None if row[base[c] + k] is None else round(row[base[c] + k], 3) for c in cols]
+
+    feeds = []
+    for row in rows[-results:]:
+        m, t = stat(row, MOIST_COLS, 1), stat(row, TEMP_COLS, 1)
+        b = stat(row, ("battery",), 1)[0]
+        feed = {
+            "created_at": iso_utc(row[1]),
+            "entry_id": None,
+            "field1": row[0],
+            "field2": _field("Moist", m),
+            "field3": _field("Temp", t),
+            "field4": None if b is None else f"Batt,{b:.2f}",
+        }
+        if split:
+            feed.update(
+                moist=m, temp=t, battery=b, n=row[2],
+                moist_min=stat(row, MOIST_COLS, 0), moist_max=stat(row, MOIST_COLS, 2),
+                temp_min=stat(row, TEMP_COLS, 0), temp_max=stat(row, TEMP_COLS, 2),
+                battery_min=stat(row, ("battery",), 0)[0], battery_max=stat(row, ("battery",), 2)[0],
+            )
+        feeds.append(feed)
+    return feeds
+
+
+# ---- HTTP ----
+
+class Server:
+    def __init__(self, source: Source, page: Path = PAGE):
+        self.source = source
+        self.page = page
+        self.db = ThreadPoolExecutor(max_workers=1, thread_name_prefix="soil-db")
+        self.cache: "OrderedDict[tuple, Tuple[str, bytes, Optional[bytes]]]" = OrderedDict()
+
+    async def run_db(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.db, fn, *args)
+
+    def _render(self, route: str, q: Dict[str, str], channel: Optional[str],
+                want_gzip: bool) -> Tuple[str, bytes, Optional[bytes]]:
+        """
+        (etag, JSON body, gzipped body or None) for a data route, from the
+        cache while the store is unchanged. Runs on the DB thread, which is
+        the only one that touches self.cache.
+        """
+        key = (self.source.version(), route, channel, tuple(sorted(q.items())))
+        hit = self.cache.get(key)
+        if hit is not None:
+            self.cache.move_to_end(key)
+            etag, body, gz = hit
+        else:
+            payload = self.source.devices(channel) if route == "devices" else self.source.feeds(q, channel)
+            body = json.dumps(payload, separators=(",", ":"), allow_nan=False).encode()
+            etag, gz = '"' + hashlib.sha1(body).hexdigest()[:20] + '"', None
+        if want_gzip and gz is None and len(body) > GZIP_MIN_BYTES:
+            gz = gzip.compress(body, compresslevel=6)  # kept with the cached response
+        self.cache[key] = (etag, body, gz)
+        while len(self.cache) > RESPONSE_CACHE_SIZE:
+            self.cache.popitem(last=False)
+        return etag, body, gz
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    await self.send(writer, 400, b"bad request line\n", "text/plain", keep_alive=False)
+                    return
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        k, v = line.split(":", 1)
+                        headers[k.strip().lower()] = v.strip()
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                await self.respond(writer, method, target, headers, keep_alive)
+                if not keep_alive:
+                    return
+        finally:
+            writer.close()
+
+    async def respond(self, writer, method: str, target: str, headers: dict, keep_alive: bool) -> None:
+        if method not in ("GET", "HEAD"):
+            await self.send(writer, 405, b"GET only\n", "text/plain", keep_alive, extra={"Allow": "GET, HEAD"})
+            return
+        url = urlsplit(target)
+        q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        parts = [p for p in url.path.split("/") if p]
+        head_only = method == "HEAD"
+
+        if not parts:
+            await self.send(writer, 302, b"", "text/plain", keep_alive,
+                            extra={"Location": f"/{self.page.name}?api=local"})
+            return
+        if parts == [self.page.name]:
+            await self.send(writer, 200, self.page.read_bytes(), "text/html; charset=utf-8", keep_alive,
+                            headers=headers, head_only=head_only)
+            return
+
+        if parts == ["devices.json"]:
+            route, channel = "devices", None
+        elif parts[-1] == "feeds.json" and (len(parts) == 1 or (len(parts) == 3 and parts[0] == "channels")):
+            route, channel = "feeds", parts[1] if len(parts) == 3 else None
+            q.pop("api_key", None)  # the page sends its ThingSpeak key; not needed here
+        else:
+            await self.send(writer, 404, b"not found\n", "text/plain", keep_alive)
+            return
+
+        try:
+            want_gzip = "gzip" in headers.get("accept-encoding", "")
+            etag, body, gz = await self.run_db(self._render, route, q, channel, want_gzip)
+        except BadRequest as e:
+            await self.send(writer, 400, json.dumps({"error": str(e)}).encode(), "application/json", keep_alive)
+            return
+        except FileNotFoundError as e:
+            await self.send(writer, 404, json.dumps({"error": f"no such file: {e}"}).encode(), "application/json", keep_alive)
+            return
+        except Exception as e:  # keep serving other requests
+            print(f"ERROR: {target}: {e!r}", file=sys.stderr)
+            await self.send(writer, 500, json.dumps({"error": repr(e)}).encode(), "application/json", keep_alive)
+            return
+
+        if etag in [t.strip() for t in headers.get("if-none-match", "").split(",")]:
+            await self.send(writer, 304, b"", "application/json", keep_alive, extra={"ETag": etag})
+            return
+        await self.send(writer, 200, body, "application/json", keep_alive,
+                        extra={"ETag": etag, "Cache-Control": "no-cache"}, headers=headers,
+                        head_only=head_only, gz=gz)
+
+    async def send(self, writer, status: int, body: bytes, ctype: str, keep_alive: bool,
+                   extra: Optional[dict] = None, headers: Optional[dict] = None,
+                   head_only: bool = False, gz: Optional[bytes] = None) -> None:
+        out = {
+            "Date": formatdate(usegmt=True),
+            "Content-Type": ctype,
+            "Access-Control-Allow-Origin": "*",
+            "Connection": "keep-alive" if keep_alive else "close",
+            **(extra or {}),
+        }
+        if headers is not None and "gzip" in headers.get("accept-encoding", "") and len(body) > GZIP_MIN_BYTES:
+            body = gz if gz is not None else gzip.compress(body, compresslevel=6)
+            out["Content-Encoding"] = "gzip"
+            out["Vary"] = "Accept-Encoding"
+        out["Content-Length"] = str(len(body))
+        head = f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n" + "".join(f"{k}: {v}\r\n" for k, v in out.items())
+        writer.write(head.encode("latin-1") + b"\r\n" + (b"" if head_only or status == 304 else body))
+        await writer.drain()
+
+
+async def serve(source: Source, host: str, port: int) -> None:
+    server = Server(source)
+    srv = await asyncio.start_server(server.handle, host, port, limit=MAX_HEADER_BYTES)
+    print(f"Serving {source.path} on http://{host}:{port}/  (feeds: /channels/<id>/feeds.json)")
+    async with srv:
+        await srv.serve_forever()
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Serve the soil readings as a local ThingSpeak-style feeds.json API.")
+    ap.add_argument("source", help="Reading store or ThingSpeak feed cache (.sqlite3), or a ThingSpeak CSV export")
+    ap.add_argument("--channel", type=int, default=None,
+                    help="Feed cache: channel served at /feeds.json (default: the only cached one)")
+    ap.add_argument("--host", default=DEFAULT_HOST, help=f"Bind address (default: {DEFAULT_HOST})")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port (default: {DEFAULT_PORT})")
+    args = ap.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"ERROR: no such file: {args.source}", file=sys.stderr)
+        return 2
+    try:
+        source = Source(args.source, args.channel)
+    except ValueError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 2
+    try:
+        asyncio.run(serve(source, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
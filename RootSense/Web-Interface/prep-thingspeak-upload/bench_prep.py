@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+bench_prep.py
+
+Rows/second of prep-thingspeak-upload.py on a generated export, on the
+original code path (--no-fast-path: generic per-row timestamp parser and
+default IO buffering) and with the fast path and 1 MiB buffers.
+
+Example:
+  python3 bench_prep.py                 # 10M rows (a few GB in a temp dir)
+  python3 bench_prep.py --rows 1000000 --keep
+"""
+
+from __future__ import annotations
+
+import argparse
+import filecmp
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+
+SCRIPT = Path(__file__).with_name("prep-thingspeak-upload.py")
+
+HEADER = "Created (Chicago),Device (field1),Soil Moist (field3),Soil Temp (field4),Battery (field5)\n"
+MOIST = '"Moist,+001.58,+001.46,+001.15,+000.81,+001.38,+001.09,+001.22,+001.36"'
+TEMP = '"Temp,+020.27,+020.16,+020.12,+020.23,+020.17,+020.15,+020.07,+020.17"'
+DEVICES = ("hub", "cd5c: @w1r", "5f90: @w2r", "9f48: @w3r")
+
+
+def generate(path: str, rows: int) -> None:
+    """
+    Web-export style rows, one report every 20 s spread over the devices.
+    Crosses DST changes once rows > ~1.6M.
+    """
+    t = datetime(2025, 1, 1)
+    step = timedelta(seconds=20)
+    with open(path, "w", newline="", encoding="utf-8", buffering=1 << 20) as f:
+        f.write(HEADER)
+        chunk = []
+        for i in range(rows):
+            chunk.append(f'"{t:%m/%d/%Y, %H:%M:%S}",{DEVICES[i % len(DEVICES)]},{MOIST},{TEMP},"Batt,3.9"\n')
+            t += step
+            if len(chunk) == 10000:
+                f.writelines(chunk)
+                chunk.clear()
+        f.writelines(chunk)
+
+
+def run(in_path: str, out_path: str, extra: list[str]) -> float:
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, str(SCRIPT), in_path, out_path, *extra], check=True)
+    return time.perf_counter() - t0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=10_000_000, help="Rows to generate (default: 10,000,000)")
+    ap.add_argument("--dir", default=None, help="Work directory (default: a temp dir)")
+    ap.add_argument("--keep", action="store_true", help="Keep generated files")
+    args = ap.parse_args()
+
+    work = args.dir or tempfile.mkdtemp(prefix="bench_prep_")
+    src = os.path.join(work, "bench_input.csv")
+    out_slow = os.path.join(work, "bench_slow.csv")
+    out_fast = os.path.join(work, "bench_fast.csv")
+
+    print(f"Generating {args.rows:,} rows in {work} ...")
+    generate(src, args.rows)
+    print(f"Input size: {os.path.getsize(src) / 1e6:.1f} MB")
+
+    slow = run(src, out_slow, ["--no-fast-path"])
+    print(f"before (original path):  {slow:8.2f} s  {args.rows / slow:12,.0f} rows/s")
+
+    fast = run(src, out_fast, [])
+    print(f"after  (fast path):      {fast:8.2f} s  {args.rows / fast:12,.0f} rows/s")
+    print(f"speedup: {slow / fast:.2f}x")
+
+    same = filecmp.cmp(out_slow, out_fast, shallow=False)  # compares in chunks
+    print("outputs identical:", same)
+
+    if not args.keep:
+        for p in (src, out_slow, out_fast):
+            os.remove(p)
+        if not args.dir:
+            os.rmdir(work)
+
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
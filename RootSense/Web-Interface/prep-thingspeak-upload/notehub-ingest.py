@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+notehub-ingest.py
+
+Expand a Notehub event export (JSON lines, .gz ok) of the relay's batched
+sensors.qo notes into one row per reading (soildata/notecard.py).
+
+- --csv writes a ThingSpeak-style export (created_at,field1..field4), which
+  every analysis script and thingspeak-bulk-upload.py already read
+- --store bulk-loads the readings into a reading store (.sqlite3), chunk by
+  chunk, for the rollups and soil-api.py
+- With neither, prints a per-device summary
+
+The export is streamed; memory stays flat however many events it holds.
+
+Usage examples:
+  python notehub-ingest.py events.jsonl --csv notecard_feeds.csv
+  python notehub-ingest.py events.jsonl.gz --store soil_live.sqlite3 --per-notecard
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from soildata.livestore import LiveStore
+from soildata.notecard import DEFAULT_CHUNK_ROWS, IngestStats, iter_readings, iter_record_chunks, open_export
+from soildata.rollup import import_records
+
+IO_BUFFER = 1 << 20
+
+
+def write_csv(export: str, out: str, per_notecard: bool, stats: IngestStats) -> int:
+    n = 0
+    with open_export(export) as fin, open(out, "w", newline="", encoding="utf-8", buffering=IO_BUFFER) as fout:
+        w = csv.writer(fout)
+        w.writerow(["created_at", "field1", "field2", "field3", "field4"])
+        for t, dev, moist, temp in iter_readings(fin, per_notecard, stats):
+            w.writerow((time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(t)), dev, moist, temp, ""))
+            n += 1
+    return n
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Expand batched sensors.qo notes from a Notehub export into readings.")
+    ap.add_argument("export", help="Notehub event export, one JSON event per line (.jsonl or .jsonl.gz)")
+    ap.add_argument("--csv", default=None, help="Write a ThingSpeak-style CSV (created_at,field1..field4)")
+    ap.add_argument("--store", default=None, help="Bulk-load into this reading store (.sqlite3)")
+    ap.add_argument("--per-notecard", action="store_true",
+                    help="Prefix device labels with the Notecard id (several hubs in one export)")
+    ap.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS,
+                    help=f"Readings parsed per chunk (default: {DEFAULT_CHUNK_ROWS})")
+    args = ap.parse_args()
+
+    if not Path(args.export).exists():
+        print(f"ERROR: no such file: {args.export}", file=sys.stderr)
+        return 2
+
+    t0 = time.perf_counter()
+    stats = IngestStats()
+    if args.csv:
+        n = write_csv(args.export, args.csv, args.per_notecard, stats)
+        print(f"Wrote {args.csv} ({n} readings)")
+        if args.store:
+            stats = IngestStats()  # second pass for the store
+
+    if args.store or not args.csv:
+        store = LiveStore(args.store) if args.store else None
+        devices = []
+        inserted = 0
+        counts = first = last = np.zeros(0, np.int64)
+        try:
+            for chunk in iter_record_chunks(args.export, args.chunk_rows, args.per_notecard, stats):
+                if store is not None:
+                    inserted += import_records(store, chunk)
+                # Per-device count and span for the summary (codes are shared across chunks)
+                devices = chunk.devices
+                grow = len(devices) - len(counts)
+                counts = np.pad(counts, (0, grow))
+                first = np.pad(first, (0, grow), constant_values=np.iinfo(np.int64).max)
+                last = np.pad(last, (0, grow), constant_values=np.iinfo(np.int64).min)
+                counts += np.bincount(chunk.device_codes, minlength=len(devices))
+                np.minimum.at(first, chunk.device_codes, chunk.timestamps)
+                np.maximum.at(last, chunk.device_codes, chunk.timestamps)
+        finally:
+            if store is not None:
+                store.close()
+        if store is not None:
+            print(f"Loaded {inserted} new rows into {args.store} "
+                  f"({stats.readings - inserted} duplicates skipped)")
+        for name, n, a, b in zip(devices, counts.tolist(), first.tolist(), last.tolist()):
+            span = " -> ".join(time.strftime("%Y-%m-%d %H:%M", time.gmtime(x)) for x in (a, b))
+            print(f"  {name:<16}{n:>9} readings  {span} UTC")
+
+    print(f"{stats.summary()} in {time.perf_counter() - t0:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
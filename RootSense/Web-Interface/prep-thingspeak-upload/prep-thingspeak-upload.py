@@ -3,6 +3,8 @@
 convert_datetime_csv.py
 
 - Replaces the header with: created_at,field1,field2,... up to the detected column count
+- Rows wider than the header are truncated (with a warning), unless --widen is
+  given: then a first pass finds the widest row and the header is widened to fit
 - Converts the first column (created_at) from e.g. "01/02/2026, 11:19:01"
   into ISO-8601 with timezone offset, e.g. 2026-01-02T11:19:01-06:00
 - Interprets naive timestamps as America/Chicago by default (DST-aware)
@@ -12,38 +14,17 @@ from __future__ import annotations
 
 import argparse
 import csv
+import itertools
 import sys
-from datetime import datetime
+from pathlib import Path
 from zoneinfo import ZoneInfo
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from soildata.timestamps import compile_iso_converter, detect_layout, try_parse_datetime
 
-KNOWN_INPUT_FORMATS = (
-    "%m/%d/%Y, %H:%M:%S",   # 01/02/2026, 11:19:01
-    "%m/%d/%Y %H:%M:%S",    # 01/02/2026 11:19:01
-    "%Y-%m-%d %H:%M:%S",    # 2026-01-02 11:19:01
-    "%Y-%m-%dT%H:%M:%S",    # 2026-01-02T11:19:01 (no tz)
-)
 
-
-def try_parse_datetime(s: str) -> datetime | None:
-    s = (s or "").strip().strip('"').strip()
-    if not s:
-        return None
-
-    # Try ISO forms (including trailing Z)
-    iso_candidate = s.replace("Z", "+00:00") if s.endswith("Z") else s
-    try:
-        return datetime.fromisoformat(iso_candidate)
-    except ValueError:
-        pass
-
-    for fmt in KNOWN_INPUT_FORMATS:
-        try:
-            return datetime.strptime(s, fmt)
-        except ValueError:
-            continue
-
-    return None
+IO_BUFFER = 1 << 20         # 1 MiB read/write buffers for multi-GB files
+LAYOUT_SAMPLE_ROWS = 50     # rows used to pick the timestamp layout
 
 
 def make_new_header(col_count: int) -> list[str]:
@@ -55,6 +36,46 @@ def make_new_header(col_count: int) -> list[str]:
     return header
 
 
+def max_row_width(path: str, dialect, buffering: int = IO_BUFFER) -> int:
+    """
+    First pass for --widen: widest row in the file (header included).
+    csv.reader keeps quoted commas ("Moist,+001.58,...") inside one field,
+    and only the running maximum is kept, so memory stays constant.
+    """
+    with open(path, "r", newline="", encoding="utf-8", buffering=buffering) as f:
+        return max(map(len, csv.reader(f, dialect=dialect)), default=0)
+
+
+def slow_convert(value: str, tz: ZoneInfo) -> str:
+    """
+    Original per-row conversion: try every known format. Unparseable values pass through.
+    """
+    dt = try_parse_datetime(value)
+    if dt is None:
+        return value
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=tz)
+    return dt.isoformat(timespec="seconds")
+
+
+def make_converter(samples: list[str], tz: ZoneInfo, fast: bool = True):
+    """
+    Pick the created_at converter for this file. If the first rows share one
+    known layout, use a compiled fast converter and fall back per row.
+    """
+    layout = detect_layout(samples) if fast else None
+    if layout is None:
+        return lambda value: slow_convert(value, tz)
+
+    fast_convert = compile_iso_converter(layout, tz)
+
+    def convert(value: str) -> str:
+        out = fast_convert(value)
+        return out if out is not None else slow_convert(value, tz)
+
+    return convert
+
+
 def main() -> int:
     ap = argparse.ArgumentParser()
     ap.add_argument("input_csv", help="Path to input CSV")
@@ -64,11 +85,23 @@ def main() -> int:
         default="America/Chicago",
         help="IANA timezone name to interpret naive timestamps (default: America/Chicago)",
     )
+    ap.add_argument(
+        "--no-fast-path",
+        action="store_true",
+        help="Run the original code path (generic per-row timestamp parser, default IO buffering); "
+             "for comparison/debugging",
+    )
+    ap.add_argument(
+        "--widen",
+        action="store_true",
+        help="Scan the file first and widen the header to the widest row instead of truncating extra columns",
+    )
     args = ap.parse_args()
 
     tz = ZoneInfo(args.tz)
 
-    with open(args.input_csv, "r", newline="", encoding="utf-8") as fin:
+    buffering = -1 if args.no_fast_path else IO_BUFFER  # -1: Python's default buffer size
+    with open(args.input_csv, "r", newline="", encoding="utf-8", buffering=buffering) as fin:
         sample = fin.read(8192)
         fin.seek(0)
         try:
@@ -90,36 +123,50 @@ def main() -> int:
             print("Error: header row has zero columns.", file=sys.stderr)
             return 2
 
+        if args.widen:
+            widest = max_row_width(args.input_csv, dialect, buffering)
+            if widest > col_count:
+                print(f"Widening header from {col_count} to {widest} columns.", file=sys.stderr)
+                col_count = widest
+
         new_header = make_new_header(col_count)
 
-        with open(args.output_csv, "w", newline="", encoding="utf-8") as fout:
+        # Detect the timestamp layout from the first rows, then keep streaming
+        head_rows = list(itertools.islice(reader, LAYOUT_SAMPLE_ROWS))
+        convert = make_converter(
+            [r[0].strip() for r in head_rows if r],
+            tz,
+            fast=not args.no_fast_path,
+        )
+
+        truncated = 0
+
+        with open(args.output_csv, "w", newline="", encoding="utf-8", buffering=buffering) as fout:
             writer = csv.writer(fout, dialect=dialect)
             writer.writerow(new_header)
 
-            for row in reader:
-                # Normalize row length (pad short rows; keep extras if any)
+            for row in itertools.chain(head_rows, reader):
+                # Normalize row length (pad short rows; truncate overlong ones)
                 if len(row) < col_count:
                     row = row + [""] * (col_count - len(row))
                 elif len(row) > col_count:
-                    # If a row has *more* columns than header, extend header conceptually:
-                    # We'll keep the extra columns and extend the output header once.
-                    # (Rare, but this avoids silent truncation.)
-                    extra = len(row) - col_count
-                    # Extend existing header output (only once, the first time we see it)
-                    # by rewriting the file header is not feasible here, so instead we:
-                    # - truncate to original header length
-                    # If you expect this case, tell me and I'll implement a 2-pass approach.
+                    # Only reachable without --widen: the header can't be rewritten
+                    # once streaming has started, so the extras are dropped.
                     row = row[:col_count]
+                    truncated += 1
 
                 # Convert first column -> created_at
-                dt = try_parse_datetime(row[0])
-                if dt is not None:
-                    if dt.tzinfo is None:
-                        dt = dt.replace(tzinfo=tz)
-                    row[0] = dt.isoformat(timespec="seconds")
+                row[0] = convert(row[0])
 
                 writer.writerow(row)
 
+    if truncated:
+        print(
+            f"Warning: {truncated} rows had more than {col_count} columns and were truncated. "
+            "Re-run with --widen to keep them.",
+            file=sys.stderr,
+        )
+
     return 0
 
 
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+thingspeak-bulk-upload.py
+
+Upload the output of prep-thingspeak-upload.py (created_at,field1,...) to a
+ThingSpeak channel through the bulk_update.json API.
+
+- Streams the CSV and sends batches of up to 960 entries per request
+- Paces requests (default: one every 15 s, the free-account bulk limit)
+- Retries rate limits / server errors with exponential backoff; a batch that
+  got no answer is only resent after checking it isn't on the channel yet
+  (needs --read-key on private channels)
+- Writes a checkpoint after every accepted batch; re-running the same command
+  after an interruption resumes at the first unsent row
+
+Usage examples:
+  python thingspeak-bulk-upload.py thingspeak-edited-data.csv --channel 3002040 --write-key XXXX
+  THINGSPEAK_WRITE_KEY=XXXX python thingspeak-bulk-upload.py data.csv --channel 3002040 --interval 1
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from soildata.thingspeak import MAX_BULK_UPDATES, THINGSPEAK_API, bulk_update, make_session
+
+
+def read_updates(path: str, skip: int) -> Iterator[Tuple[int, dict]]:
+    """
+    Yield (data row number, bulk-update entry) per CSV row, after skipping
+    `skip` data rows. Blank rows are skipped; empty fields are left out.
+    """
+    with open(path, "r", newline="", encoding="utf-8", buffering=1 << 20) as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header or header[0] != "created_at":
+            raise ValueError(f"{path}: expected a created_at,field1,... header (run prep-thingspeak-upload.py first)")
+
+        for n, row in enumerate(itertools.islice(reader, skip, None), start=skip + 1):
+            if not row or not row[0]:
+                continue
+            yield n, {k: v for k, v in zip(header, row) if v != ""}
+
+
+def batches(updates: Iterator[Tuple[int, dict]], size: int) -> Iterator[List[Tuple[int, dict]]]:
+    while True:
+        batch = list(itertools.islice(updates, size))
+        if not batch:
+            return
+        yield batch
+
+
+def load_checkpoint(path: str, input_csv: str) -> int:
+    """
+    Data rows already handled for this input, or 0 if there is no matching checkpoint.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cp = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return 0
+
+    st = os.stat(input_csv)
+    if cp.get("input_size") != st.st_size or cp.get("input") != os.path.abspath(input_csv):
+        print(f"NOTE: checkpoint {path} is for a different file; starting from the top.", file=sys.stderr)
+        return 0
+    return int(cp.get("rows_done", 0))
+
+
+def save_checkpoint(path: str, input_csv: str, rows_done: int) -> None:
+    """
+    Atomic rewrite, so a crash mid-write can't leave a corrupt checkpoint.
+    """
+    cp = {
+        "input": os.path.abspath(input_csv),
+        "input_size": os.stat(input_csv).st_size,
+        "rows_done": rows_done,
+        "updated": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cp, f)
+    os.replace(tmp, path)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Bulk-upload a converted CSV to a ThingSpeak channel.")
+    ap.add_argument("input_csv", help="Output of prep-thingspeak-upload.py")
+    ap.add_argument("--channel", type=int, required=True, help="ThingSpeak channel id")
+    ap.add_argument("--write-key", default=os.environ.get("THINGSPEAK_WRITE_KEY"), help="Channel write API key (or $THINGSPEAK_WRITE_KEY)")
+    ap.add_argument("--read-key", default=os.environ.get("THINGSPEAK_READ_KEY"),
+                    help="Channel read API key, to check unanswered batches on a private channel (or $THINGSPEAK_READ_KEY)")
+    ap.add_argument("--batch", type=int, default=MAX_BULK_UPDATES, help=f"Entries per request (max {MAX_BULK_UPDATES})")
+    ap.add_argument("--interval", type=float, default=15.0, help="Minimum seconds between requests (default: 15)")
+    ap.add_argument("--max-retries", type=int, default=6, help="Retries per batch on 429/5xx/connection errors")
+    ap.add_argument("--checkpoint", default=None, help="Checkpoint file (default: <input_csv>.upload.json)")
+    ap.add_argument("--restart", action="store_true", help="Ignore any existing checkpoint")
+    ap.add_argument("--base-url", default=THINGSPEAK_API, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if not args.write_key:
+        print("ERROR: --write-key (or THINGSPEAK_WRITE_KEY) is required", file=sys.stderr)
+        return 2
+    if not 1 <= args.batch <= MAX_BULK_UPDATES:
+        print(f"ERROR: --batch must be 1..{MAX_BULK_UPDATES}", file=sys.stderr)
+        return 2
+
+    checkpoint = args.checkpoint or args.input_csv + ".upload.json"
+    rows_done = 0 if args.restart else load_checkpoint(checkpoint, args.input_csv)
+    if rows_done:
+        print(f"Resuming after {rows_done} rows (checkpoint {checkpoint})")
+    uploaded = 0
+
+    session = make_session(1)
+    last_request = float("-inf")
+
+    try:
+        for batch in batches(read_updates(args.input_csv, rows_done), args.batch):
+            wait_s = args.interval - (time.monotonic() - last_request)
+            if wait_s > 0:
+                time.sleep(wait_s)
+            last_request = time.monotonic()
+
+            bulk_update(
+                session,
+                args.channel,
+                args.write_key,
+                [entry for _, entry in batch],
+                base_url=args.base_url,
+                max_retries=args.max_retries,
+                read_api_key=args.read_key,
+            )
+
+            rows_done = batch[-1][0]
+            uploaded += len(batch)
+            save_checkpoint(checkpoint, args.input_csv, rows_done)
+            print(f"Uploaded {uploaded} entries (through row {rows_done})")
+    except KeyboardInterrupt:
+        print(f"\nInterrupted after row {rows_done}; re-run to resume.", file=sys.stderr)
+        return 130
+    except Exception as e:
+        print(f"ERROR after row {rows_done}: {e}. Re-run to resume.", file=sys.stderr)
+        return 1
+    finally:
+        session.close()
+
+    print(f"Done. {uploaded} entries uploaded to channel {args.channel} ({rows_done} rows in file).")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,14 @@
+"""
+soildata
+
+Shared helpers for the RootSense Web-Interface scripts.
+
+- timestamps: stdlib-only timestamp parsing (safe to import without NumPy)
+- records:    parse a ThingSpeak export once into NumPy-backed columns
+
+The scripts live in sibling folders, so they put this folder's parent on
+sys.path before importing, e.g.:
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from soildata.records import load_export
+"""
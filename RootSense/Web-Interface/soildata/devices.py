@@ -0,0 +1,112 @@
+"""
+devices.py
+
+Device discovery for ThingSpeak exports.
+
+The hub posts each report with a device label in field1:
+    "hub"           the hub's own probe
+    "cd5c: @w1r"    worker 1's reading, relayed by mesh node ...cd5c
+    "@w2r"          worker 2 without a node prefix (serial/mesh logs)
+
+Labels are parsed once per distinct string (cached), then rows are
+partitioned into per-device index arrays with a single stable sort,
+so new workers show up without touching the scripts.
+
+Requires NumPy.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from .records import SoilRecords
+
+
+GROUP_KEYS = ("role", "node", "label")
+
+_LABEL_RE = re.compile(r"^\s*(?:(?P<node>[!0-9A-Fa-f]+)\s*:\s*)?(?P<role>.*?)\s*$")
+_WORKER_RE = re.compile(r"^@w(\d+)r$")
+
+
+@dataclass(frozen=True)
+class DeviceId:
+    label: str  # as it appears in field1
+    node: str   # mesh node id suffix ("cd5c"), "" if the label has none
+    role: str   # "@w1r", "hub", ...
+
+    @property
+    def name(self) -> str:
+        """
+        Friendly role name: "@w1r" -> "worker1", anything else unchanged.
+        """
+        m = _WORKER_RE.match(self.role)
+        return f"worker{int(m.group(1))}" if m else self.role
+
+
+@lru_cache(maxsize=None)
+def parse_device_label(label: str) -> DeviceId:
+    """
+    "cd5c: @w1r" -> DeviceId(label, node="cd5c", role="@w1r"). Cached per distinct label.
+    """
+    m = _LABEL_RE.match(label)
+    node = (m.group("node") or "").lstrip("!").lower()
+    role = m.group("role") or ""
+    if not role:
+        # bare node id with no role tag
+        role, node = node, ""
+    return DeviceId(label=label, node=node, role=role)
+
+
+def device_key(dev: DeviceId, key: str = "role") -> str:
+    """
+    Group name for a device under the chosen key.
+    role:  worker1 / worker2 / hub (default; matches how the hub tags readings)
+    node:  mesh node id, falling back to role name
+    label: raw field1 text
+    """
+    if key == "role":
+        return dev.name
+    if key == "node":
+        return dev.node or dev.name
+    if key == "label":
+        return dev.label
+    raise ValueError(f"key must be one of {GROUP_KEYS}")
+
+
+@dataclass
+class DeviceGroups:
+    names: List[str]          # group names, sorted
+    group_codes: np.ndarray   # int32, device code -> group index
+    rows: List[np.ndarray]    # per group: row indices in time order
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __iter__(self) -> Iterator[Tuple[str, np.ndarray]]:
+        return iter(zip(self.names, self.rows))
+
+    def as_dict(self) -> Dict[str, np.ndarray]:
+        return dict(zip(self.names, self.rows))
+
+
+def group_devices(records: SoilRecords, key: str = "role") -> DeviceGroups:
+    """
+    Partition rows by device in one pass.
+    Within each group rows are ordered by timestamp (file order on ties).
+    """
+    per_code = [device_key(parse_device_label(d), key) for d in records.devices]
+    names = sorted(set(per_code))
+    index = {n: i for i, n in enumerate(names)}
+    group_codes = np.array([index[n] for n in per_code], dtype=np.int32)
+
+    group = group_codes[records.device_codes]
+    order = np.lexsort((records.timestamps, group))
+    bounds = np.cumsum(np.bincount(group, minlength=len(names)))[:-1]
+    rows = np.split(order, bounds) if len(names) else []
+
+    return DeviceGroups(names=names, group_codes=group_codes, rows=rows)
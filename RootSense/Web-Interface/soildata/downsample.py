@@ -0,0 +1,98 @@
+"""
+downsample.py
+
+Reduce long time series to a plot-sized number of points while keeping the
+shape (in particular short voltage dips) visible.
+
+- lttb:   Largest-Triangle-Three-Buckets; keeps the first and last point and,
+          per bucket, the point forming the largest triangle with the previous
+          pick and the next bucket's mean
+- minmax: the min and max of each bucket, in time order (cheapest; never
+          hides an extreme)
+
+Both return indices into the input, so any other column (labels, entry ids)
+can be picked alongside. NaN y values are skipped.
+
+Requires NumPy.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+
+METHODS = ("lttb", "minmax", "none")
+
+
+def _finite(y: np.ndarray) -> np.ndarray:
+    return np.flatnonzero(~np.isnan(y))
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indices of the LTTB selection (sorted, at most n_out).
+    """
+    keep = _finite(y)
+    if len(keep) <= n_out:
+        return keep
+    if n_out < 3:
+        return keep[[0, -1][:max(n_out, 0)]]
+
+    xs = x[keep].astype(np.float64)
+    ys = y[keep].astype(np.float64)
+    n = len(xs)
+
+    # Bucket edges over the interior points (first/last are always kept)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Next-bucket means for every bucket at once
+    sums_x = np.add.reduceat(xs[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(ys[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    mean_x = np.append(sums_x / counts, xs[-1])
+    mean_y = np.append(sums_y / counts, ys[-1])
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        cx, cy = mean_x[b + 1], mean_y[b + 1]
+        # Twice the triangle area (a, i, next-mean) for every candidate i
+        area = np.abs((xs[a] - cx) * (ys[lo:hi] - ys[a]) - (xs[a] - xs[lo:hi]) * (cy - ys[a]))
+        a = lo + int(np.argmax(area))
+        out[b + 1] = a
+    return keep[out]
+
+
+def minmax(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indices of each bucket's min and max (sorted, at most n_out).
+    """
+    keep = _finite(y)
+    n = len(keep)
+    buckets = max(n_out // 2, 1)
+    if n <= n_out:
+        return keep
+
+    size = -(-n // buckets)  # ceil
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y[keep]
+    grid = padded.reshape(buckets, size)
+    base = np.arange(buckets) * size
+    valid = base < n
+    lo = base[valid] + np.nanargmin(grid[valid], axis=1)
+    hi = base[valid] + np.nanargmax(grid[valid], axis=1)
+    return keep[np.unique(np.concatenate((lo, hi)))]
+
+
+def downsample(x: np.ndarray, y: np.ndarray, n_out: int, method: str = "lttb") -> np.ndarray:
+    """
+    Indices to plot for `method` in METHODS ("none" keeps every finite point).
+    """
+    if method == "lttb":
+        return lttb(x, y, n_out)
+    if method == "minmax":
+        return minmax(x, y, n_out)
+    if method == "none":
+        return _finite(y)
+    raise ValueError(f"method must be one of {METHODS}")
@@ -0,0 +1,237 @@
+"""
+energy.py
+
+Relate node battery voltage to sunlight, to size panels and sleep intervals
+before nodes brown out.
+
+- Irradiance comes from nsrdb_panel_sunlight.py output (ts_utc, GHI_Wm2, ...,
+  optionally POA_Wm2), a regular series sorted by time.
+- Battery samples are irregular per device. Each sample interval gets the mean
+  irradiance over it from the cumulative integral (np.interp at both ends),
+  and each sample gets the as-of irradiance value (last sample at or before).
+- Per device: dV/dt [V/h] = drain + gain * irradiance [kW/m^2], fit by least
+  squares for every device at once from np.bincount sums.
+- The fitted model is run forward over an irradiance series with the battery
+  capped at full charge, and spans under a voltage threshold are reported.
+
+Requires NumPy.
+"""
+
+from __future__ import annotations
+
+import csv
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .devices import DeviceGroups
+from .records import SoilRecords
+
+
+# Battery steps longer than this are left out of the fit (the node was
+# probably off or out of range, so the voltage change isn't one interval's).
+MAX_STEP_S = 6 * 3600
+
+DEFAULT_LOW_V = 3.3
+DEFAULT_FULL_V = 4.2
+
+
+@dataclass
+class Irradiance:
+    ts: np.ndarray    # int64 UTC epoch seconds, sorted
+    wm2: np.ndarray   # float64 W/m^2, NaN where missing
+
+    def __len__(self) -> int:
+        return int(self.ts.shape[0])
+
+    def shifted(self, seconds: int) -> "Irradiance":
+        return Irradiance(self.ts + seconds, self.wm2)
+
+    def cumulative_wh(self) -> np.ndarray:
+        """
+        Wh/m^2 from the first sample up to each sample (trapezoids, NaN as 0).
+        """
+        w = np.nan_to_num(self.wm2)
+        steps = (w[1:] + w[:-1]) * 0.5 * np.diff(self.ts) / 3600.0
+        return np.concatenate(([0.0], np.cumsum(steps)))
+
+
+def load_irradiance_csv(path: str, column: str = "GHI_Wm2") -> Irradiance:
+    """
+    nsrdb_panel_sunlight.py output -> Irradiance for one column (GHI_Wm2, POA_Wm2, ...).
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, None) or []
+        if "ts_utc" not in header or column not in header:
+            raise ValueError(f"{path}: need ts_utc and {column} columns, got {header}")
+        it, iv = header.index("ts_utc"), header.index(column)
+        rows = [(r[it], r[iv]) for r in reader if len(r) > max(it, iv) and r[it]]
+
+    ts = np.array([t.rstrip("Z") for t, _ in rows], dtype="datetime64[s]").astype(np.int64)
+    wm2 = np.array([float(v) if v not in ("", "nan") else np.nan for _, v in rows], dtype=np.float64)
+    order = np.argsort(ts, kind="stable")
+    return Irradiance(ts[order], wm2[order])
+
+
+def asof_values(irr: Irradiance, t: np.ndarray) -> np.ndarray:
+    """
+    As-of join: irradiance at the last sample at or before each t (NaN before the first).
+    """
+    idx = np.searchsorted(irr.ts, t, side="right") - 1
+    out = irr.wm2[np.clip(idx, 0, max(len(irr) - 1, 0))] if len(irr) else np.full(len(t), np.nan)
+    return np.where(idx >= 0, out, np.nan)
+
+
+def interval_mean(irr: Irradiance, t0: np.ndarray, t1: np.ndarray) -> np.ndarray:
+    """
+    Mean W/m^2 over each [t0, t1]. NaN where the interval isn't covered.
+    """
+    cum = irr.cumulative_wh()
+    wh = np.interp(t1, irr.ts, cum) - np.interp(t0, irr.ts, cum)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = wh * 3600.0 / (t1 - t0)
+    covered = (t0 >= irr.ts[0]) & (t1 <= irr.ts[-1]) & (t1 > t0) if len(irr) else np.zeros(len(t0), bool)
+    return np.where(covered, mean, np.nan)
+
+
+@dataclass
+class BatterySteps:
+    """
+    Consecutive battery samples of one group, flattened across groups.
+    """
+    group: np.ndarray     # int32 group index
+    t0: np.ndarray        # int64 start of interval
+    t1: np.ndarray        # int64 end of interval
+    v0: np.ndarray        # float64 voltage at t0
+    v1: np.ndarray        # float64 voltage at t1
+
+
+def battery_steps(records: SoilRecords, groups: DeviceGroups) -> BatterySteps:
+    """
+    Every pair of consecutive valid battery readings within a group.
+    """
+    parts = []
+    for g, rows in enumerate(groups.rows):
+        rows = rows[~np.isnan(records.battery[rows])]
+        if len(rows) < 2:
+            continue
+        ts = records.timestamps[rows]
+        v = records.battery[rows].astype(np.float64)
+        parts.append((np.full(len(rows) - 1, g, np.int32), ts[:-1], ts[1:], v[:-1], v[1:]))
+    if not parts:
+        e = np.zeros(0)
+        return BatterySteps(np.zeros(0, np.int32), e.astype(np.int64), e.astype(np.int64), e, e)
+    return BatterySteps(*(np.concatenate(c) for c in zip(*parts)))
+
+
+@dataclass
+class ChargeModel:
+    names: List[str]
+    drain_v_per_h: np.ndarray   # dV/dt in the dark (normally < 0)
+    gain_v_per_h: np.ndarray    # extra dV/dt per kW/m^2 of irradiance
+    samples: np.ndarray         # steps used per group
+    r: np.ndarray               # correlation of dV/dt with irradiance
+
+    def rate(self, kw_m2: np.ndarray) -> np.ndarray:
+        """
+        dV/dt [V/h] per group (rows) for an irradiance series (columns).
+        """
+        return self.drain_v_per_h[:, None] + self.gain_v_per_h[:, None] * kw_m2[None, :]
+
+
+def fit_charge_model(steps: BatterySteps, irr: Irradiance, names: List[str], max_step_s: int = MAX_STEP_S) -> ChargeModel:
+    """
+    Least-squares dV/dt = drain + gain * irradiance for every group in one pass.
+    Groups with too little spread in irradiance get gain NaN.
+    """
+    dt = (steps.t1 - steps.t0).astype(np.float64)
+    x = interval_mean(irr, steps.t0, steps.t1) / 1000.0           # kW/m^2
+    y = (steps.v1 - steps.v0) / np.where(dt > 0, dt, np.nan) * 3600.0  # V/h
+    ok = np.isfinite(x) & np.isfinite(y) & (dt > 0) & (dt <= max_step_s)
+
+    g, x, y = steps.group[ok], x[ok], y[ok]
+    k = len(names)
+    n = np.bincount(g, minlength=k).astype(np.float64)
+    sx, sy = np.bincount(g, x, k), np.bincount(g, y, k)
+    sxx, syy, sxy = np.bincount(g, x * x, k), np.bincount(g, y * y, k), np.bincount(g, x * y, k)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        vx = n * sxx - sx * sx
+        vy = n * syy - sy * sy
+        cov = n * sxy - sx * sy
+        gain = np.where(vx > 1e-12, cov / vx, np.nan)
+        drain = np.where(n > 0, (sy - np.nan_to_num(gain) * sx) / n, np.nan)
+        r = np.where((vx > 1e-12) & (vy > 1e-12), cov / np.sqrt(vx * vy), np.nan)
+    return ChargeModel(names=list(names), drain_v_per_h=drain, gain_v_per_h=gain, samples=n.astype(np.int64), r=r)
+
+
+def predict_voltage(
+    model: ChargeModel,
+    irr: Irradiance,
+    v_start: np.ndarray,
+    full_v: float = DEFAULT_FULL_V,
+    t_start: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Voltage per group (rows) at each irradiance timestamp (columns), starting
+    from v_start at irr.ts[0], or at t_start[g] per group (NaN before it).
+    The battery is capped at full_v: with S the summed change,
+    V = v0 + S - max(0, running max of (v0 + S - full_v)).
+    """
+    kw = np.nan_to_num(irr.wm2) / 1000.0
+    dt_h = np.diff(irr.ts, prepend=irr.ts[:1]) / 3600.0
+    gain = np.nan_to_num(model.gain_v_per_h)
+    drain = np.nan_to_num(model.drain_v_per_h)
+    steps = (drain[:, None] + gain[:, None] * kw[None, :]) * dt_h[None, :]
+    before = None
+    if t_start is not None:
+        t0 = np.asarray(t_start, dtype=np.int64)[:, None]
+        steps[irr.ts[None, :] <= t0] = 0.0
+        before = irr.ts[None, :] < t0
+    s = np.cumsum(steps, axis=1)
+    v0 = np.asarray(v_start, dtype=np.float64)[:, None]
+    excess = np.maximum.accumulate(np.maximum(v0 + s - full_v, 0.0), axis=1)
+    volts = v0 + s - excess
+    if before is not None:
+        volts[before] = np.nan
+    return volts
+
+
+def low_windows(ts: np.ndarray, volts: np.ndarray, threshold: float = DEFAULT_LOW_V) -> List[Tuple[int, int, int, float]]:
+    """
+    (group, start, end, min V) for every run of samples below threshold.
+    """
+    low = volts < threshold
+    padded = np.zeros((low.shape[0], low.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = low
+    edges = np.diff(padded, axis=1)
+    out = []
+    for g, s in zip(*np.nonzero(edges == 1)):
+        e = int(np.argmax(edges[g, s:] == -1)) + s  # first index back at/above threshold
+        out.append((int(g), int(ts[s]), int(ts[e - 1]), float(volts[g, s:e].min())))
+    return out
+
+
+def last_readings(records: SoilRecords, groups: DeviceGroups) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (time, voltage) of each group's newest valid battery reading (NaN/-1 if none).
+    """
+    t = np.full(len(groups), -1, dtype=np.int64)
+    v = np.full(len(groups), np.nan)
+    for g, rows in enumerate(groups.rows):
+        rows = rows[~np.isnan(records.battery[rows])]
+        if len(rows):
+            t[g] = records.timestamps[rows[-1]]
+            v[g] = records.battery[rows[-1]]
+    return t, v
+
+
+def window_after(irr: Irradiance, start: int, horizon_s: Optional[int]) -> Irradiance:
+    """
+    Irradiance samples in [start, start + horizon_s).
+    """
+    lo = np.searchsorted(irr.ts, start)
+    hi = len(irr) if horizon_s is None else np.searchsorted(irr.ts, start + horizon_s)
+    return Irradiance(irr.ts[lo:hi], irr.wm2[lo:hi])
@@ -0,0 +1,257 @@
+"""
+feedcache.py
+
+Local SQLite cache of ThingSpeak channel feeds.
+
+Every fetched entry is stored under (channel_id, entry_id). Each channel also
+remembers the span it has been synced over, so a later request only downloads
+what lies outside that span (normally just entries newer than the last one
+cached). Range queries are answered from disk via the (channel_id, created_s)
+index.
+
+Stdlib only apart from the fetcher (requests).
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+from datetime import datetime, timezone
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from .livestore import connect_readonly
+from .thingspeak import ensure_utc, fetch_feeds_range
+
+
+DEFAULT_CACHE_PATH = "thingspeak_cache.sqlite3"
+FIELD_NAMES = tuple(f"field{i}" for i in range(1, 9))
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS feeds (
+    channel_id INTEGER NOT NULL,
+    entry_id   INTEGER NOT NULL,
+    created_at TEXT    NOT NULL,
+    created_s  INTEGER NOT NULL,
+    {", ".join(f"{f} TEXT" for f in FIELD_NAMES)},
+    PRIMARY KEY (channel_id, entry_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS feeds_by_time ON feeds (channel_id, created_s);
+CREATE TABLE IF NOT EXISTS channels (
+    channel_id  INTEGER PRIMARY KEY,
+    meta        TEXT,
+    synced_from INTEGER,
+    synced_to   INTEGER
+);
+"""
+
+
+def created_at_seconds(created_at: str) -> int:
+    """
+    ThingSpeak created_at ("2026-01-16T05:00:00Z") -> UTC epoch seconds.
+    """
+    s = created_at.strip()
+    if s.endswith("Z"):
+        s = s[:-1] + "+00:00"
+    return int(ensure_utc(datetime.fromisoformat(s)).timestamp())
+
+
+def _to_dt(epoch_s: int) -> datetime:
+    return datetime.fromtimestamp(epoch_s, timezone.utc)
+
+
+def _feed_row(created_at: str, entry_id: int, *fields) -> dict:
+    row = {"created_at": created_at, "entry_id": entry_id}
+    row.update({k: v for k, v in zip(FIELD_NAMES, fields) if v is not None})
+    return row
+
+
+class FeedCache:
+    """
+    On-disk feed store. One instance per thread (sqlite3 connections aren't shared).
+    With readonly=True the file must already exist; sync() and upsert() then fail.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, readonly: bool = False):
+        self.path = path
+        if readonly:
+            self.conn = connect_readonly(path)
+            return
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "FeedCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ---- Writes ----
+
+    def upsert(self, channel_id: int, feeds: Iterable[dict], channel_meta: Optional[dict] = None) -> int:
+        """
+        Store feed entries (feeds.json rows). Returns the number of rows written.
+        """
+        rows = [
+            (channel_id, int(f["entry_id"]), f["created_at"], created_at_seconds(f["created_at"]))
+            + tuple(f.get(name) for name in FIELD_NAMES)
+            for f in feeds
+        ]
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO feeds VALUES ({', '.join('?' * (4 + len(FIELD_NAMES)))})",
+                rows,
+            )
+            if channel_meta:
+                self.conn.execute(
+                    "INSERT INTO channels (channel_id, meta) VALUES (?, ?) "
+                    "ON CONFLICT(channel_id) DO UPDATE SET meta = excluded.meta",
+                    (channel_id, json.dumps(channel_meta)),
+                )
+        return len(rows)
+
+    def mark_synced(self, channel_id: int, start_s: int, end_s: int) -> None:
+        """
+        Widen the channel's synced span to include [start_s, end_s].
+        """
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO channels (channel_id, synced_from, synced_to) VALUES (?, ?, ?) "
+                "ON CONFLICT(channel_id) DO UPDATE SET "
+                "synced_from = MIN(COALESCE(synced_from, excluded.synced_from), excluded.synced_from), "
+                "synced_to = MAX(COALESCE(synced_to, excluded.synced_to), excluded.synced_to)",
+                (channel_id, start_s, end_s),
+            )
+
+    # ---- Reads ----
+
+    def synced_span(self, channel_id: int) -> Optional[Tuple[int, int]]:
+        row = self.conn.execute(
+            "SELECT synced_from, synced_to FROM channels WHERE channel_id = ?", (channel_id,)
+        ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return int(row[0]), int(row[1])
+
+    def last_entry(self, channel_id: int) -> Optional[Tuple[int, int]]:
+        """
+        (entry_id, created_s) of the newest cached entry, or None.
+        """
+        row = self.conn.execute(
+            "SELECT entry_id, created_s FROM feeds WHERE channel_id = ? ORDER BY entry_id DESC LIMIT 1",
+            (channel_id,),
+        ).fetchone()
+        return (int(row[0]), int(row[1])) if row else None
+
+    def channel_ids(self) -> List[int]:
+        return [int(c) for (c,) in self.conn.execute("SELECT DISTINCT channel_id FROM feeds ORDER BY channel_id")]
+
+    def channel_meta(self, channel_id: int) -> dict:
+        row = self.conn.execute("SELECT meta FROM channels WHERE channel_id = ?", (channel_id,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else {}
+
+    def query(self, channel_id: int, start: datetime, end: datetime) -> List[dict]:
+        """
+        Cached entries with start <= created_at <= end, as feeds.json rows sorted by entry_id.
+        """
+        cur = self.conn.execute(
+            f"SELECT created_at, entry_id, {', '.join(FIELD_NAMES)} FROM feeds "
+            "WHERE channel_id = ? AND created_s BETWEEN ? AND ? ORDER BY entry_id",
+            (channel_id, int(ensure_utc(start).timestamp()), int(ensure_utc(end).timestamp())),
+        )
+        return [_feed_row(*row) for row in cur]
+
+    def entries_after(self, channel_id: int, entry_id: int) -> List[dict]:
+        """
+        Cached entries with a larger entry_id, as feeds.json rows sorted by entry_id.
+        """
+        cur = self.conn.execute(
+            f"SELECT created_at, entry_id, {', '.join(FIELD_NAMES)} FROM feeds "
+            "WHERE channel_id = ? AND entry_id > ? ORDER BY entry_id",
+            (channel_id, entry_id),
+        )
+        return [_feed_row(*row) for row in cur]
+
+    # ---- Sync ----
+
+    def missing_ranges(self, channel_id: int, start_s: int, end_s: int) -> List[Tuple[int, int]]:
+        """
+        Parts of [start_s, end_s] not yet synced. Ranges are extended to touch
+        the synced span so it stays one contiguous block. The upper part starts
+        at the newest cached entry so nothing posted right at the previous sync
+        boundary is missed.
+        """
+        span = self.synced_span(channel_id)
+        if span is None:
+            return [(start_s, end_s)]
+        lo, hi = span
+        out = []
+        if start_s < lo:
+            out.append((start_s, lo))
+        if end_s > hi:
+            last = self.last_entry(channel_id)
+            resume = max(lo, min(hi, last[1])) if last else hi
+            out.append((resume, end_s))
+        return out
+
+    def sync(
+        self,
+        channel_id: int,
+        start: datetime,
+        end: datetime,
+        read_api_key: Optional[str] = None,
+        fetch: Callable[..., dict] = fetch_feeds_range,
+        **fetch_kwargs,
+    ) -> int:
+        """
+        Download whatever part of [start, end] isn't cached yet. Returns rows written.
+        `end` is clamped to now so the synced span never claims the future.
+        """
+        start_s = int(ensure_utc(start).timestamp())
+        now_s = int(datetime.now(timezone.utc).timestamp())
+        end_s = min(int(ensure_utc(end).timestamp()), now_s)
+
+        written = 0
+        for a, b in self.missing_ranges(channel_id, start_s, end_s):
+            if a >= b:
+                continue
+            data = fetch(channel_id=channel_id, start=_to_dt(a), end=_to_dt(b), read_api_key=read_api_key, **fetch_kwargs)
+            written += self.upsert(channel_id, data.get("feeds") or [], data.get("channel"))
+            self.mark_synced(channel_id, a, b)
+        return written
+
+    def feeds(
+        self,
+        channel_id: int,
+        start: datetime,
+        end: datetime,
+        read_api_key: Optional[str] = None,
+        offline: bool = False,
+        **fetch_kwargs,
+    ) -> dict:
+        """
+        feeds.json-shaped result for [start, end]: sync the missing part, then read from disk.
+        With offline=True nothing is downloaded.
+        """
+        if not offline:
+            self.sync(channel_id, start, end, read_api_key=read_api_key, **fetch_kwargs)
+        return {"channel": self.channel_meta(channel_id), "feeds": self.query(channel_id, start, end)}
+
+
+def cached_fetch(
+    channel_id: int,
+    start: datetime,
+    end: datetime,
+    read_api_key: Optional[str] = None,
+    cache_path: str = DEFAULT_CACHE_PATH,
+    **fetch_kwargs,
+) -> dict:
+    """
+    One-shot helper: open the cache, sync [start, end], return feeds.json-shaped data.
+    """
+    with FeedCache(cache_path) as cache:
+        return cache.feeds(channel_id, start, end, read_api_key=read_api_key, **fetch_kwargs)
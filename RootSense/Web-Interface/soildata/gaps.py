@@ -0,0 +1,192 @@
+"""
+gaps.py
+
+Reporting-gap detection over SoilRecords.
+
+All devices are handled in one pass: rows are sorted by (device, time), np.diff
+gives the interval to the previous report, and each row is compared against
+its device's expected interval + tolerance. Results come back as one
+structured array instead of a print per gap.
+
+Requires NumPy.
+"""
+
+from __future__ import annotations
+
+import csv
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .records import SoilRecords, utc_to_local_datetime64
+
+
+@dataclass(frozen=True)
+class IntervalProfile:
+    """
+    How often a device is expected to report, and how late it may be.
+    A gap is any interval > expected_s + tolerance_s.
+    """
+    expected_s: int = 3600
+    tolerance_s: int = 300
+
+
+# Workers report hourly; 65 minutes was the old hardcoded threshold.
+DEFAULT_PROFILE = IntervalProfile(expected_s=3600, tolerance_s=300)
+
+GAP_DTYPE = np.dtype([
+    ("group", np.int32),           # index into GapTable.groups
+    ("entry_id", np.int64),        # entry that ended the gap
+    ("start", np.int64),           # UTC epoch seconds of last report before the gap
+    ("end", np.int64),             # UTC epoch seconds of first report after the gap
+    ("duration", np.int64),        # seconds
+    ("battery_before", np.float32),
+    ("battery_after", np.float32),
+    ("missed", np.int32),          # reports that should have arrived in between
+])
+
+
+@dataclass
+class GapTable:
+    rows: np.ndarray    # structured, GAP_DTYPE, sorted by (group, start)
+    groups: List[str]   # group labels
+
+    def __len__(self) -> int:
+        return int(self.rows.shape[0])
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Gaps per group (groups with none are omitted).
+        """
+        codes, n = np.unique(self.rows["group"], return_counts=True)
+        return {self.groups[c]: int(k) for c, k in zip(codes, n)}
+
+    def format_lines(self, tz: str = "America/Chicago") -> List[str]:
+        """
+        Human-readable lines, one per gap (times shown in local tz).
+        """
+        if len(self) == 0:
+            return []
+        end_local = np.datetime_as_string(utc_to_local_datetime64(self.rows["end"], tz), unit="s")
+        return [
+            f"Gap detected at row entry {entry_id} with a gap of "
+            f"{dur // 3600}:{dur // 60 % 60:02d}:{dur % 60:02d} for sensor {self.groups[g]} "
+            f"at time {t.replace('T', ' ')} with Batt,{batt:g} ({missed} missed)"
+            for (g, entry_id, _, _, dur, _, batt, missed), t in zip(self.rows.tolist(), end_local)
+        ]
+
+    def write_csv(self, path: str, tz: str = "America/Chicago") -> None:
+        """
+        Write the table with local start/end columns alongside the epoch values.
+        """
+        start_local = np.datetime_as_string(utc_to_local_datetime64(self.rows["start"], tz), unit="s")
+        end_local = np.datetime_as_string(utc_to_local_datetime64(self.rows["end"], tz), unit="s")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["device", "entry_id", "start_utc_s", "end_utc_s", "start_local", "end_local",
+                        "duration_s", "battery_before", "battery_after", "missed"])
+            w.writerows(
+                [self.groups[g], entry_id, start, end, s, e, dur, bb, ba, missed]
+                for (g, entry_id, start, end, dur, bb, ba, missed), s, e
+                in zip(self.rows.tolist(), start_local.tolist(), end_local.tolist())
+            )
+
+
+def find_gaps_arrays(
+    timestamps: np.ndarray,
+    group: np.ndarray,
+    expected_s: np.ndarray,
+    tolerance_s: np.ndarray,
+    battery: Optional[np.ndarray] = None,
+    entry_ids: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Core engine on plain arrays.
+    group[i] is the group index of row i (negative = ignore the row);
+    expected_s/tolerance_s are indexed by group.
+    Returns a GAP_DTYPE array sorted by (group, start).
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    group = np.asarray(group)
+    n = timestamps.shape[0]
+    if battery is None:
+        battery = np.full(n, np.nan, dtype=np.float32)
+    if entry_ids is None:
+        entry_ids = np.full(n, -1, dtype=np.int64)
+
+    rows = np.flatnonzero(group >= 0)
+    order = rows[np.lexsort((timestamps[rows], group[rows]))]
+
+    g = group[order]
+    t = timestamps[order]
+    same = g[1:] == g[:-1]
+    delta = np.diff(t)
+    limit = (np.asarray(expected_s, dtype=np.int64) + np.asarray(tolerance_s, dtype=np.int64))[g[1:]]
+    hit = np.flatnonzero(same & (delta > limit))
+
+    before = order[hit]
+    after = order[hit + 1]
+    expected = np.asarray(expected_s, dtype=np.int64)[g[hit + 1]]
+
+    out = np.empty(hit.shape[0], dtype=GAP_DTYPE)
+    out["group"] = g[hit + 1]
+    out["entry_id"] = entry_ids[after]
+    out["start"] = t[hit]
+    out["end"] = t[hit + 1]
+    out["duration"] = delta[hit]
+    out["battery_before"] = battery[before]
+    out["battery_after"] = battery[after]
+    out["missed"] = np.maximum(np.rint(delta[hit] / np.maximum(expected, 1)).astype(np.int64) - 1, 1)
+    return out
+
+
+def find_gaps(
+    records: SoilRecords,
+    group_codes: Optional[np.ndarray] = None,
+    group_names: Optional[List[str]] = None,
+    profiles: Optional[Dict[str, IntervalProfile]] = None,
+    default: IntervalProfile = DEFAULT_PROFILE,
+) -> GapTable:
+    """
+    Find gaps per group of devices.
+
+    By default each device label is its own group. To merge/rename devices,
+    pass group_codes (device code -> group index, -1 to skip) and group_names.
+    `profiles` maps group name -> IntervalProfile; unnamed groups use `default`.
+    """
+    if group_codes is None:
+        group_codes = np.arange(len(records.devices), dtype=np.int32)
+        group_names = list(records.devices)
+    elif group_names is None:
+        raise ValueError("group_names is required when group_codes is given")
+
+    profiles = profiles or {}
+    chosen = [profiles.get(name, default) for name in group_names]
+    expected = np.array([p.expected_s for p in chosen], dtype=np.int64)
+    tolerance = np.array([p.tolerance_s for p in chosen], dtype=np.int64)
+
+    group = np.asarray(group_codes, dtype=np.int32)[records.device_codes]
+    rows = find_gaps_arrays(
+        timestamps=records.timestamps,
+        group=group,
+        expected_s=expected,
+        tolerance_s=tolerance,
+        battery=records.battery,
+        entry_ids=records.entry_ids,
+    )
+    return GapTable(rows=rows, groups=list(group_names))
+
+
+def parse_profile(spec: str) -> tuple[str, IntervalProfile]:
+    """
+    "NAME=EXPECTED[:TOLERANCE]" (seconds) -> (NAME, IntervalProfile)
+    """
+    name, sep, rest = spec.partition("=")
+    if not sep or not name:
+        raise ValueError(f"Bad profile {spec!r}; expected NAME=SECONDS[:TOLERANCE]")
+    exp, _, tol = rest.partition(":")
+    return name, IntervalProfile(
+        expected_s=int(exp),
+        tolerance_s=int(tol) if tol else DEFAULT_PROFILE.tolerance_s,
+    )
@@ -0,0 +1,277 @@
+"""
+livestore.py
+
+Local time-series store for soil readings decoded straight off the mesh.
+
+mesh-logger.py sees every worker report as a text packet:
+    @w2r<TAB>Moist,+007.88,...(8 vals)<TAB>Temp,+010.83,...(8 vals)<TAB>Batt,4.55
+
+parse_payload() turns that into a typed SoilReading, and LiveStore appends
+batches of them to SQLite (one row per report, one REAL column per depth).
+The analysis scripts read the same store back as SoilRecords, so a gateway
+can check gaps or plot batteries without a ThingSpeak export.
+
+Device labels match what the hub forwards to ThingSpeak ("5f90: @w2r", the
+last four hex digits of the node number plus the role), so group_devices()
+and the gap profiles work unchanged.
+
+Stdlib only for writing (the logger runs on the gateway); reading back as
+SoilRecords needs NumPy.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+DEFAULT_STORE_PATH = "soil_live.sqlite3"
+# Imported exports go to their own store: the same readings reach the live
+# store through the logger under different keys, so mixing them double-counts.
+DEFAULT_EXPORT_STORE_PATH = "soil_export.sqlite3"
+DEPTHS = 8  # same as records.DEPTHS; kept here so writing doesn't import NumPy
+
+# A packet heard again (re-delivered, or via another relay) arrives in a
+# different second, so exact-time matching can't catch it. Packet ids are
+# random per node, so the same (node, packet id) within this window is the
+# same packet.
+DEDUPE_WINDOW_S = 3600
+
+MOIST_COLS = tuple(f"moist{i}" for i in range(1, DEPTHS + 1))
+TEMP_COLS = tuple(f"temp{i}" for i in range(1, DEPTHS + 1))
+
+# device is part of the key so imported rows (node 0, no packet id of their
+# own) from different devices in the same second never merge
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS readings (
+    id        INTEGER PRIMARY KEY,
+    time_s    INTEGER NOT NULL,
+    node      INTEGER NOT NULL,
+    packet_id INTEGER NOT NULL,
+    device    TEXT    NOT NULL,
+    {", ".join(f"{c} REAL" for c in MOIST_COLS + TEMP_COLS)},
+    battery   REAL,
+    UNIQUE (node, packet_id, device, time_s)
+);
+CREATE INDEX IF NOT EXISTS readings_by_time ON readings (time_s);
+"""
+
+
+@dataclass
+class SoilReading:
+    time_s: int
+    node: int
+    device: str
+    moisture: List[Optional[float]] = field(default_factory=lambda: [None] * DEPTHS)
+    temperature: List[Optional[float]] = field(default_factory=lambda: [None] * DEPTHS)
+    battery: Optional[float] = None
+    packet_id: int = 0
+
+
+def _series(part: str) -> List[Optional[float]]:
+    values = [p.strip() for p in part.split(",")[1:]]
+    out: List[Optional[float]] = []
+    for v in values[:DEPTHS]:
+        try:
+            out.append(float(v))
+        except ValueError:
+            out.append(None)
+    return out + [None] * (DEPTHS - len(out))
+
+
+def device_label(node: int, role: str) -> str:
+    """
+    "5f90: @w2r", as the hub forwards it to ThingSpeak.
+    """
+    return f"{node & 0xFFFF:04x}: {role}"
+
+
+def content_id(device: str, time_s: int, moisture, temperature, battery) -> int:
+    """
+    Stable stand-in packet id for a reading without one (ThingSpeak web
+    exports have no entry_id column, Notehub readings never do), so
+    re-imports still dedupe while different readings in the same second
+    don't collide. Negative: never equal to a real entry or packet id, and
+    skipped by append()'s packet-id window.
+    """
+    key = repr((device, int(time_s), list(moisture), list(temperature), battery)).encode("utf-8")
+    return -2 - zlib.crc32(key)
+
+
+def parse_payload(text: str, node: int, time_s: int, packet_id: int = 0) -> Optional[SoilReading]:
+    """
+    One soil report packet -> SoilReading, or None if the text isn't a report
+    (chat, @nodes queries, empty telemetry packets, ...).
+    """
+    if not text or "Moist," not in text and "Temp," not in text and "Batt," not in text:
+        return None
+
+    parts = [p.strip() for p in text.split("\t")]
+    role = parts[0] if parts[0].startswith("@") else ""
+    rec = SoilReading(
+        time_s=time_s,
+        node=node,
+        device=device_label(node, role) if role else f"{node & 0xFFFF:04x}",
+        packet_id=packet_id,
+    )
+    for p in parts:
+        if p.startswith("Moist,"):
+            rec.moisture = _series(p)
+        elif p.startswith("Temp,"):
+            rec.temperature = _series(p)
+        elif p.startswith("Batt,"):
+            try:
+                rec.battery = float(p[5:])
+            except ValueError:
+                pass
+    return rec
+
+
+def connect_readonly(path: str) -> sqlite3.Connection:
+    """
+    Read-only connection to an existing SQLite file: readers (the API server,
+    analysis scripts) never write to a store another process owns.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    return sqlite3.connect(Path(os.path.abspath(path)).as_uri() + "?mode=ro", uri=True)
+
+
+def sqlite_tables(path: str) -> set:
+    """
+    Table names in a SQLite file (empty if it isn't one).
+    """
+    try:
+        conn = connect_readonly(path)
+    except sqlite3.Error:
+        return set()
+    try:
+        return {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    except sqlite3.DatabaseError:
+        return set()
+    finally:
+        conn.close()
+
+
+class LiveStore:
+    """
+    SQLite reading store. One instance per thread (sqlite3 connections aren't shared).
+    With readonly=True the file must already exist and nothing is written.
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH, readonly: bool = False):
+        self.path = path
+        if readonly:
+            self.conn = connect_readonly(path)
+            return
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")  # readers don't block the logger
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "LiveStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def append(self, readings: Iterable[SoilReading]) -> int:
+        """
+        Insert a batch in one transaction. Duplicate deliveries of the same
+        packet (same node, packet id and device within DEDUPE_WINDOW_S) are
+        ignored. Returns the number of rows actually inserted.
+        """
+        w = DEDUPE_WINDOW_S
+        rows = [
+            (r.time_s, r.node, r.packet_id, r.device, *r.moisture, *r.temperature, r.battery,
+             r.packet_id, r.node, r.packet_id, r.device, r.time_s - w, r.time_s + w)
+            for r in readings
+        ]
+        before = self.conn.total_changes
+        if rows:
+            cols = ("time_s", "node", "packet_id", "device") + MOIST_COLS + TEMP_COLS + ("battery",)
+            with self.conn:
+                # packet_id <= 0 means "no packet id": only the UNIQUE key applies
+                self.conn.executemany(
+                    f"INSERT OR IGNORE INTO readings ({', '.join(cols)}) SELECT {', '.join('?' * len(cols))} "
+                    "WHERE ? <= 0 OR NOT EXISTS (SELECT 1 FROM readings "
+                    "WHERE node = ? AND packet_id = ? AND device = ? AND time_s BETWEEN ? AND ?)",
+                    rows,
+                )
+        return self.conn.total_changes - before
+
+    def span(self) -> Optional[Tuple[int, int]]:
+        """
+        (first, last) reading time in UTC epoch seconds, or None when empty.
+        """
+        row = self.conn.execute("SELECT MIN(time_s), MAX(time_s) FROM readings").fetchone()
+        return (int(row[0]), int(row[1])) if row[0] is not None else None
+
+    def query(self, start_s: Optional[int] = None, end_s: Optional[int] = None, device: Optional[str] = None) -> List[tuple]:
+        """
+        Raw rows (id, time_s, device, moist1..8, temp1..8, battery) with
+        start_s <= time_s < end_s, oldest first. `device` is a substring match.
+        """
+        where, params = [], []
+        if start_s is not None:
+            where.append("time_s >= ?")
+            params.append(start_s)
+        if end_s is not None:
+            where.append("time_s < ?")
+            params.append(end_s)
+        if device:
+            where.append("instr(device, ?) > 0")
+            params.append(device)
+        sql = (
+            f"SELECT id, time_s, device, {', '.join(MOIST_COLS + TEMP_COLS)}, battery FROM readings"
+            + (" WHERE " + " AND ".join(where) if where else "")
+            + " ORDER BY time_s, id"
+        )
+        return self.conn.execute(sql, params).fetchall()
+
+    def records(self, start_s: Optional[int] = None, end_s: Optional[int] = None, device: Optional[str] = None):
+        """
+        Same as query(), as SoilRecords for the analysis scripts (needs NumPy).
+        """
+        import numpy as np
+
+        from .records import SoilRecords, intern_devices
+
+        rows = self.query(start_s, end_s, device)
+        n = len(rows)
+        if n:
+            values = np.array([r[3:] for r in rows], dtype=np.float32)  # None -> nan
+        else:
+            values = np.zeros((0, 2 * DEPTHS + 1), dtype=np.float32)
+        codes, labels = intern_devices([r[2] for r in rows])
+        return SoilRecords(
+            timestamps=np.fromiter((r[1] for r in rows), dtype=np.int64, count=n),
+            entry_ids=np.fromiter((r[0] for r in rows), dtype=np.int64, count=n),
+            device_codes=codes,
+            devices=labels,
+            moisture=values[:, :DEPTHS],
+            temperature=values[:, DEPTHS:2 * DEPTHS],
+            battery=values[:, 2 * DEPTHS],
+        )
+
+
+def is_store_path(path: str) -> bool:
+    return path.endswith((".sqlite3", ".sqlite", ".db"))
+
+
+def load_source(path: str, tz: str | object = None):
+    """
+    SoilRecords from either a ThingSpeak CSV export or a LiveStore file.
+    """
+    from .records import DEFAULT_TZ, load_export
+
+    if is_store_path(path):
+        with LiveStore(path, readonly=True) as store:
+            return store.records()
+    return load_export(path, tz or DEFAULT_TZ)
@@ -0,0 +1,227 @@
+"""
+notecard.py
+
+Decode the batched sensors.qo notes that Mega-Soil-Notecard-Relay.ino sends
+through Notehub, and bulk-load them as SoilRecords.
+
+One note per measurement cycle holds every probe the hub collected:
+
+    {"readings": [
+        {"delta_t": "1", "dev": "hub",  "moist": "Moist,+001.91,...", "temp": "Temp,+023.13,..."},
+        {"delta_t": "1", "dev": "@w1r", "moist": "Moist,...",         "temp": "Temp,..."}
+    ]}
+
+A Notehub event export (JSON lines, optionally .gz) has one event per line
+with the note under "body" and the Notecard's note time under "when"
+("received" is used when "when" is missing).
+
+delta_t follows ThingSpeak's bulk-update convention: seconds since the
+previous reading. The note is added right after the last reading is taken,
+so the last reading is stamped at "when" and each earlier one delta_t
+seconds before the one after it.
+
+Exports can run to millions of events: lines are streamed and expanded into
+chunks of parsed columns, so only the numeric arrays are kept. Duplicate
+deliveries (same event uid) are skipped; only the last DEDUPE_WINDOW uids
+are remembered, since a redelivery lands close to the original in the
+export. (A reading store also drops repeats by content when loaded.)
+
+Requires NumPy.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .records import MISSING_ENTRY_ID, SoilRecords, parse_depth_strings
+
+NOTE_FILE = "sensors.qo"
+DEFAULT_CHUNK_ROWS = 100_000
+DEDUPE_WINDOW = 100_000  # recent event uids remembered for skipping duplicates
+
+# (time_s, device, moist string, temp string)
+NoteReading = Tuple[int, str, str, str]
+
+
+@dataclass
+class IngestStats:
+    lines: int = 0
+    notes: int = 0
+    readings: int = 0
+    duplicates: int = 0      # events already seen (same uid)
+    skipped: int = 0         # other notefiles, or notes without readings
+    bad_lines: int = 0       # not JSON, or no usable time
+
+    def summary(self) -> str:
+        return (
+            f"{self.lines} lines, {self.notes} {NOTE_FILE} notes -> {self.readings} readings "
+            f"({self.duplicates} duplicate, {self.skipped} skipped, {self.bad_lines} bad lines)"
+        )
+
+
+def open_export(path: str) -> IO[str]:
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8", buffering=1 << 20)
+
+
+def event_time(event: dict) -> Optional[float]:
+    for key in ("when", "received"):
+        value = event.get(key)
+        if isinstance(value, (int, float)) and value > 0:
+            return float(value)
+    return None
+
+
+def _delta(value) -> float:
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def note_readings(event: dict, per_notecard: bool = False) -> Optional[List[NoteReading]]:
+    """
+    One Notehub event -> its readings, oldest first. None if the event isn't
+    a sensors.qo note with readings (or has no time).
+
+    With per_notecard, device labels get the last four characters of the
+    Notecard's device uid ("5425: @w1r"), for fleets of more than one hub.
+    """
+    if event.get("file", NOTE_FILE) != NOTE_FILE:
+        return None
+    body = event.get("body") or {}
+    points = body.get("readings") if isinstance(body, dict) else None
+    if not isinstance(points, list) or not points:
+        return None
+    when = event_time(event)
+    if when is None:
+        return None
+
+    prefix = ""
+    if per_notecard:
+        uid = str(event.get("device") or "")
+        prefix = uid[-4:] + ": " if uid else ""
+
+    # Offsets back from the last reading: the last is at `when`
+    deltas = [_delta(p.get("delta_t")) if isinstance(p, dict) else 0.0 for p in points]
+    back = np.concatenate((np.cumsum(deltas[:0:-1])[::-1], [0.0])) if len(deltas) > 1 else np.zeros(1)
+    out = []
+    for p, offset in zip(points, back.tolist()):
+        if not isinstance(p, dict) or not p.get("dev"):
+            continue
+        out.append((int(round(when - offset)), prefix + str(p["dev"]).strip(), p.get("moist") or "", p.get("temp") or ""))
+    return out
+
+
+def iter_readings(
+    lines: Iterable[str],
+    per_notecard: bool = False,
+    stats: Optional[IngestStats] = None,
+    window: int = DEDUPE_WINDOW,
+) -> Iterator[NoteReading]:
+    """
+    Stream every reading out of an export's lines. An event whose uid is among
+    the last `window` uids seen is a duplicate.
+    """
+    stats = stats if stats is not None else IngestStats()
+    seen: "OrderedDict[str, None]" = OrderedDict()  # least recently seen first
+    for line in lines:
+        stats.lines += 1
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            event = json.loads(line)
+        except ValueError:
+            stats.bad_lines += 1
+            continue
+        if not isinstance(event, dict):
+            stats.bad_lines += 1
+            continue
+        uid = event.get("event")
+        if uid:
+            if uid in seen:
+                seen.move_to_end(uid)
+                stats.duplicates += 1
+                continue
+            seen[uid] = None
+            if len(seen) > window:
+                seen.popitem(last=False)
+        readings = note_readings(event, per_notecard)
+        if readings is None:
+            if event.get("file", NOTE_FILE) == NOTE_FILE and event_time(event) is None:
+                stats.bad_lines += 1
+            else:
+                stats.skipped += 1
+            continue
+        stats.notes += 1
+        stats.readings += len(readings)
+        yield from readings
+
+
+def _chunk_records(chunk: List[NoteReading], lookup: Dict[str, int]) -> SoilRecords:
+    n = len(chunk)
+    ts, devs, moist, temp = zip(*chunk) if n else ((), (), (), ())
+    return SoilRecords(
+        timestamps=np.fromiter(ts, dtype=np.int64, count=n),
+        entry_ids=np.full(n, MISSING_ENTRY_ID, dtype=np.int64),
+        device_codes=np.fromiter((lookup.setdefault(d, len(lookup)) for d in devs), dtype=np.int32, count=n),
+        devices=list(lookup),
+        moisture=parse_depth_strings(moist, "Moist"),
+        temperature=parse_depth_strings(temp, "Temp"),
+        battery=np.full(n, np.nan, dtype=np.float32),  # the relay doesn't report battery
+    )
+
+
+def iter_record_chunks(
+    path: str,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    per_notecard: bool = False,
+    stats: Optional[IngestStats] = None,
+) -> Iterator[SoilRecords]:
+    """
+    SoilRecords of up to chunk_rows readings at a time, in file order. Device
+    codes are shared across chunks (each chunk's `devices` is the list so far).
+    """
+    lookup: Dict[str, int] = {}
+    chunk: List[NoteReading] = []
+    with open_export(path) as f:
+        for reading in iter_readings(f, per_notecard, stats):
+            chunk.append(reading)
+            if len(chunk) >= chunk_rows:
+                yield _chunk_records(chunk, lookup)
+                chunk = []
+    if chunk:
+        yield _chunk_records(chunk, lookup)
+
+
+def load_notehub_export(
+    path: str,
+    per_notecard: bool = False,
+    stats: Optional[IngestStats] = None,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+) -> SoilRecords:
+    """
+    Whole export as one SoilRecords, sorted by time.
+    """
+    chunks = list(iter_record_chunks(path, chunk_rows, per_notecard, stats))
+    if not chunks:
+        return _chunk_records([], {})
+    order = np.argsort(np.concatenate([c.timestamps for c in chunks]), kind="stable")
+    merged = SoilRecords(
+        timestamps=np.concatenate([c.timestamps for c in chunks]),
+        entry_ids=np.concatenate([c.entry_ids for c in chunks]),
+        device_codes=np.concatenate([c.device_codes for c in chunks]),
+        devices=chunks[-1].devices,
+        moisture=np.concatenate([c.moisture for c in chunks]),
+        temperature=np.concatenate([c.temperature for c in chunks]),
+        battery=np.concatenate([c.battery for c in chunks]),
+    )
+    return merged.take(order)
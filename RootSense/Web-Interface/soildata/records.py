@@ -0,0 +1,482 @@
+"""
+records.py
+
+Parse a ThingSpeak soil export once into NumPy-backed columns.
+
+Each RootSense report is one row:
+    created, device, "Moist,+001.58,...(8 vals)", "Temp,+020.27,...(8 vals)", "Batt,3.9"
+
+Instead of splitting those strings per row, the whole column is joined and
+handed to NumPy in one call. Rows that don't fit the expected shape fall back
+to a per-row parse and come out as NaN where unusable.
+
+Understands both header styles we have on disk:
+- Web export:  Created (Chicago), Entry ID, Device (field1), Soil Moist (field3), ...
+- Channel:     created_at, entry_id, field1 (device), field2 (moist), field3 (temp), field4 (batt)
+
+Requires NumPy.
+"""
+
+from __future__ import annotations
+
+import csv
+import warnings
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from .timestamps import try_parse_datetime
+
+
+DEFAULT_TZ = "America/Chicago"
+DEPTHS = 8  # sensors per probe
+
+MISSING_ENTRY_ID = -1
+
+# Header keyword -> column role. Matched case-insensitively against the header text.
+COLUMN_KEYWORDS = {
+    "created": ("created",),
+    "entry_id": ("entry",),
+    "device": ("device",),
+    "moisture": ("moist",),
+    "temperature": ("temp",),
+    "battery": ("batt",),
+}
+
+# Channel field layout (same as thingspeak-graphs.html) when headers are bare fieldN
+DEFAULT_FIELD_MAP = {
+    "device": "field1",
+    "moisture": "field2",
+    "temperature": "field3",
+    "battery": "field4",
+}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+@dataclass
+class SoilRecords:
+    """
+    Column store for one export. Row i of every array belongs to the same report.
+    """
+    timestamps: np.ndarray    # int64 epoch seconds (UTC), shape (N,)
+    entry_ids: np.ndarray     # int64, MISSING_ENTRY_ID when the export has none
+    device_codes: np.ndarray  # int32 index into `devices`
+    devices: List[str]        # device labels, first-seen order
+    moisture: np.ndarray      # float32 (N, DEPTHS), NaN where missing
+    temperature: np.ndarray   # float32 (N, DEPTHS), NaN where missing
+    battery: np.ndarray       # float32 (N,), NaN where missing
+
+    def __len__(self) -> int:
+        return int(self.timestamps.shape[0])
+
+    def take(self, idx: np.ndarray) -> "SoilRecords":
+        """
+        Row subset (index or boolean array). Device labels are kept as-is.
+        """
+        return SoilRecords(
+            timestamps=self.timestamps[idx],
+            entry_ids=self.entry_ids[idx],
+            device_codes=self.device_codes[idx],
+            devices=self.devices,
+            moisture=self.moisture[idx],
+            temperature=self.temperature[idx],
+            battery=self.battery[idx],
+        )
+
+    def codes_matching(self, text: str) -> np.ndarray:
+        """
+        Device codes whose label contains `text`. Tests the distinct labels, not every row.
+        """
+        return np.array([i for i, d in enumerate(self.devices) if text in d], dtype=np.int32)
+
+    def rows_for_codes(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Row indices (file order) whose device code is in `codes`.
+        """
+        return np.flatnonzero(np.isin(self.device_codes, codes))
+
+
+# ---- Timestamps ----
+
+# (strptime format, length of the fixed part, digit fields as (name, offset, width))
+_FIXED_LAYOUTS = (
+    ("%m/%d/%Y, %H:%M:%S", 20, (("Y", 6, 4), ("m", 0, 2), ("d", 3, 2), ("H", 12, 2), ("M", 15, 2), ("S", 18, 2))),
+    ("%m/%d/%Y %H:%M:%S", 19, (("Y", 6, 4), ("m", 0, 2), ("d", 3, 2), ("H", 11, 2), ("M", 14, 2), ("S", 17, 2))),
+    ("%Y-%m-%d %H:%M:%S", 19, (("Y", 0, 4), ("m", 5, 2), ("d", 8, 2), ("H", 11, 2), ("M", 14, 2), ("S", 17, 2))),
+    ("%Y-%m-%dT%H:%M:%S", 19, (("Y", 0, 4), ("m", 5, 2), ("d", 8, 2), ("H", 11, 2), ("M", 14, 2), ("S", 17, 2))),
+)
+
+
+def _utcoffset_seconds(local_epoch_s: int, tz) -> int:
+    """
+    UTC offset (seconds) for a naive local wall-clock time, matching dt.replace(tzinfo=tz).
+    """
+    dt = (_EPOCH + timedelta(seconds=int(local_epoch_s))).replace(tzinfo=tz)
+    return int(dt.utcoffset().total_seconds())
+
+
+def local_to_utc(local_s: np.ndarray, tz) -> np.ndarray:
+    """
+    Convert naive local epoch seconds to UTC epoch seconds.
+    Offsets are looked up once per distinct local hour (DST switches on the hour).
+    """
+    if local_s.size == 0:
+        return local_s.astype(np.int64)
+    hours, inverse = np.unique(local_s // 3600, return_inverse=True)
+    offsets = np.array([_utcoffset_seconds(h * 3600, tz) for h in hours], dtype=np.int64)
+    return local_s - offsets[inverse.reshape(-1)]
+
+
+def utc_to_local_datetime64(epoch_s: np.ndarray, tz: str | object = DEFAULT_TZ) -> np.ndarray:
+    """
+    UTC epoch seconds -> naive local datetime64[s] (for plotting in local time).
+    """
+    if isinstance(tz, str):
+        tz = ZoneInfo(tz)
+    epoch_s = np.asarray(epoch_s, dtype=np.int64)
+    if epoch_s.size == 0:
+        return epoch_s.astype("datetime64[s]")
+    hours, inverse = np.unique(epoch_s // 3600, return_inverse=True)
+    offsets = np.array(
+        [int(datetime.fromtimestamp(int(h) * 3600, tz).utcoffset().total_seconds()) for h in hours],
+        dtype=np.int64,
+    )
+    return (epoch_s + offsets[inverse.reshape(-1)]).astype("datetime64[s]")
+
+
+def _days_from_civil(y: np.ndarray, m: np.ndarray, d: np.ndarray) -> np.ndarray:
+    """
+    Days since 1970-01-01 for proleptic Gregorian dates (vectorized).
+    """
+    y = y - (m <= 2)
+    era = y // 400
+    yoe = y - era * 400
+    doy = (153 * (m + np.where(m > 2, -3, 9)) + 2) // 5 + d - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def _fixed_layout_epoch(values: Sequence[str], tz) -> Optional[np.ndarray]:
+    """
+    Fast path: every value has the same fixed-width layout as the first one.
+    Returns None if the column doesn't qualify (caller falls back).
+    """
+    first = values[0]
+    width = len(first)
+
+    for fmt, core_len, fields in _FIXED_LAYOUTS:
+        if width < core_len:
+            continue
+        try:
+            datetime.strptime(first[:core_len], fmt)
+        except ValueError:
+            continue
+
+        suffix = first[core_len:]
+        if suffix not in ("", "Z") and not (
+            len(suffix) == 6 and suffix[0] in "+-" and suffix[3] == ":"
+        ):
+            continue
+
+        raw = "".join(values)
+        if len(raw) != width * len(values) or not raw.isascii():
+            return None
+
+        buf = np.frombuffer(raw.encode("ascii"), dtype=np.uint8).reshape(len(values), width)
+
+        digit_cols = [off + k for _, off, w in fields for k in range(w)]
+        if len(suffix) == 6:
+            digit_cols += [core_len + 1, core_len + 2, core_len + 4, core_len + 5]
+        sep_cols = [c for c in range(width) if c not in set(digit_cols)]
+
+        digits = buf[:, digit_cols]
+        if ((digits < 48) | (digits > 57)).any():
+            return None
+        if len(suffix) == 6:
+            # sign may legitimately differ between rows; the rest must match row 0
+            checked = [c for c in sep_cols if c != core_len]
+            signs = buf[:, core_len]
+            if not np.isin(signs, (ord("+"), ord("-"))).all():
+                return None
+        else:
+            checked = sep_cols
+        if (buf[:, checked] != buf[0, checked]).any():
+            return None
+
+        num = buf.astype(np.int64) - 48
+
+        def field(off: int, w: int) -> np.ndarray:
+            out = np.zeros(len(values), dtype=np.int64)
+            for k in range(w):
+                out = out * 10 + num[:, off + k]
+            return out
+
+        parts = {name: field(off, w) for name, off, w in fields}
+        if ((parts["m"] < 1) | (parts["m"] > 12) | (parts["d"] < 1) | (parts["d"] > 31)
+                | (parts["H"] > 23) | (parts["M"] > 59) | (parts["S"] > 59)).any():
+            return None
+
+        secs = (
+            _days_from_civil(parts["Y"], parts["m"], parts["d"]) * 86400
+            + parts["H"] * 3600 + parts["M"] * 60 + parts["S"]
+        )
+
+        if suffix == "Z":
+            return secs
+        if len(suffix) == 6:
+            sign = np.where(buf[:, core_len] == ord("-"), -1, 1)
+            offset = sign * (field(core_len + 1, 2) * 3600 + field(core_len + 4, 2) * 60)
+            return secs - offset
+        return local_to_utc(secs, tz)
+
+    return None
+
+
+def parse_epoch_seconds(values: Sequence[str], tz: str | object = DEFAULT_TZ) -> np.ndarray:
+    """
+    Timestamp strings -> int64 UTC epoch seconds. Naive values are read in `tz`.
+    Unparseable values come back as np.iinfo(np.int64).min.
+    """
+    if isinstance(tz, str):
+        tz = ZoneInfo(tz)
+    values = [(v or "").strip() for v in values]
+    if not values:
+        return np.zeros(0, dtype=np.int64)
+
+    fast = _fixed_layout_epoch(values, tz)
+    if fast is not None:
+        return fast
+
+    # Slow path: parse each distinct string once
+    missing = np.iinfo(np.int64).min
+    cache: Dict[str, int] = {}
+    out = np.empty(len(values), dtype=np.int64)
+    for i, v in enumerate(values):
+        secs = cache.get(v)
+        if secs is None:
+            dt = try_parse_datetime(v)
+            if dt is None:
+                secs = missing
+            else:
+                if dt.tzinfo is None:
+                    dt = dt.replace(tzinfo=tz)
+                secs = int(dt.astimezone(timezone.utc).timestamp())
+            cache[v] = secs
+        out[i] = secs
+    return out
+
+
+# ---- Value columns ----
+
+def _fromstring(text: str, count: int) -> Optional[np.ndarray]:
+    """
+    Parse comma-joined floats; None if anything in the text is malformed.
+    """
+    if count == 0:
+        return np.zeros(0, dtype=np.float32)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        try:
+            arr = np.fromstring(text, dtype=np.float32, sep=",")
+        except (ValueError, DeprecationWarning):
+            return None
+    return arr if arr.size == count else None
+
+
+def _parse_series(value: str, head: str, depths: int) -> Optional[List[float]]:
+    """
+    Per-row fallback for one "Moist,..." / "Temp,..." string.
+    """
+    parts = [p.strip() for p in value.split(",") if p.strip()]
+    if not parts or parts[0] + "," != head or len(parts) != depths + 1:
+        return None
+    try:
+        return [float(p) for p in parts[1:]]
+    except ValueError:
+        return None
+
+
+def parse_depth_strings(values: Sequence[Optional[str]], prefix: str, depths: int = DEPTHS) -> np.ndarray:
+    """
+    ["Moist,+001.58,...", ...] -> float32 (N, depths). Bad rows are all-NaN.
+    """
+    out = np.full((len(values), depths), np.nan, dtype=np.float32)
+    head = prefix + ","
+    cut = len(head)
+
+    good = [i for i, v in enumerate(values) if v and v.startswith(head) and v.count(",") == depths]
+    if good:
+        parsed = _fromstring(",".join([values[i][cut:] for i in good]), len(good) * depths)
+        if parsed is not None:
+            out[good] = parsed.reshape(len(good), depths)
+        else:
+            for i in good:
+                row = _parse_series(values[i], head, depths)
+                if row is not None:
+                    out[i] = row
+
+    # Rows with stray whitespace or a trailing comma
+    done = set(good)
+    for i, v in enumerate(values):
+        if v and i not in done and v.lstrip().startswith(prefix):
+            row = _parse_series(v.strip().rstrip(","), head, depths)
+            if row is not None:
+                out[i] = row
+    return out
+
+
+def parse_battery_strings(values: Sequence[Optional[str]]) -> np.ndarray:
+    """
+    "Batt,3.9" or "3.9" -> float32. Blank/unparseable -> NaN.
+    """
+    cleaned = [(v or "").rpartition(",")[2].strip() or "nan" for v in values]
+    parsed = _fromstring(",".join(cleaned), len(cleaned))
+    if parsed is not None:
+        return parsed
+
+    out = np.full(len(cleaned), np.nan, dtype=np.float32)
+    for i, v in enumerate(cleaned):
+        try:
+            out[i] = float(v)
+        except ValueError:
+            pass
+    return out
+
+
+def intern_devices(values: Sequence[str]) -> tuple[np.ndarray, List[str]]:
+    """
+    Device strings -> (int32 codes, labels). One dict lookup per row.
+    """
+    lookup: Dict[str, int] = {}
+    codes = np.fromiter(
+        (lookup.setdefault(v, len(lookup)) for v in values),
+        dtype=np.int32,
+        count=len(values),
+    )
+    return codes, list(lookup)
+
+
+# ---- Entry points ----
+
+def parse_columns(
+    created: Sequence[str],
+    device: Sequence[str],
+    moisture: Sequence[Optional[str]],
+    temperature: Sequence[Optional[str]],
+    battery: Optional[Sequence[Optional[str]]] = None,
+    entry_ids: Optional[Sequence[Optional[str]]] = None,
+    tz: str | object = DEFAULT_TZ,
+) -> SoilRecords:
+    """
+    Build SoilRecords from raw string columns (all the same length).
+    Rows without a device or with an unparseable timestamp are dropped.
+    """
+    n = len(created)
+    device = [(d or "").strip() for d in device]
+
+    ts = parse_epoch_seconds(created, tz)
+    keep = np.array([bool(d) for d in device], dtype=bool) & (ts != np.iinfo(np.int64).min)
+    if not keep.all():
+        idx = np.flatnonzero(keep).tolist()
+        pick = lambda col: [col[i] for i in idx] if col is not None else None  # noqa: E731
+        ts = ts[keep]
+        device, moisture, temperature = pick(device), pick(moisture), pick(temperature)
+        battery, entry_ids = pick(battery), pick(entry_ids)
+        n = len(idx)
+
+    codes, labels = intern_devices(device)
+
+    if entry_ids is not None:
+        ids = np.array([int(e) if e and e.strip().isdigit() else MISSING_ENTRY_ID for e in entry_ids], dtype=np.int64)
+    else:
+        ids = np.full(n, MISSING_ENTRY_ID, dtype=np.int64)
+
+    return SoilRecords(
+        timestamps=ts,
+        entry_ids=ids,
+        device_codes=codes,
+        devices=labels,
+        moisture=parse_depth_strings(moisture, "Moist"),
+        temperature=parse_depth_strings(temperature, "Temp"),
+        battery=parse_battery_strings(battery) if battery is not None else np.full(n, np.nan, dtype=np.float32),
+    )
+
+
+def resolve_columns(header: Sequence[str]) -> Dict[str, int]:
+    """
+    Map column roles (created, device, moisture, ...) to header indexes.
+    """
+    lowered = [h.strip().lower() for h in header]
+    col: Dict[str, int] = {}
+
+    for role, keywords in COLUMN_KEYWORDS.items():
+        for i, h in enumerate(lowered):
+            if any(k in h for k in keywords):
+                col[role] = i
+                break
+
+    for role, field in DEFAULT_FIELD_MAP.items():
+        if role not in col and field in lowered:
+            col[role] = lowered.index(field)
+
+    missing = [k for k in ("created", "device", "moisture", "temperature") if k not in col]
+    if missing:
+        raise ValueError(f"Missing required columns: {missing}. Got columns: {list(header)}")
+    return col
+
+
+def load_export(path: str, tz: str | object = DEFAULT_TZ) -> SoilRecords:
+    """
+    Read a ThingSpeak CSV export (web export or converted) into SoilRecords.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        try:
+            header = next(reader)
+        except StopIteration:
+            raise ValueError(f"{path}: empty CSV") from None
+        col = resolve_columns(header)
+        width = len(header)
+        rows = [r if len(r) >= width else r + [""] * (width - len(r)) for r in reader]
+
+    def column(role: str) -> Optional[List[str]]:
+        if role not in col:
+            return None
+        i = col[role]
+        return [r[i] for r in rows]
+
+    return parse_columns(
+        created=column("created"),
+        device=column("device"),
+        moisture=column("moisture"),
+        temperature=column("temperature"),
+        battery=column("battery"),
+        entry_ids=column("entry_id"),
+        tz=tz,
+    )
+
+
+def from_feeds(feeds: Sequence[dict], field_map: Optional[Dict[str, str]] = None) -> SoilRecords:
+    """
+    Build SoilRecords from ThingSpeak feeds.json rows (created_at is UTC ISO).
+    """
+    fm = dict(DEFAULT_FIELD_MAP)
+    if field_map:
+        fm.update(field_map)
+
+    def column(key: str) -> List[Optional[str]]:
+        return [f.get(key) for f in feeds]
+
+    return parse_columns(
+        created=[f.get("created_at") or "" for f in feeds],
+        device=column(fm["device"]),
+        moisture=column(fm["moisture"]),
+        temperature=column(fm["temperature"]),
+        battery=column(fm["battery"]),
+        entry_ids=[str(f.get("entry_id") or "") for f in feeds],
+        tz=timezone.utc,
+    )
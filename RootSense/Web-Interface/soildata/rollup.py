@@ -0,0 +1,194 @@
+"""
+rollup.py
+
+Hourly and daily min/mean/max per device and depth (moisture, temperature)
+plus battery, kept next to the raw readings in the LiveStore file so long-range
+charts read a few thousand rollup rows instead of every sample.
+
+Updates are incremental: the store remembers the highest reading id already
+rolled up, and each update only recomputes the (device, bucket) pairs that
+rows with a larger id fall into. Late or re-imported data for an old hour
+gets a new id, so its bucket is recomputed from all raw rows in it.
+
+Buckets are UTC-aligned (hour = time_s // 3600, day = time_s // 86400).
+
+A ThingSpeak export can be imported into a store first (import_records), so
+the same rollups work without a gateway. Re-importing the same export is a
+no-op thanks to the readings table's UNIQUE key (rows without an entry id
+get one derived from their content, see livestore.content_id).
+
+Stdlib only (import_records takes SoilRecords, which come from NumPy code).
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from typing import Dict, List, Optional, Sequence
+
+from .livestore import MOIST_COLS, TEMP_COLS, LiveStore, content_id
+
+RESOLUTIONS: Dict[str, int] = {"hour": 3600, "day": 86400}
+VALUE_COLS = MOIST_COLS + TEMP_COLS + ("battery",)
+STATS = ("min", "mean", "max")
+
+# device, bucket_s, n, moist1_min, moist1_mean, moist1_max, ..., battery_max
+ROLLUP_COLUMNS = ("device", "bucket_s", "n") + tuple(f"{c}_{s}" for c in VALUE_COLS for s in STATS)
+
+
+def _table(resolution: str) -> str:
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"resolution must be one of {tuple(RESOLUTIONS)}")
+    return f"rollup_{resolution}"
+
+
+_SCHEMA = "".join(
+    f"""
+CREATE TABLE IF NOT EXISTS {_table(r)} (
+    device   TEXT    NOT NULL,
+    bucket_s INTEGER NOT NULL,
+    n        INTEGER NOT NULL,
+    {", ".join(f"{c} REAL" for c in ROLLUP_COLUMNS[3:])},
+    PRIMARY KEY (device, bucket_s)
+);
+CREATE INDEX IF NOT EXISTS {_table(r)}_by_time ON {_table(r)} (bucket_s);
+"""
+    for r in RESOLUTIONS
+) + """
+CREATE TABLE IF NOT EXISTS rollup_state (
+    name    TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL
+);
+"""
+
+_AGGREGATES = ", ".join(f"MIN(r.{c}), AVG(r.{c}), MAX(r.{c})" for c in VALUE_COLS)
+
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    conn.executescript(_SCHEMA)
+
+
+def has_rollups(conn: sqlite3.Connection, resolution: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (_table(resolution),)
+    ).fetchone() is not None
+
+
+def _last_id(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT last_id FROM rollup_state WHERE name = 'readings'").fetchone()
+    return int(row[0]) if row else 0
+
+
+def update_rollups(conn: sqlite3.Connection, rebuild: bool = False) -> Dict[str, int]:
+    """
+    Bring every rollup table up to date with the readings table.
+    Returns the number of buckets recomputed per resolution. Nothing is
+    written when no reading is newer than the last update.
+    """
+    ensure_schema(conn)
+    since = 0 if rebuild else _last_id(conn)
+    top = conn.execute("SELECT COALESCE(MAX(id), 0) FROM readings").fetchone()[0]
+    if not rebuild and top <= since:
+        return {name: 0 for name in RESOLUTIONS}
+    counts = {}
+    with conn:
+        for name, width in RESOLUTIONS.items():
+            table = _table(name)
+            if rebuild:
+                conn.execute(f"DELETE FROM {table}")
+            conn.execute("DROP TABLE IF EXISTS temp.touched")
+            conn.execute(
+                "CREATE TEMP TABLE touched AS "
+                "SELECT DISTINCT device, time_s - time_s % ? AS bucket_s FROM readings WHERE id > ? AND id <= ?",
+                (width, since, top),
+            )
+            # Recompute each touched bucket from all of its raw rows (uses the time index)
+            conn.execute(
+                f"INSERT OR REPLACE INTO {table} ({', '.join(ROLLUP_COLUMNS)}) "
+                f"SELECT t.device, t.bucket_s, COUNT(*), {_AGGREGATES} "
+                "FROM temp.touched t JOIN readings r "
+                "ON r.time_s >= t.bucket_s AND r.time_s < t.bucket_s + ? AND r.device = t.device "
+                "GROUP BY t.device, t.bucket_s",
+                (width,),
+            )
+            counts[name] = conn.execute("SELECT COUNT(*) FROM temp.touched").fetchone()[0]
+            conn.execute("DROP TABLE temp.touched")
+        conn.execute(
+            "INSERT OR REPLACE INTO rollup_state (name, last_id) VALUES ('readings', ?)", (top,)
+        )
+    return counts
+
+
+def query_rollups(
+    conn: sqlite3.Connection,
+    resolution: str = "hour",
+    start_s: Optional[int] = None,
+    end_s: Optional[int] = None,
+    device: Optional[str] = None,
+    columns: Sequence[str] = ROLLUP_COLUMNS,
+) -> List[tuple]:
+    """
+    Rollup rows with start_s <= bucket_s < end_s, oldest first. `device` is a
+    substring match, as in LiveStore.query().
+    """
+    bad = set(columns) - set(ROLLUP_COLUMNS)
+    if bad:
+        raise ValueError(f"unknown rollup columns: {sorted(bad)}")
+    where, params = [], []
+    if start_s is not None:
+        where.append("bucket_s >= ?")
+        params.append(start_s)
+    if end_s is not None:
+        where.append("bucket_s < ?")
+        params.append(end_s)
+    if device:
+        where.append("instr(device, ?) > 0")
+        params.append(device)
+    sql = (
+        f"SELECT {', '.join(columns)} FROM {_table(resolution)}"
+        + (" WHERE " + " AND ".join(where) if where else "")
+        + " ORDER BY bucket_s, device"
+    )
+    return conn.execute(sql, params).fetchall()
+
+
+def import_records(store: LiveStore, records) -> int:
+    """
+    Append SoilRecords (e.g. a parsed ThingSpeak export) to a LiveStore.
+    The ThingSpeak entry id stands in for the packet id (content_id() when
+    there is none), so re-importing an export adds nothing. Returns the
+    number of rows inserted.
+    """
+    from .livestore import SoilReading
+
+    def clean(values) -> List[Optional[float]]:
+        return [None if v != v else float(v) for v in values]  # NaN -> NULL
+
+    def node_of(label: str) -> int:
+        head = label.split(":", 1)[0].strip().lstrip("!")
+        try:
+            return int(head, 16) if ":" in label else 0
+        except ValueError:
+            return 0
+
+    nodes = [node_of(label) for label in records.devices]
+    moist = records.moisture.tolist()
+    temp = records.temperature.tolist()
+    batt = records.battery.tolist()
+    times = records.timestamps.tolist()
+    ids = records.entry_ids.tolist()
+
+    def reading(i: int, code: int) -> SoilReading:
+        r = SoilReading(
+            time_s=int(times[i]),
+            node=nodes[code],
+            device=records.devices[code],
+            moisture=clean(moist[i]),
+            temperature=clean(temp[i]),
+            battery=None if batt[i] != batt[i] else batt[i],
+            packet_id=int(ids[i]),
+        )
+        if r.packet_id < 0:
+            r.packet_id = content_id(r.device, r.time_s, r.moisture, r.temperature, r.battery)
+        return r
+
+    return store.append(reading(i, code) for i, code in enumerate(records.device_codes.tolist()))
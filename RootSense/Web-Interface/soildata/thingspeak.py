@@ -0,0 +1,283 @@
+"""
+thingspeak.py
+
+ThingSpeak channel feed fetching.
+
+ThingSpeak returns at most 8000 entries per feeds request, so one request over
+a long start/end range silently comes back truncated. fetch_feeds_range splits
+the range into windows, fetches them concurrently over one pooled
+requests.Session, and bisects any window that came back full. Entries are
+merged by entry_id, so overlapping window edges never duplicate rows.
+
+bulk_update posts one batch of entries to bulk_update.json with retry/backoff,
+checking the channel before resending a batch that may already have landed.
+"""
+
+from __future__ import annotations
+
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+
+THINGSPEAK_API = "https://api.thingspeak.com"
+MAX_RESULTS = 8000  # ThingSpeak cap per feeds request
+
+
+def ensure_utc(dt: datetime) -> datetime:
+    """
+    Ensure dt is timezone-aware and in UTC.
+    - Naive datetime => assumed UTC
+    - Aware datetime => converted to UTC
+    """
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def format_for_thingspeak_utc(dt: datetime) -> str:
+    """
+    Format datetime for ThingSpeak start/end parameters:
+    'YYYY-MM-DD HH:MM:SS' (UTC)
+    """
+    dt_utc = ensure_utc(dt)
+    return dt_utc.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def make_session(pool_size: int = 4) -> requests.Session:
+    """
+    Session whose connection pool can hold one connection per worker thread.
+    """
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+
+def fetch_window(
+    session: requests.Session,
+    channel_id: int,
+    start: datetime,
+    end: datetime,
+    read_api_key: Optional[str] = None,
+    max_results: int = MAX_RESULTS,
+    base_url: str = THINGSPEAK_API,
+    timeout_s: int = 15,
+) -> dict:
+    """
+    One feeds.json request for [start, end]. Returns the decoded JSON.
+    """
+    params = {
+        "start": format_for_thingspeak_utc(start),
+        "end": format_for_thingspeak_utc(end),
+        "results": str(max_results),
+    }
+    if read_api_key:
+        params["api_key"] = read_api_key
+
+    r = session.get(f"{base_url}/channels/{channel_id}/feeds.json", params=params, timeout=timeout_s)
+    r.raise_for_status()
+    return r.json()
+
+
+def split_range(start: datetime, end: datetime, window: timedelta) -> List[Tuple[datetime, datetime]]:
+    """
+    [start, end] -> consecutive windows of at most `window`.
+    """
+    out = []
+    cur = start
+    while cur < end:
+        nxt = min(cur + window, end)
+        out.append((cur, nxt))
+        cur = nxt
+    return out
+
+
+def fetch_feeds_range(
+    channel_id: int,
+    start: datetime,
+    end: datetime,
+    read_api_key: Optional[str] = None,
+    window: timedelta = timedelta(days=1),
+    max_workers: int = 4,
+    max_results: int = MAX_RESULTS,
+    session: Optional[requests.Session] = None,
+    base_url: str = THINGSPEAK_API,
+    timeout_s: int = 15,
+) -> dict:
+    """
+    Fetch every feed entry between UTC start/end.
+
+    Returns the same shape as feeds.json: {"channel": {...}, "feeds": [...]},
+    with feeds sorted by entry_id. Raises requests.HTTPError if any window fails.
+    """
+    start_utc = ensure_utc(start)
+    end_utc = ensure_utc(end)
+    if start_utc >= end_utc:
+        raise ValueError("start must be earlier than end")
+
+    own_session = session is None
+    if own_session:
+        session = make_session(max_workers)
+
+    channel: dict = {}
+    by_id: Dict[int, dict] = {}
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            def submit(a: datetime, b: datetime) -> Future:
+                fut = pool.submit(
+                    fetch_window, session, channel_id, a, b,
+                    read_api_key, max_results, base_url, timeout_s,
+                )
+                pending[fut] = (a, b)
+                return fut
+
+            pending: Dict[Future, Tuple[datetime, datetime]] = {}
+            for a, b in split_range(start_utc, end_utc, window):
+                submit(a, b)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    a, b = pending.pop(fut)
+                    try:
+                        data = fut.result()
+                    except Exception:
+                        for other in pending:
+                            other.cancel()
+                        raise
+
+                    feeds = data.get("feeds") or []
+                    if not channel and data.get("channel"):
+                        channel = data["channel"]
+
+                    # Full window: results may be truncated, split it and ask again.
+                    span_s = int((b - a).total_seconds())
+                    if len(feeds) >= max_results and span_s >= 2:
+                        mid = a + timedelta(seconds=span_s // 2)
+                        submit(a, mid)
+                        submit(mid, b)
+                        continue
+
+                    for f in feeds:
+                        by_id[int(f["entry_id"])] = f
+    finally:
+        if own_session:
+            session.close()
+
+    return {"channel": channel, "feeds": [by_id[k] for k in sorted(by_id)]}
+
+
+# ---- Bulk upload ----
+
+MAX_BULK_UPDATES = 960  # ThingSpeak limit per bulk_update.json request
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# Gateway errors that may come back after ThingSpeak already stored the batch
+UNSURE_STATUS = {502, 504}
+
+
+def _utc_seconds(created_at: str) -> int:
+    s = created_at.strip().replace(" ", "T")
+    if s.endswith("Z"):
+        s = s[:-1] + "+00:00"
+    return int(ensure_utc(datetime.fromisoformat(s)).timestamp())
+
+
+def _not_sent(e: requests.RequestException) -> bool:
+    """
+    True if the request never reached the server (DNS failure, refused or
+    timed-out connect), so sending it again can't store anything twice.
+    """
+    if isinstance(e, requests.ConnectTimeout):
+        return True
+    reason = getattr(e.args[0], "reason", None) if e.args else None
+    return isinstance(e, requests.ConnectionError) and isinstance(reason, NewConnectionError)
+
+
+def batch_stored(
+    session: requests.Session,
+    channel_id: int,
+    updates: List[dict],
+    read_api_key: Optional[str] = None,
+    base_url: str = THINGSPEAK_API,
+    timeout_s: int = 15,
+) -> bool:
+    """
+    Whether the channel already holds the last entry of `updates` (same
+    created_at second and fields). A batch is stored as a whole, so this tells
+    whether a request that got no answer went through. Raises if the channel
+    can't be read.
+    """
+    last = updates[-1]
+    if "created_at" not in last:
+        raise ValueError("can't check a batch without created_at")
+    at = datetime.fromtimestamp(_utc_seconds(last["created_at"]), timezone.utc)
+    data = fetch_window(session, channel_id, at, at, read_api_key, MAX_RESULTS, base_url, timeout_s)
+    fields = {k: v for k, v in last.items() if k.startswith("field")}
+    return any(
+        {k: v for k, v in feed.items() if k.startswith("field") and v is not None} == fields
+        for feed in data.get("feeds") or []
+    )
+
+
+def bulk_update(
+    session: requests.Session,
+    channel_id: int,
+    write_api_key: str,
+    updates: List[dict],
+    base_url: str = THINGSPEAK_API,
+    max_retries: int = 6,
+    backoff_s: float = 5.0,
+    timeout_s: int = 60,
+    sleep: Callable[[float], None] = time.sleep,
+    read_api_key: Optional[str] = None,
+) -> dict:
+    """
+    POST one bulk_update.json batch, retrying rate limits, 5xx and connection
+    errors with exponential backoff (honours Retry-After). Other HTTP errors raise.
+
+    Bulk updates aren't idempotent. A request that may have reached
+    ThingSpeak without an answer (read timeout, dropped connection, 502/504)
+    is only sent again once batch_stored() shows the batch isn't on the
+    channel; if it is, {"success": True, "verified": True} is returned.
+    `read_api_key` is needed for that check on private channels.
+    """
+    if len(updates) > MAX_BULK_UPDATES:
+        raise ValueError(f"at most {MAX_BULK_UPDATES} updates per request, got {len(updates)}")
+
+    url = f"{base_url}/channels/{channel_id}/bulk_update.json"
+    payload = {"write_api_key": write_api_key, "updates": updates}
+
+    for attempt in range(max_retries + 1):
+        r, unsure = None, False
+        try:
+            r = session.post(url, json=payload, timeout=timeout_s)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == max_retries:
+                raise
+            unsure = not _not_sent(e)
+        else:
+            if r.status_code not in RETRY_STATUS or attempt == max_retries:
+                r.raise_for_status()
+                return r.json() if r.content else {}
+            unsure = r.status_code in UNSURE_STATUS
+
+        retry_after = r.headers.get("Retry-After", "") if r is not None else ""
+        sleep(float(retry_after) if retry_after.isdigit() else backoff_s * 2 ** attempt)
+        if unsure:
+            try:
+                stored = batch_stored(session, channel_id, updates, read_api_key, base_url)
+            except (requests.RequestException, ValueError) as e:
+                raise RuntimeError(f"no answer to a bulk update and the channel can't be checked ({e}); "
+                                   "the batch may already be stored, check the channel before re-sending") from e
+            if stored:
+                return {"success": True, "verified": True}
+
+    raise RuntimeError("unreachable")
@@ -0,0 +1,131 @@
+"""
+timestamps.py
+
+Timestamp parsing shared by the Web-Interface scripts.
+
+ThingSpeak exports use a few different layouts depending on where they came from:
+- Web export:   "01/02/2026, 11:19:01"      (local time, no offset)
+- Converted:    "2026-01-02T11:19:01-06:00"
+- API feeds:    "2026-01-16T05:00:00Z"
+
+Stdlib only, so prep-thingspeak-upload.py keeps working without NumPy.
+"""
+
+from __future__ import annotations
+
+import re
+from datetime import datetime, tzinfo
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+
+KNOWN_INPUT_FORMATS = (
+    "%m/%d/%Y, %H:%M:%S",   # 01/02/2026, 11:19:01
+    "%m/%d/%Y %H:%M:%S",    # 01/02/2026 11:19:01
+    "%Y-%m-%d %H:%M:%S",    # 2026-01-02 11:19:01
+    "%Y-%m-%dT%H:%M:%S",    # 2026-01-02T11:19:01 (no tz)
+)
+
+
+def try_parse_datetime(s: str) -> datetime | None:
+    """
+    Parse any of the known layouts (ISO first, then KNOWN_INPUT_FORMATS).
+    Returns None if nothing matches. Naive results stay naive.
+    """
+    s = (s or "").strip().strip('"').strip()
+    if not s:
+        return None
+
+    # Try ISO forms (including trailing Z)
+    iso_candidate = s.replace("Z", "+00:00") if s.endswith("Z") else s
+    try:
+        return datetime.fromisoformat(iso_candidate)
+    except ValueError:
+        pass
+
+    for fmt in KNOWN_INPUT_FORMATS:
+        try:
+            return datetime.strptime(s, fmt)
+        except ValueError:
+            continue
+
+    return None
+
+
+# ---- Fast path for bulk conversion ----
+#
+# Large exports use one layout throughout, so we pick it from the first rows
+# and convert with a single precompiled regex instead of fromisoformat + up to
+# four strptime calls per row. The UTC offset only changes on the hour, so it
+# is computed once per (date, hour) bucket.
+
+_D2 = r"\d\d"
+_HMS = r"(?P<H>[01]\d|2[0-3]):(?P<M>[0-5]\d):(?P<S>[0-5]\d)"
+_TZ = r"(?P<tz>Z|[+-]\d\d:\d\d)"
+
+FAST_LAYOUTS = {
+    "%m/%d/%Y, %H:%M:%S": re.compile(rf"(?P<m>{_D2})/(?P<d>{_D2})/(?P<Y>\d{{4}}), {_HMS}"),
+    "%m/%d/%Y %H:%M:%S": re.compile(rf"(?P<m>{_D2})/(?P<d>{_D2})/(?P<Y>\d{{4}}) {_HMS}"),
+    "%Y-%m-%d %H:%M:%S": re.compile(rf"(?P<Y>\d{{4}})-(?P<m>{_D2})-(?P<d>{_D2}) {_HMS}"),
+    "%Y-%m-%dT%H:%M:%S": re.compile(rf"(?P<Y>\d{{4}})-(?P<m>{_D2})-(?P<d>{_D2})T{_HMS}"),
+    "%Y-%m-%dT%H:%M:%S%z": re.compile(rf"(?P<Y>\d{{4}})-(?P<m>{_D2})-(?P<d>{_D2})T{_HMS}{_TZ}"),
+}
+
+
+def detect_layout(samples: Iterable[str]) -> Optional[str]:
+    """
+    Name of the FAST_LAYOUTS entry matching every non-blank sample, or None.
+    """
+    samples = [s for s in samples if s]
+    if not samples:
+        return None
+    for name, rx in FAST_LAYOUTS.items():
+        if all(rx.fullmatch(s) for s in samples):
+            return name
+    return None
+
+
+def compile_iso_converter(layout: str, tz: tzinfo) -> Callable[[str], Optional[str]]:
+    """
+    Specialized converter for one layout: returns the ISO-8601 string with
+    offset (same text as dt.isoformat(timespec="seconds")), or None if the value
+    doesn't fit the layout so the caller can take the slow path.
+    """
+    match = FAST_LAYOUTS[layout].fullmatch
+    offsets: Dict[Tuple[str, str, str, str], str] = {}
+
+    if layout.endswith("%z"):
+        # Already carries an offset; only the calendar date needs checking.
+        valid_dates: set = set()
+
+        def convert_aware(s: str) -> Optional[str]:
+            m = match(s)
+            if m is None:
+                return None
+            date = m.group("Y", "m", "d")
+            if date not in valid_dates:
+                try:
+                    datetime(int(date[0]), int(date[1]), int(date[2]))
+                except ValueError:
+                    return None
+                valid_dates.add(date)
+            off = m.group("tz")
+            return s[:19] + ("+00:00" if off == "Z" else off)
+        return convert_aware
+
+    def convert(s: str) -> Optional[str]:
+        m = match(s)
+        if m is None:
+            return None
+        Y, mo, d, H, M, S = m.group("Y", "m", "d", "H", "M", "S")
+        key = (Y, mo, d, H)
+        off = offsets.get(key)
+        if off is None:
+            try:
+                dt = datetime(int(Y), int(mo), int(d), int(H), tzinfo=tz)
+            except ValueError:
+                return None
+            off = dt.isoformat(timespec="seconds")[19:]
+            offsets[key] = off
+        return f"{Y}-{mo}-{d}T{H}:{M}:{S}{off}"
+
+    return convert
@@ -1,27 +1,18 @@
 #!/usr/bin/env python3
 
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import sys
+
 import requests
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from soildata.feedcache import FeedCache
+from soildata.thingspeak import ensure_utc, fetch_feeds_range, format_for_thingspeak_utc
 
-def ensure_utc(dt: datetime) -> datetime:
-    """
-    Ensure dt is timezone-aware and in UTC.
-    - Naive datetime => assumed UTC
-    - Aware datetime => converted to UTC
-    """
-    if dt.tzinfo is None:
-        return dt.replace(tzinfo=timezone.utc)
-    return dt.astimezone(timezone.utc)
 
-
-def format_for_thingspeak_utc(dt: datetime) -> str:
-    """
-    Format datetime for ThingSpeak start/end parameters:
-    'YYYY-MM-DD HH:MM:SS' (UTC)
-    """
-    dt_utc = ensure_utc(dt)
-    return dt_utc.strftime("%Y-%m-%d %H:%M:%S")
+# Local copy of fetched feeds; only entries not seen yet are downloaded.
+CACHE_PATH = Path(__file__).with_name("thingspeak_cache.sqlite3")
 
 
 def fetch_feeds_between_utc(
@@ -31,9 +22,13 @@ def fetch_feeds_between_utc(
     read_api_key: str | None = None,
     fmt: str = "json",   # json | csv | xml
     timeout_s: int = 15,
+    window: timedelta = timedelta(days=1),
+    max_workers: int = 4,
 ):
     """
     Fetch ThingSpeak feeds between UTC start/end datetimes.
+    JSON is fetched in concurrent windows (see soildata.thingspeak) so long
+    ranges aren't cut off at ThingSpeak's per-request cap; csv/xml are one request.
     """
     start_utc = ensure_utc(start)
     end_utc = ensure_utc(end)
@@ -44,6 +39,17 @@ def fetch_feeds_between_utc(
     if fmt not in {"json", "csv", "xml"}:
         raise ValueError("fmt must be json, csv, or xml")
 
+    if fmt == "json":
+        return fetch_feeds_range(
+            channel_id=channel_id,
+            start=start_utc,
+            end=end_utc,
+            read_api_key=read_api_key,
+            window=window,
+            max_workers=max_workers,
+            timeout_s=timeout_s,
+        )
+
     url = f"https://api.thingspeak.com/channels/{channel_id}/feeds.{fmt}"
 
     params = {
@@ -57,7 +63,7 @@ def fetch_feeds_between_utc(
     response = requests.get(url, params=params, timeout=timeout_s)
     response.raise_for_status()
 
-    return response.json() if fmt == "json" else response.text
+    return response.text
 
 
 def main():
@@ -67,16 +73,11 @@ def main():
     start_dt = datetime(2026, 1, 16, 0, 0, 0, tzinfo=timezone.utc)
     end_dt = datetime(2026, 1, 21, 23, 59, 59, tzinfo=timezone.utc)
 
-    data = fetch_feeds_between_utc(
-        channel_id=CHANNEL_ID,
-        start=start_dt,
-        end=end_dt,
-        read_api_key=READ_API_KEY,
-        fmt="json",
-    )
+    with FeedCache(str(CACHE_PATH)) as cache:
+        new_rows = cache.sync(CHANNEL_ID, start_dt, end_dt, read_api_key=READ_API_KEY)
+        feeds = cache.query(CHANNEL_ID, start_dt, end_dt)
 
-    feeds = data.get("feeds", [])
-    print(f"Fetched {len(feeds)} rows")
+    print(f"Fetched {new_rows} new rows, {len(feeds)} rows in range")
 
     for row in feeds[:5]:
         print(row)
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+battery-sunlight.py
+
+Join node battery voltage with NSRDB irradiance, fit a charge/discharge model
+per node and flag windows where the battery is predicted to run low.
+
+Inputs:
+- A ThingSpeak export (or the mesh-logger reading store) with Battery readings
+- nsrdb_panel_sunlight.py output covering the same period (ts_utc, GHI_Wm2, ...)
+
+Per node it prints the fitted drain (V/h in the dark), the charge gain
+(V/h per kW/m^2) and how well irradiance explains the voltage changes. It then
+runs every node forward from its own last reading (through any gap since it
+was last heard) to --horizon-days after the newest reading, over a proxy
+irradiance series, and lists the windows where the predicted voltage drops
+below --low-v. Nodes silent for more than --max-age-days are left out and
+listed.
+NSRDB lags real time by a year or more, so by default the proxy is the same
+dates one year earlier (--proxy-years).
+
+Examples:
+  python3 nsrdb_panel_sunlight.py --lat 27.8006 --lon -97.3964 \
+    --start 2025-01-01 --end 2026-03-01 --out sun.csv --api-key KEY --email you@example.com
+  python3 battery-sunlight.py export.csv sun.csv
+  python3 battery-sunlight.py export.csv sun.csv --column POA_Wm2 --low-v 3.4 --horizon-days 30 \
+    --joined-out joined.csv --windows-out brownouts.csv
+
+Requires NumPy.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from soildata.devices import GROUP_KEYS, group_devices
+from soildata.energy import (
+    DEFAULT_FULL_V,
+    DEFAULT_LOW_V,
+    asof_values,
+    battery_steps,
+    fit_charge_model,
+    interval_mean,
+    last_readings,
+    load_irradiance_csv,
+    low_windows,
+    predict_voltage,
+    window_after,
+)
+from soildata.livestore import load_source
+from soildata.records import utc_to_local_datetime64
+
+YEAR_S = 365 * 86400
+
+
+def fmt_local(epoch_s) -> str:
+    return str(utc_to_local_datetime64(np.asarray([epoch_s], dtype=np.int64))[0]).replace("T", " ")
+
+
+def write_joined(path: str, records, groups, irr) -> int:
+    """
+    One row per battery reading with the as-of and since-previous-reading irradiance.
+    """
+    n = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["device", "ts_utc", "battery_v", "irradiance_asof_wm2", "irradiance_since_prev_wm2"])
+        for name, rows in groups:
+            rows = rows[~np.isnan(records.battery[rows])]
+            ts = records.timestamps[rows]
+            asof = asof_values(irr, ts)
+            since = np.concatenate(([np.nan], interval_mean(irr, ts[:-1], ts[1:]))) if len(ts) else ts
+            iso = np.datetime_as_string(ts.astype("datetime64[s]"), unit="s")
+            w.writerows(zip([name] * len(ts), np.char.add(iso, "Z"), records.battery[rows], np.round(asof, 1), np.round(since, 1)))
+            n += len(ts)
+    return n
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Fit battery vs. sunlight per node and predict low-battery windows.")
+    ap.add_argument("input", help="ThingSpeak CSV export, or a mesh-logger reading store (.sqlite3)")
+    ap.add_argument("irradiance_csv", help="nsrdb_panel_sunlight.py output covering the same dates")
+    ap.add_argument("--column", default="GHI_Wm2", help="Irradiance column to use (GHI_Wm2, POA_Wm2, ...)")
+    ap.add_argument("--group-by", choices=GROUP_KEYS, default="node", help="How to split nodes (default: node)")
+    ap.add_argument("--low-v", type=float, default=DEFAULT_LOW_V, help=f"Brownout threshold in volts (default: {DEFAULT_LOW_V})")
+    ap.add_argument("--full-v", type=float, default=DEFAULT_FULL_V, help=f"Fully charged voltage (default: {DEFAULT_FULL_V})")
+    ap.add_argument("--horizon-days", type=float, default=14, help="How far ahead to predict (default: 14)")
+    ap.add_argument("--max-age-days", type=float, default=7,
+                    help="Skip nodes whose last reading is this much older than the newest one (default: 7)")
+    ap.add_argument("--proxy-years", type=int, default=1, help="Use irradiance from this many years earlier as the forecast (default: 1)")
+    ap.add_argument("--joined-out", default=None, help="Write the per-reading battery/irradiance join to this CSV")
+    ap.add_argument("--windows-out", default=None, help="Write predicted low-battery windows to this CSV")
+    args = ap.parse_args()
+
+    records = load_source(args.input)
+    groups = group_devices(records, key=args.group_by)
+    try:
+        irr = load_irradiance_csv(args.irradiance_csv, args.column)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 2
+    if not len(irr) or not len(groups):
+        print("ERROR: no irradiance samples or no devices", file=sys.stderr)
+        return 1
+
+    if args.joined_out:
+        n = write_joined(args.joined_out, records, groups, irr)
+        print(f"Wrote {args.joined_out} ({n} readings)")
+
+    # ---- Fit ----
+    model = fit_charge_model(battery_steps(records, groups), irr, groups.names)
+    print(f"{'node':<16}{'steps':>7}{'drain V/h':>11}{'gain V/h per kW/m2':>20}{'r':>7}")
+    for i, name in enumerate(model.names):
+        print(f"{name:<16}{model.samples[i]:>7}{model.drain_v_per_h[i]:>11.4f}{model.gain_v_per_h[i]:>20.4f}{model.r[i]:>7.2f}")
+    if not model.samples.any():
+        print("NOTE: no battery steps overlap the irradiance range; check the dates.", file=sys.stderr)
+        return 1
+
+    # ---- Predict ----
+    # Each node starts from its own last reading, so the drain over the time
+    # since it was last heard counts; nodes silent for too long are skipped
+    last_t, last_v = last_readings(records, groups)
+    fit = (model.samples > 0) & ~np.isnan(last_v)
+    now = int(last_t[fit].max())
+    stale = fit & (now - last_t > args.max_age_days * 86400)
+    fit &= ~stale
+    if stale.any():
+        print(f"\nNOTE: not predicting {int(stale.sum())} node(s) silent for more than {args.max_age_days:g} days "
+              "before the newest reading:", file=sys.stderr)
+        for g in np.flatnonzero(stale):
+            print(f"  {model.names[g]:<16} last heard {fmt_local(last_t[g])} at {last_v[g]:.2f} V", file=sys.stderr)
+    first = int(last_t[fit].min())
+    end = now + int(args.horizon_days * 86400)
+    proxy = window_after(irr.shifted(args.proxy_years * YEAR_S), first, end - first)
+    if len(proxy) < 2:
+        print(f"NOTE: irradiance doesn't cover {fmt_local(first)} -> {fmt_local(end)} "
+              f"(shifted {args.proxy_years} year(s)); nothing to predict.", file=sys.stderr)
+        return 0
+
+    volts = predict_voltage(model, proxy, np.where(fit, last_v, np.nan), full_v=args.full_v,
+                            t_start=np.where(fit, last_t, end))
+    windows = [w for w in low_windows(proxy.ts, volts, args.low_v) if fit[w[0]]]
+
+    print(f"\nPrediction until {fmt_local(end)}, {args.horizon_days:g} days after the newest reading "
+          f"(threshold {args.low_v} V), each node from its own last reading:")
+    for g, name in enumerate(model.names):
+        if fit[g] and not np.isnan(volts[g]).all():
+            print(f"  {name:<16} {fmt_local(last_t[g])} {last_v[g]:.2f} V -> min {np.nanmin(volts[g]):.2f} V, "
+                  f"end {volts[g, -1]:.2f} V")
+    if windows:
+        print("Predicted low-battery windows:")
+        for g, s, e, vmin in windows:
+            print(f"  {model.names[g]:<16} {fmt_local(s)} -> {fmt_local(e)}  min {vmin:.2f} V")
+    else:
+        print("No low-battery windows predicted.")
+
+    if args.windows_out:
+        with open(args.windows_out, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["node", "start_local", "end_local", "min_v"])
+            w.writerows((model.names[g], fmt_local(s), fmt_local(e), round(v, 3)) for g, s, e, v in windows)
+        print(f"Wrote {args.windows_out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -10,6 +10,18 @@ Outputs:
 - Horizontal-plane energy over the range: kWh/m^2
 - Optional POA (Plane-Of-Array) irradiance/energy if pvlib is installed
 
+The yearly CSV is parsed straight from bytes into NumPy columns (epoch
+seconds, GHI/DNI/DHI float32); range filtering is a binary search on the
+sorted timestamps. Requires NumPy.
+
+Downloaded yearly CSVs are kept in a size-bounded on-disk cache (nsrdb_cache/
+next to this script, least recently used files evicted first), keyed by the
+NSRDB cell the API returned (the Latitude/Longitude in the file's metadata),
+year, interval and attribute list; cells.json remembers which cell each
+requested coordinate fell in. Requests always use the exact coordinate. Repeat
+runs for other date windows at the same site don't touch the network;
+--offline fails fast on a cache miss.
+
 Examples:
   # Basic (no extra libs), UTC timestamps:
   python3 nsrdb_panel_sunlight.py \
@@ -26,23 +38,61 @@ Examples:
     --tilt 25 --azimuth 180 \
     --tz America/Chicago \
     --out nsrdb_panel.csv
+
+  # Every deployment site at once (sites.csv: name,lat,lon,tilt,azimuth).
+  # Sites the API places in the same NSRDB cell share each year after the
+  # first; downloads run on a few workers spaced by --min-request-interval.
+  # Writes one summary row per site:
+  python3 nsrdb_panel_sunlight.py \
+    --api-key YOUR_KEY --email you@example.com \
+    --sites sites.csv --start 2026-01-24 --end 2026-01-26 --tz America/Chicago
+
+  # Best panel orientation per site from a tilt x azimuth grid (needs pvlib;
+  # solar position is computed once per site, sites run on a process pool):
+  python3 nsrdb_panel_sunlight.py --offline --sites sites.csv \
+    --start 2025-01-01 --end 2026-01-01 --tilt-grid 0:60:5 --azimuth-grid 90:270:10
+
+  # Re-run for another window using only cached data:
+  python3 nsrdb_panel_sunlight.py --offline \
+    --lat 27.8006 --lon -97.3964 --start 2026-02-01 --end 2026-02-03
 """
 
 from __future__ import annotations
 
 import argparse
 import csv
+import gzip
 import io
+import json
+import os
 import sys
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
-from datetime import datetime, timezone
-from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
 
+import numpy as np
 import requests
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from soildata.thingspeak import make_session
+
 
 NSRDB_PSM3_CSV_URL = "https://developer.nrel.gov/api/nsrdb/v2/solar/psm3-download.csv"
 
+DEFAULT_CACHE_DIR = Path(__file__).with_name("nsrdb_cache")
+DEFAULT_CACHE_MAX_MB = 500
+
+# NREL allows roughly one request per second per key; stay under it.
+DEFAULT_MIN_REQUEST_INTERVAL_S = 1.2
+DEFAULT_WORKERS = 3
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
 
 def parse_dt(s: str, default_tz: timezone) -> datetime:
     """
@@ -70,12 +120,36 @@ def parse_dt(s: str, default_tz: timezone) -> datetime:
 
 
 @dataclass
-class NsrdbRow:
-    ts_utc: datetime
-    ghi: float
-    dni: float
-    dhi: float
-    raw: Dict[str, str]
+class NsrdbSeries:
+    """
+    Columnar NSRDB samples. Row i of every array is the same timestamp.
+    """
+    ts_utc: np.ndarray  # int64 UTC epoch seconds, sorted
+    ghi: np.ndarray     # float32 W/m^2, NaN where blank
+    dni: np.ndarray
+    dhi: np.ndarray
+
+    def __len__(self) -> int:
+        return int(self.ts_utc.shape[0])
+
+    def __getitem__(self, idx) -> "NsrdbSeries":
+        return NsrdbSeries(self.ts_utc[idx], self.ghi[idx], self.dni[idx], self.dhi[idx])
+
+    @staticmethod
+    def concat(parts: Sequence["NsrdbSeries"]) -> "NsrdbSeries":
+        """
+        Join yearly series and sort by time (duplicate timestamps keep the first).
+        """
+        if not parts:
+            return NsrdbSeries(np.zeros(0, np.int64), *(np.zeros(0, np.float32) for _ in range(3)))
+        ts = np.concatenate([p.ts_utc for p in parts])
+        _, first = np.unique(ts, return_index=True)  # sorted, one row per timestamp
+        return NsrdbSeries(
+            ts[first],
+            np.concatenate([p.ghi for p in parts])[first],
+            np.concatenate([p.dni for p in parts])[first],
+            np.concatenate([p.dhi for p in parts])[first],
+        )
 
 
 def nsrdb_download_csv(
@@ -87,9 +161,14 @@ def nsrdb_download_csv(
     interval_minutes: int,
     attributes: List[str],
     timeout_s: int = 60,
+    session: Optional[requests.Session] = None,
+    base_url: str = NSRDB_PSM3_CSV_URL,
+    limiter: Optional["RateLimiter"] = None,
+    max_retries: int = 4,
 ) -> bytes:
     """
     Download a full-year PSM3 CSV for the given coordinate, then we'll filter locally.
+    Rate-limited (429) and server errors are retried with backoff.
     """
     params = {
         "api_key": api_key,
@@ -105,46 +184,262 @@ def nsrdb_download_csv(
         "reason": "estimate_sunlight",
     }
 
-    r = requests.get(NSRDB_PSM3_CSV_URL, params=params, timeout=timeout_s)
-    r.raise_for_status()
-    return r.content
+    get = session.get if session is not None else requests.get
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            limiter.wait()
+        r = get(base_url, params=params, timeout=timeout_s)
+        if r.status_code in RETRY_STATUS and attempt < max_retries:
+            retry_after = r.headers.get("Retry-After", "")
+            delay = float(retry_after) if retry_after.isdigit() else 2.0 * 2 ** attempt
+            if limiter is not None:
+                limiter.backoff(delay)  # slows every worker, not just this one
+            else:
+                time.sleep(delay)
+            continue
+        r.raise_for_status()
+        return r.content
+    raise AssertionError("unreachable")
 
 
-def find_header_and_rows(csv_bytes: bytes) -> Tuple[List[str], List[List[str]]]:
+class RateLimiter:
     """
-    NSRDB CSV includes metadata lines before the actual CSV header.
-    We'll locate the header line by finding a line that starts with "Year,Month,Day".
-    """
-    text = csv_bytes.decode("utf-8", errors="replace")
-    lines = text.splitlines()
-
-    header_idx = None
-    for i, line in enumerate(lines):
-        if line.startswith("Year,Month,Day"):
-            header_idx = i
-            break
-
-    if header_idx is None:
-        # As a fallback, try to find a line containing the core fields
-        for i, line in enumerate(lines):
-            if "Year" in line and "Month" in line and "Day" in line and "GHI" in line:
-                header_idx = i
+    Spaces request starts at least `min_interval_s` apart across threads.
+    A rate-limit response widens the spacing for everyone (see backoff()).
+    """
+
+    def __init__(self, min_interval_s: float):
+        self.min_interval_s = min_interval_s
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.min_interval_s
+        if slot > now:
+            time.sleep(slot - now)
+
+    def backoff(self, delay_s: float, factor: float = 1.5, max_interval_s: float = 30.0) -> None:
+        """
+        Hold all requests for `delay_s` and widen the spacing from then on.
+        """
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + delay_s)
+            self.min_interval_s = min(max_interval_s, max(self.min_interval_s, 0.1) * factor)
+
+
+# ---- Download cache ----
+
+class CacheMiss(LookupError):
+    """
+    Raised in offline mode when the requested site-year isn't cached.
+    """
+
+
+def point_key(lat: float, lon: float) -> str:
+    """
+    Requested coordinate as a cache lookup key (4 decimals, ~10 m).
+    """
+    return f"{lat:+.4f}_{lon:+.4f}"
+
+
+def nsrdb_location(csv_bytes: bytes) -> Optional[Tuple[float, float]]:
+    """
+    (Latitude, Longitude) of the NSRDB cell a PSM3 CSV is for, from the
+    metadata lines before the data header. None if they're missing.
+    """
+    lines = csv_bytes[:4096].split(b"\n", 2)
+    if len(lines) < 2 or lines[0].startswith(b"Year,"):
+        return None
+    names, values = (next(csv.reader([l.decode("utf-8", "replace").strip()])) for l in lines[:2])
+    meta = dict(zip((n.strip() for n in names), (v.strip() for v in values)))
+    try:
+        return round(float(meta["Latitude"]), 4), round(float(meta["Longitude"]), 4)
+    except (KeyError, ValueError):
+        return None
+
+
+def cache_key(lat: float, lon: float, year: int, interval_minutes: int, attributes: Sequence[str]) -> str:
+    """
+    File name for one cell-year download (`lat`/`lon` from nsrdb_location()).
+    """
+    attrs = "-".join(sorted(a.lower() for a in attributes))
+    return f"{lat:+.4f}_{lon:+.4f}_{year}_{interval_minutes}m_{attrs}.csv.gz"
+
+
+class NsrdbCache:
+    """
+    Directory of gzipped PSM3 CSVs with LRU eviction by total size.
+
+    Recency is the file mtime (touched on every hit), so the cache needs no
+    separate index and survives being copied between machines. cells.json maps
+    requested coordinates (point_key) to the cell the API returned for them.
+    """
+
+    CELLS_NAME = "cells.json"
+
+    def __init__(self, directory: str | Path = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_MAX_MB * 2**20):
+        self.dir = Path(directory)
+        self.max_bytes = max_bytes
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        try:
+            with open(self.dir / self.CELLS_NAME, "r", encoding="utf-8") as f:
+                self._cells = {k: tuple(v) for k, v in json.load(f).items()}
+        except (FileNotFoundError, ValueError):
+            self._cells = {}
+
+    def cell_for(self, point: str) -> Optional[Tuple[float, float]]:
+        with self._lock:
+            return self._cells.get(point)
+
+    def set_cell(self, point: str, cell: Tuple[float, float]) -> None:
+        with self._lock:
+            if self._cells.get(point) == cell:
+                return
+            self._cells[point] = cell
+            path = self.dir / self.CELLS_NAME
+            tmp = path.with_name(path.name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({k: list(v) for k, v in self._cells.items()}, f, indent=1)
+            os.replace(tmp, path)
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self.dir / key
+        try:
+            with gzip.open(path, "rb") as f:
+                blob = f.read()
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError):
+            # Truncated/corrupt entry: drop it and treat as a miss
+            path.unlink(missing_ok=True)
+            return None
+        os.utime(path)
+        return blob
+
+    def put(self, key: str, blob: bytes) -> None:
+        path = self.dir / key
+        tmp = path.with_name(path.name + ".tmp")
+        with gzip.open(tmp, "wb", compresslevel=6) as f:
+            f.write(blob)
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Delete least recently used entries until the cache fits in max_bytes.
+        """
+        entries = []
+        for p in self.dir.glob("*.csv.gz"):
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in sorted(entries):
+            if total <= self.max_bytes:
                 break
+            p.unlink(missing_ok=True)
+            total -= size
+
 
-    if header_idx is None:
-        raise ValueError("Could not find NSRDB CSV header (Year,Month,Day...).")
+def cached_download_csv(
+    cache: Optional[NsrdbCache],
+    api_key: str,
+    email: str,
+    lat: float,
+    lon: float,
+    year: int,
+    interval_minutes: int,
+    attributes: List[str],
+    offline: bool = False,
+    timeout_s: int = 60,
+    **http,
+) -> bytes:
+    """
+    nsrdb_download_csv() through the cache. The request is made for the exact
+    coordinate; the file is stored under the cell the API returned, so any
+    coordinate already known to fall in that cell (or a later year at the
+    same one) reads it back.
+    """
+    point = point_key(lat, lon)
+    cell = cache.cell_for(point) if cache is not None else None
+    if cell is not None:
+        blob = cache.get(cache_key(*cell, year, interval_minutes, attributes))
+        if blob is not None:
+            return blob
+    if offline:
+        raise CacheMiss(f"not cached: {point} {year} ({interval_minutes} min)")
+
+    blob = nsrdb_download_csv(api_key, email, lat, lon, year, interval_minutes, attributes, timeout_s=timeout_s, **http)
+    if cache is not None:
+        cell = nsrdb_location(blob) or (round(lat, 4), round(lon, 4))
+        cache.put(cache_key(*cell, year, interval_minutes, attributes), blob)
+        cache.set_cell(point, cell)
+    return blob
+
+
+def find_header(csv_bytes: bytes) -> Tuple[List[str], int]:
+    """
+    NSRDB CSV includes metadata lines before the actual CSV header.
+    Locate the "Year,Month,Day,..." line with a byte scan and return
+    (header columns, offset of the first data byte).
+    """
+    pos = 0 if csv_bytes.startswith(b"Year,Month,Day") else csv_bytes.find(b"\nYear,Month,Day")
+    if pos < 0:
+        # As a fallback, look for a line containing the core fields
+        pos = None
+        start = 0
+        while start < len(csv_bytes):
+            end = csv_bytes.find(b"\n", start)
+            end = len(csv_bytes) if end < 0 else end
+            line = csv_bytes[start:end]
+            if all(k in line for k in (b"Year", b"Month", b"Day", b"GHI")):
+                pos = start
+                break
+            start = end + 1
+        if pos is None:
+            raise ValueError("Could not find NSRDB CSV header (Year,Month,Day...).")
+    elif pos > 0:
+        pos += 1
 
-    reader = csv.reader(lines[header_idx:])
-    rows = list(reader)
-    header = rows[0]
-    data_rows = rows[1:]
-    return header, data_rows
+    end = csv_bytes.find(b"\n", pos)
+    end = len(csv_bytes) if end < 0 else end + 1
+    header = next(csv.reader([csv_bytes[pos:end].decode("utf-8", errors="replace").strip()]))
+    return [h.strip() for h in header], end
 
 
-def parse_nsrdb_rows(header: List[str], data_rows: List[List[str]]) -> List[NsrdbRow]:
+def _table(body: bytes, ncols: int) -> np.ndarray:
     """
-    Convert NSRDB row arrays into typed rows with UTC timestamps.
+    Numeric CSV body -> float64 (rows, ncols). One np.fromstring call for the
+    usual all-numeric file; blank or odd cells fall back to genfromtxt (NaN).
     """
+    text = body.replace(b"\r", b"").strip().decode("ascii", errors="replace")
+    if not text:
+        return np.zeros((0, ncols))
+    if ",," not in text and ",\n" not in text and not text.endswith(","):
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            try:
+                flat = np.fromstring(text.replace("\n", ","), dtype=np.float64, sep=",")
+            except (ValueError, DeprecationWarning):
+                flat = None
+        if flat is not None and flat.size == ncols * (text.count("\n") + 1):
+            return flat.reshape(-1, ncols)
+
+    table = np.genfromtxt(io.StringIO(text), delimiter=",", dtype=np.float64, invalid_raise=False, ndmin=2)
+    return table[:, :ncols] if table.shape[1] >= ncols else np.zeros((0, ncols))
+
+
+def parse_nsrdb_csv(csv_bytes: bytes) -> NsrdbSeries:
+    """
+    Whole PSM3 CSV -> NsrdbSeries with UTC epoch timestamps.
+    """
+    header, data_start = find_header(csv_bytes)
     col = {name: idx for idx, name in enumerate(header)}
 
     required = ["Year", "Month", "Day", "Hour", "Minute", "GHI", "DNI", "DHI"]
@@ -152,121 +447,476 @@ def parse_nsrdb_rows(header: List[str], data_rows: List[List[str]]) -> List[Nsrd
     if missing:
         raise ValueError(f"Missing required columns: {missing}. Got columns: {header}")
 
-    out: List[NsrdbRow] = []
-    for r in data_rows:
-        if len(r) < len(header):
-            # Skip malformed
-            continue
+    t = _table(csv_bytes[data_start:], len(header))
+    # Rows without a usable date are malformed; skip them
+    date_cols = [col["Year"], col["Month"], col["Day"], col["Hour"], col["Minute"]]
+    t = t[~np.isnan(t[:, date_cols]).any(axis=1)]
+
+    # Days since epoch via datetime64 month arithmetic, then add the time of day
+    ym = (t[:, col["Year"]].astype(np.int64) - 1970) * 12 + t[:, col["Month"]].astype(np.int64) - 1
+    days = ym.astype("datetime64[M]").astype("datetime64[D]").astype(np.int64) + t[:, col["Day"]].astype(np.int64) - 1
+    ts = days * 86400 + t[:, col["Hour"]].astype(np.int64) * 3600 + t[:, col["Minute"]].astype(np.int64) * 60
+
+    return NsrdbSeries(
+        ts_utc=ts,
+        ghi=t[:, col["GHI"]].astype(np.float32),
+        dni=t[:, col["DNI"]].astype(np.float32),
+        dhi=t[:, col["DHI"]].astype(np.float32),
+    )
 
-        year = int(r[col["Year"]])
-        month = int(r[col["Month"]])
-        day = int(r[col["Day"]])
-        hour = int(r[col["Hour"]])
-        minute = int(r[col["Minute"]])
-
-        ts = datetime(year, month, day, hour, minute, tzinfo=timezone.utc)
-
-        def f(name: str) -> float:
-            v = r[col[name]].strip()
-            if v == "":
-                return float("nan")
-            return float(v)
-
-        raw_map = {h: r[i] for h, i in col.items() if i < len(r)}
-
-        out.append(
-            NsrdbRow(
-                ts_utc=ts,
-                ghi=f("GHI"),
-                dni=f("DNI"),
-                dhi=f("DHI"),
-                raw=raw_map,
-            )
-        )
 
-    return out
+def filter_by_range(series: NsrdbSeries, start_utc: datetime, end_utc: datetime) -> NsrdbSeries:
+    """
+    Keep rows with start_utc <= ts < end_utc (binary search on the sorted timestamps).
+    """
+    lo, hi = np.searchsorted(series.ts_utc, [int(start_utc.timestamp()), int(end_utc.timestamp())])
+    return series[lo:hi]
 
 
-def filter_by_range(rows: List[NsrdbRow], start_utc: datetime, end_utc: datetime) -> List[NsrdbRow]:
+def energy_kwh_per_m2(values: np.ndarray, interval_minutes: int) -> float:
     """
-    Keep rows with start_utc <= ts < end_utc.
+    Integrate irradiance (W/m^2, e.g. GHI) over time to get kWh/m^2.
+    Energy = sum(W/m^2 * dt_hours)/1000; NaN samples are skipped.
     """
-    return [x for x in rows if start_utc <= x.ts_utc < end_utc]
+    dt_hours = interval_minutes / 60.0
+    return float(np.nansum(values, dtype=np.float64)) * dt_hours / 1000.0
+
+
+# ---- POA engine ----
+#
+# Solar position, extraterrestrial DNI and airmass depend only on the site and
+# the time index, not on the panel. They are computed once per (site, times)
+# and kept in a small in-process LRU; a whole tilt/azimuth grid is then one
+# broadcast get_total_irradiance call per chunk of geometries.
 
+SOLAR_CACHE_SIZE = 32
+GRID_CHUNK = 64  # geometries per broadcast call (bounds memory at ~GRID_CHUNK x samples x 8 B x 5)
+
+
+@dataclass
+class SolarTerms:
+    zenith: np.ndarray     # degrees, shape (T,)
+    azimuth: np.ndarray    # degrees, shape (T,)
+    dni_extra: np.ndarray  # W/m^2, shape (T,)
+    airmass: np.ndarray    # relative airmass, shape (T,)
 
-def energy_kwh_per_m2(rows: List[NsrdbRow], interval_minutes: int) -> float:
+
+_solar_cache: "OrderedDict[tuple, SolarTerms]" = OrderedDict()
+
+
+def solar_terms(ts_utc: np.ndarray, lat: float, lon: float) -> SolarTerms:
     """
-    Integrate GHI over time range to get kWh/m^2 on a horizontal plane.
-    GHI is W/m^2. Energy = sum(GHI * dt_hours)/1000.
+    Panel-independent terms for one site and time index (cached). Requires pvlib.
     """
-    dt_hours = interval_minutes / 60.0
-    total_wh_m2 = 0.0
-    for x in rows:
-        if x.ghi == x.ghi:  # not NaN
-            total_wh_m2 += x.ghi * dt_hours
-    return total_wh_m2 / 1000.0
+    import pandas as pd  # type: ignore
+    import pvlib  # type: ignore
+
+    key = (round(lat, 6), round(lon, 6), len(ts_utc), hash(ts_utc.tobytes()))
+    hit = _solar_cache.get(key)
+    if hit is not None:
+        _solar_cache.move_to_end(key)
+        return hit
+
+    idx = pd.DatetimeIndex(pd.to_datetime(ts_utc, unit="s", utc=True))
+    solpos = pvlib.solarposition.get_solarposition(idx, lat, lon)
+    zenith = solpos["zenith"].to_numpy(dtype=np.float64)
+    terms = SolarTerms(
+        zenith=zenith,
+        azimuth=solpos["azimuth"].to_numpy(dtype=np.float64),
+        dni_extra=np.asarray(pvlib.irradiance.get_extra_radiation(idx), dtype=np.float64),
+        airmass=np.asarray(pvlib.atmosphere.get_relative_airmass(zenith), dtype=np.float64),
+    )
+    _solar_cache[key] = terms
+    if len(_solar_cache) > SOLAR_CACHE_SIZE:
+        _solar_cache.popitem(last=False)
+    return terms
+
+
+def poa_global_grid(series: NsrdbSeries, terms: SolarTerms, tilts: np.ndarray, azimuths: np.ndarray) -> np.ndarray:
+    """
+    POA global irradiance (W/m^2) for paired tilt/azimuth arrays of length G,
+    shape (G, T). Perez transposition, broadcast over the geometry axis.
+    """
+    import pvlib  # type: ignore
+
+    row = lambda a: np.asarray(a, dtype=np.float64)[None, :]  # noqa: E731
+    poa = pvlib.irradiance.get_total_irradiance(
+        surface_tilt=np.asarray(tilts, dtype=np.float64)[:, None],
+        surface_azimuth=np.asarray(azimuths, dtype=np.float64)[:, None],
+        solar_zenith=row(terms.zenith),
+        solar_azimuth=row(terms.azimuth),
+        dni=row(series.dni),
+        ghi=row(series.ghi),
+        dhi=row(series.dhi),
+        dni_extra=row(terms.dni_extra),
+        airmass=row(terms.airmass),
+        model="perez",
+    )
+    return np.asarray(poa["poa_global"], dtype=np.float64)
+
+
+def poa_energy_grid(
+    series: NsrdbSeries,
+    lat: float,
+    lon: float,
+    tilts: np.ndarray,
+    azimuths: np.ndarray,
+    interval_minutes: int,
+    chunk: int = GRID_CHUNK,
+) -> np.ndarray:
+    """
+    Integrated POA energy (kWh/m^2) per paired geometry, shape (G,).
+    """
+    terms = solar_terms(series.ts_utc, lat, lon)
+    out = np.empty(len(tilts), dtype=np.float64)
+    for i in range(0, len(tilts), chunk):
+        poa = poa_global_grid(series, terms, tilts[i:i + chunk], azimuths[i:i + chunk])
+        out[i:i + chunk] = np.nansum(poa, axis=1) * (interval_minutes / 60.0) / 1000.0
+    return out
 
 
 def maybe_add_poa_with_pvlib(
-    rows: List[NsrdbRow],
+    series: NsrdbSeries,
     lat: float,
     lon: float,
     tilt_deg: float,
     azimuth_deg: float,
     tz_name: str,
-) -> Optional[Tuple[List[float], List[float]]]:
+) -> Optional[Tuple[np.ndarray, List[float]]]:
     """
     Optional: compute POA (Plane-Of-Array) irradiance using pvlib if available.
-    Returns (poa_wm2_list, poa_energy_kwh_m2_daily_placeholder_list).
+    Returns (poa_wm2_array, poa_energy_kwh_m2_daily_placeholder_list).
     We'll just compute POA W/m^2 per row; energy can be integrated like GHI.
     """
     try:
-        import pandas as pd  # type: ignore
-        import pvlib  # type: ignore
+        import pandas  # type: ignore  # noqa: F401
+        import pvlib  # type: ignore  # noqa: F401
     except Exception:
         return None
 
-    # Build a time index in UTC
-    times = [x.ts_utc for x in rows]
-    idx = pd.DatetimeIndex(times).tz_convert("UTC")
+    terms = solar_terms(series.ts_utc, lat, lon)
+    poa_global = poa_global_grid(series, terms, np.array([tilt_deg]), np.array([azimuth_deg]))[0]
+    return (poa_global, [])
 
-    # Solar position
-    solpos = pvlib.solarposition.get_solarposition(idx, lat, lon)
 
-    # Use a transposition model via get_total_irradiance
-    # (uses DNI/DHI/GHI + solar position + surface geometry)
-    ghi = pd.Series([x.ghi for x in rows], index=idx)
-    dni = pd.Series([x.dni for x in rows], index=idx)
-    dhi = pd.Series([x.dhi for x in rows], index=idx)
+def parse_angles(spec: str) -> np.ndarray:
+    """
+    "0:60:5" (inclusive start:stop:step) or "90,135,180" -> degrees.
+    """
+    if ":" in spec:
+        start, stop, step = (float(x) for x in spec.split(":"))
+        if step <= 0:
+            raise ValueError(f"step must be > 0 in {spec!r}")
+        return np.round(np.arange(start, stop + step / 2, step), 6)
+    return np.array([float(x) for x in spec.split(",") if x.strip()])
 
-    poa = pvlib.irradiance.get_total_irradiance(
-        surface_tilt=tilt_deg,
-        surface_azimuth=azimuth_deg,
-        solar_zenith=solpos["zenith"],
-        solar_azimuth=solpos["azimuth"],
-        dni=dni,
-        ghi=ghi,
-        dhi=dhi,
-        model="perez",
+
+def _grid_job(job: tuple) -> Tuple[str, np.ndarray]:
+    """
+    Process-pool worker: one site's whole geometry grid.
+    """
+    name, lat, lon, series, tilts, azimuths, interval_minutes = job
+    return name, poa_energy_grid(series, lat, lon, tilts, azimuths, interval_minutes)
+
+
+def orientation_grid(
+    jobs: Sequence[Tuple[str, float, float, NsrdbSeries]],
+    tilts: np.ndarray,
+    azimuths: np.ndarray,
+    interval_minutes: int,
+    processes: Optional[int] = None,
+) -> Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Evaluate every tilt x azimuth combination for every site, fanning sites out
+    over a process pool. Returns {site: (tilt, azimuth, poa_kwh_m2)} flat arrays.
+    """
+    tt, aa = (g.ravel() for g in np.meshgrid(tilts, azimuths, indexing="ij"))
+    work = [(name, lat, lon, series, tt, aa, interval_minutes) for name, lat, lon, series in jobs]
+
+    if processes == 1 or len(work) <= 1:
+        results = map(_grid_job, work)
+        return {name: (tt, aa, e) for name, e in results}
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return {name: (tt, aa, e) for name, e in pool.map(_grid_job, work)}
+
+
+def write_grid(path: str, grid: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]]) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["name", "tilt", "azimuth", "poa_kwh_m2"])
+        for name, (tt, aa, e) in grid.items():
+            w.writerows((name, t, a, round(float(v), 3)) for t, a, v in zip(tt.tolist(), aa.tolist(), e))
+
+
+def print_best(grid: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]]) -> None:
+    for name, (tt, aa, e) in grid.items():
+        if not len(e) or np.isnan(e).all():
+            continue
+        i = int(np.nanargmax(e))
+        print(f"  best for {name}: tilt {tt[i]:g}, azimuth {aa[i]:g} -> {e[i]:.3f} kWh/m^2 ({len(e)} combinations)")
+
+
+# ---- Multi-site batch ----
+
+@dataclass
+class Site:
+    name: str
+    lat: float
+    lon: float
+    tilt: Optional[float] = None
+    azimuth: Optional[float] = None
+
+
+def read_sites(path: str) -> List[Site]:
+    """
+    Sites CSV with a header: lat, lon and optionally name, tilt, azimuth.
+    """
+    def opt(v: Optional[str]) -> Optional[float]:
+        return float(v) if v and v.strip() else None
+
+    sites: List[Site] = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for i, row in enumerate(csv.DictReader(f), start=1):
+            row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+            if not row.get("lat") or not row.get("lon"):
+                raise ValueError(f"{path}: row {i} needs lat and lon (columns: name, lat, lon, tilt, azimuth)")
+            sites.append(Site(
+                name=row.get("name") or f"site{i}",
+                lat=float(row["lat"]),
+                lon=float(row["lon"]),
+                tilt=opt(row.get("tilt")),
+                azimuth=opt(row.get("azimuth")),
+            ))
+    return sites
+
+
+def years_spanned(start_utc: datetime, end_utc: datetime) -> List[int]:
+    """
+    Calendar years touched by [start_utc, end_utc).
+    """
+    return list(range(start_utc.year, (end_utc - timedelta(seconds=1)).year + 1))
+
+
+Point = Tuple[float, float]
+
+
+def fetch_sites(
+    points: Sequence[Point],
+    years: Sequence[int],
+    interval_minutes: int,
+    attributes: List[str],
+    cache: Optional[NsrdbCache],
+    api_key: Optional[str],
+    email: Optional[str],
+    offline: bool = False,
+    workers: int = DEFAULT_WORKERS,
+    min_interval_s: float = DEFAULT_MIN_REQUEST_INTERVAL_S,
+    base_url: str = NSRDB_PSM3_CSV_URL,
+) -> Dict[Point, Tuple[Optional[Point], NsrdbSeries | Exception]]:
+    """
+    Load every year for every (lat, lon) over a thread pool sharing one
+    pooled session, downloading each NSRDB cell-year once.
+
+    A point's cell is whatever the API returns for it (the grid can't be
+    computed locally): points the cache already maps to a cell need no
+    request, the rest are resolved by downloading their first year. Points
+    that turn out to share a cell then share every other year.
+    Returns (cell, joined series or first error) per point.
+    """
+    points = list(dict.fromkeys(points))
+    session = make_session(workers)
+    limiter = RateLimiter(min_interval_s)
+
+    def load(point: Point, year: int) -> Tuple[Point, NsrdbSeries]:
+        blob = cached_download_csv(
+            cache, api_key, email, point[0], point[1], year, interval_minutes, attributes,
+            offline=offline, session=session, base_url=base_url, limiter=limiter,
+        )
+        return nsrdb_location(blob) or point, parse_nsrdb_csv(blob)
+
+    cell_of: Dict[Point, Point] = {}
+    parts: Dict[Point, Dict[int, NsrdbSeries]] = {}
+    point_errors: Dict[Point, Exception] = {}
+    cell_errors: Dict[Point, Exception] = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # 1) which cell is each point in?
+            resolving = {}
+            for p in points:
+                known = cache.cell_for(point_key(*p)) if cache is not None else None
+                if known is not None:
+                    cell_of[p] = known
+                else:
+                    resolving[pool.submit(load, p, years[0])] = p
+            for fut in as_completed(resolving):
+                p = resolving[fut]
+                try:
+                    cell, series = fut.result()
+                except Exception as e:
+                    point_errors[p] = e
+                    continue
+                cell_of[p] = cell
+                parts.setdefault(cell, {})[years[0]] = series
+
+            # 2) the remaining cell-years, once per cell through one of its points
+            via = {}
+            for p, cell in cell_of.items():
+                via.setdefault(cell, p)
+            futures = {
+                pool.submit(load, p, y): (cell, y)
+                for cell, p in via.items() for y in years if y not in parts.get(cell, {})
+            }
+            for fut in as_completed(futures):
+                cell, year = futures[fut]
+                try:
+                    parts.setdefault(cell, {})[year] = fut.result()[1]
+                except Exception as e:
+                    cell_errors.setdefault(cell, e)
+    finally:
+        session.close()
+
+    out: Dict[Point, Tuple[Optional[Point], NsrdbSeries | Exception]] = {}
+    for p in points:
+        if p in point_errors:
+            out[p] = (None, point_errors[p])
+        else:
+            cell = cell_of[p]
+            out[p] = (cell, cell_errors[cell] if cell in cell_errors else NsrdbSeries.concat(list(parts[cell].values())))
+    return out
+
+
+SUMMARY_COLUMNS = [
+    "name", "lat", "lon", "cell_lat", "cell_lon", "tilt", "azimuth",
+    "samples", "ghi_kwh_m2", "poa_kwh_m2", "error",
+]
+
+
+def summarize_site(
+    site: Site,
+    cell: Optional[Point],
+    series: NsrdbSeries | Exception,
+    start_utc: datetime,
+    end_utc: datetime,
+    interval_minutes: int,
+    tz_name: str,
+) -> dict:
+    """
+    One summary-table row: horizontal and (with pvlib and a geometry) panel-plane energy.
+    """
+    row = {
+        "name": site.name, "lat": site.lat, "lon": site.lon,
+        "cell_lat": "" if cell is None else cell[0], "cell_lon": "" if cell is None else cell[1],
+        "tilt": "" if site.tilt is None else site.tilt,
+        "azimuth": "" if site.azimuth is None else site.azimuth,
+        "samples": 0, "ghi_kwh_m2": "", "poa_kwh_m2": "", "error": "",
+    }
+    if isinstance(series, Exception):
+        row["error"] = str(series)
+        return row
+
+    kept = filter_by_range(series, start_utc, end_utc)
+    row["samples"] = len(kept)
+    if not len(kept):
+        row["error"] = "no rows in range"
+        return row
+    row["ghi_kwh_m2"] = round(energy_kwh_per_m2(kept.ghi, interval_minutes), 3)
+
+    if site.tilt is not None and site.azimuth is not None:
+        poa = maybe_add_poa_with_pvlib(kept, site.lat, site.lon, site.tilt, site.azimuth, tz_name)
+        if poa is not None:
+            row["poa_kwh_m2"] = round(energy_kwh_per_m2(poa[0], interval_minutes), 3)
+    return row
+
+
+def run_grid(args: argparse.Namespace, jobs: List[Tuple[str, float, float, NsrdbSeries]]) -> None:
+    """
+    --tilt-grid/--azimuth-grid: write every combination per site and print the best.
+    """
+    try:
+        import pvlib  # type: ignore  # noqa: F401
+    except Exception:
+        print("NOTE: pvlib not installed; skipping orientation grid. Install with: pip install pvlib", file=sys.stderr)
+        return
+    tilts = parse_angles(args.tilt_grid or "0:60:5")
+    azimuths = parse_angles(args.azimuth_grid or "90:270:15")
+    grid = orientation_grid(jobs, tilts, azimuths, args.interval, processes=args.processes)
+    write_grid(args.grid_out, grid)
+    print(f"Wrote: {args.grid_out}")
+    print_best(grid)
+
+
+def run_batch(args: argparse.Namespace, start_utc: datetime, end_utc: datetime, cache: Optional[NsrdbCache]) -> int:
+    try:
+        sites = read_sites(args.sites)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 2
+    if not sites:
+        print(f"ERROR: no sites in {args.sites}", file=sys.stderr)
+        return 2
+
+    years = years_spanned(start_utc, end_utc)
+    loaded = fetch_sites(
+        [(s.lat, s.lon) for s in sites], years, args.interval, ["ghi", "dni", "dhi"], cache,
+        args.api_key, args.email, offline=args.offline, workers=args.workers,
+        min_interval_s=args.min_request_interval, base_url=args.base_url,
     )
+    cells = {cell for cell, _ in loaded.values() if cell is not None}
+    print(f"{len(sites)} sites in {len(cells)} NSRDB cells, {len(years)} year(s) each")
+    rows = [summarize_site(s, *loaded[(s.lat, s.lon)], start_utc, end_utc, args.interval, args.tz) for s in sites]
 
-    poa_global = poa["poa_global"].astype(float).tolist()
-    return (poa_global, [])
+    if any(s.tilt is not None and s.azimuth is not None for s in sites) and all(r["poa_kwh_m2"] == "" for r in rows):
+        print("NOTE: pvlib not installed; skipping POA estimate. Install with: pip install pvlib", file=sys.stderr)
+
+    out = args.out or "nsrdb_sites_summary.csv"
+    with open(out, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS)
+        w.writeheader()
+        w.writerows(rows)
+
+    failed = [r for r in rows if r["error"]]
+    print(f"Wrote: {out}")
+    print(f"Range (UTC): {start_utc.isoformat()} → {end_utc.isoformat()}")
+    for r in rows:
+        print(f"  {r['name']:<20} GHI {r['ghi_kwh_m2'] or '-':>8} kWh/m^2  POA {r['poa_kwh_m2'] or '-':>8}  {r['error']}")
+
+    if args.tilt_grid or args.azimuth_grid:
+        jobs = []
+        for site, r in zip(sites, rows):
+            series = loaded[(site.lat, site.lon)][1]
+            if not r["error"]:
+                jobs.append((site.name, site.lat, site.lon, filter_by_range(series, start_utc, end_utc)))
+        run_grid(args, jobs)
+
+    return 1 if failed else 0
 
 
 def main() -> int:
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--api-key", required=True, help="NREL developer API key")
-    ap.add_argument("--email", required=True, help="Email used with NREL API key")
-    ap.add_argument("--lat", type=float, required=True)
-    ap.add_argument("--lon", type=float, required=True)
+    ap = argparse.ArgumentParser(description="NSRDB sunlight estimate for one site (--lat/--lon) or many (--sites).")
+    ap.add_argument("--api-key", default=None, help="NREL developer API key (not needed with --offline)")
+    ap.add_argument("--email", default=None, help="Email used with NREL API key (not needed with --offline)")
+    ap.add_argument("--lat", type=float, default=None)
+    ap.add_argument("--lon", type=float, default=None)
+    ap.add_argument("--sites", default=None, help="CSV of sites (name, lat, lon, tilt, azimuth); writes one summary row per site")
     ap.add_argument("--start", required=True, help="Start datetime/date (ISO). Ex: 2026-01-24 or 2026-01-24T00:00:00Z")
     ap.add_argument("--end", required=True, help="End datetime/date (ISO). Ex: 2026-01-26 or 2026-01-26T00:00:00Z")
     ap.add_argument("--interval", type=int, default=60, choices=[30, 60], help="Minutes per sample (30 or 60)")
     ap.add_argument("--tz", default="UTC", help="Only used for interpreting date-only inputs. Ex: America/Chicago")
     ap.add_argument("--tilt", type=float, default=None, help="Panel tilt degrees (0=flat). If set, tries to compute POA with pvlib.")
     ap.add_argument("--azimuth", type=float, default=None, help="Panel azimuth degrees (180=south in N hemisphere).")
-    ap.add_argument("--out", default="nsrdb_filtered.csv", help="Output CSV filename")
+    ap.add_argument("--out", default=None, help="Output CSV filename (default: nsrdb_filtered.csv, or nsrdb_sites_summary.csv with --sites)")
+    ap.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR), help="Download cache directory")
+    ap.add_argument("--cache-max-mb", type=float, default=DEFAULT_CACHE_MAX_MB, help=f"Cache size limit in MB (default: {DEFAULT_CACHE_MAX_MB})")
+    ap.add_argument("--no-cache", action="store_true", help="Always download; don't read or write the cache")
+    ap.add_argument("--offline", action="store_true", help="Use cached data only; fail if anything is missing")
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help=f"Concurrent downloads (default: {DEFAULT_WORKERS})")
+    ap.add_argument("--min-request-interval", type=float, default=DEFAULT_MIN_REQUEST_INTERVAL_S,
+                    help=f"Minimum seconds between download starts across workers (default: {DEFAULT_MIN_REQUEST_INTERVAL_S})")
+    ap.add_argument("--tilt-grid", default=None, help="Evaluate panel tilts START:STOP:STEP or a,b,c (default with --azimuth-grid: 0:60:5)")
+    ap.add_argument("--azimuth-grid", default=None, help="Evaluate panel azimuths START:STOP:STEP or a,b,c (default with --tilt-grid: 90:270:15)")
+    ap.add_argument("--grid-out", default="nsrdb_orientation_grid.csv", help="Output CSV for the orientation grid")
+    ap.add_argument("--processes", type=int, default=None, help="Worker processes for the grid (default: one per CPU)")
+    ap.add_argument("--base-url", default=NSRDB_PSM3_CSV_URL, help=argparse.SUPPRESS)
 
     args = ap.parse_args()
 
@@ -295,43 +945,49 @@ def main() -> int:
     if end_utc <= start_utc:
         print("ERROR: --end must be after --start", file=sys.stderr)
         return 2
+    if args.offline and args.no_cache:
+        print("ERROR: --offline needs the cache (drop --no-cache)", file=sys.stderr)
+        return 2
+    if not args.offline and not (args.api_key and args.email):
+        print("ERROR: --api-key and --email are required unless --offline", file=sys.stderr)
+        return 2
+    if (args.sites is None) == (args.lat is None or args.lon is None):
+        print("ERROR: give either --lat and --lon, or --sites", file=sys.stderr)
+        return 2
 
-    # Download years spanned by [start, end)
-    years = sorted({start_utc.year, end_utc.year})
-    all_rows: List[NsrdbRow] = []
+    cache = None if args.no_cache else NsrdbCache(args.cache_dir, int(args.cache_max_mb * 2**20))
 
-    # Minimal set of attributes we need
-    attrs = ["ghi", "dni", "dhi"]
+    if args.sites:
+        return run_batch(args, start_utc, end_utc, cache)
 
-    for y in years:
-        blob = nsrdb_download_csv(
-            api_key=args.api_key,
-            email=args.email,
-            lat=args.lat,
-            lon=args.lon,
-            year=y,
-            interval_minutes=args.interval,
-            attributes=attrs,
-        )
-        header, data_rows = find_header_and_rows(blob)
-        parsed = parse_nsrdb_rows(header, data_rows)
-        all_rows.extend(parsed)
+    # Download years spanned by [start, end) (minimal set of attributes we need)
+    point = (args.lat, args.lon)
+    loaded = fetch_sites(
+        [point], years_spanned(start_utc, end_utc), args.interval, ["ghi", "dni", "dhi"], cache,
+        args.api_key, args.email, offline=args.offline, workers=args.workers,
+        min_interval_s=args.min_request_interval, base_url=args.base_url,
+    )[point][1]
+    if isinstance(loaded, CacheMiss):
+        print(f"ERROR: --offline and {loaded}", file=sys.stderr)
+        return 1
+    if isinstance(loaded, Exception):
+        raise loaded
 
     # Filter
-    kept = filter_by_range(all_rows, start_utc, end_utc)
+    kept = filter_by_range(loaded, start_utc, end_utc)
 
-    if not kept:
+    if not len(kept):
         print("No rows in the requested range after filtering. Check your dates/timezone.", file=sys.stderr)
         return 1
 
     # Horizontal energy (kWh/m^2) over the range
-    horiz_kwh_m2 = energy_kwh_per_m2(kept, args.interval)
+    horiz_kwh_m2 = energy_kwh_per_m2(kept.ghi, args.interval)
 
     # Optional POA
-    poa_global: Optional[List[float]] = None
+    poa_global: Optional[np.ndarray] = None
     if args.tilt is not None and args.azimuth is not None:
         poa = maybe_add_poa_with_pvlib(
-            rows=kept,
+            series=kept,
             lat=args.lat,
             lon=args.lon,
             tilt_deg=args.tilt,
@@ -344,24 +1000,24 @@ def main() -> int:
             poa_global = poa[0]
 
     # Write output CSV
-    with open(args.out, "w", newline="", encoding="utf-8") as f:
+    out = args.out or "nsrdb_filtered.csv"
+    with open(out, "w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
-        w.writerow(["ts_utc", "GHI_Wm2", "DNI_Wm2", "DHI_Wm2"] + (["POA_Wm2"] if poa_global else []))
-        for i, x in enumerate(kept):
-            row = [x.ts_utc.isoformat().replace("+00:00", "Z"), x.ghi, x.dni, x.dhi]
-            if poa_global:
-                row.append(poa_global[i])
-            w.writerow(row)
+        w.writerow(["ts_utc", "GHI_Wm2", "DNI_Wm2", "DHI_Wm2"] + (["POA_Wm2"] if poa_global is not None else []))
+        iso = np.char.add(np.datetime_as_string(kept.ts_utc.astype("datetime64[s]"), unit="s"), "Z")
+        cols = [iso, kept.ghi, kept.dni, kept.dhi] + ([poa_global.tolist()] if poa_global is not None else [])
+        w.writerows(zip(*cols))
 
     # Print summary
-    print(f"Wrote: {args.out}")
+    print(f"Wrote: {out}")
     print(f"Range (UTC): {start_utc.isoformat()} → {end_utc.isoformat()}")
     print(f"Horizontal-plane sunlight energy (integrated GHI): {horiz_kwh_m2:.3f} kWh/m^2 over range")
-    if poa_global:
+    if poa_global is not None:
         # integrate POA too
-        dt_hours = args.interval / 60.0
-        poa_wh_m2 = sum(v * dt_hours for v in poa_global if v == v)
-        print(f"Panel-plane sunlight energy (integrated POA): {(poa_wh_m2/1000.0):.3f} kWh/m^2 over range")
+        print(f"Panel-plane sunlight energy (integrated POA): {energy_kwh_per_m2(poa_global, args.interval):.3f} kWh/m^2 over range")
+
+    if args.tilt_grid or args.azimuth_grid:
+        run_grid(args, [(f"{args.lat},{args.lon}", args.lat, args.lon, kept)])
 
     return 0
 
@@ -0,0 +1,83 @@
+"""
+conftest.py
+
+Shared test setup: soildata on sys.path (as the scripts do) and a local HTTP
+stand-in for the web APIs (ThingSpeak, NSRDB), so nothing talks to the
+internet.
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+class StandIn:
+    """
+    Serves `handler(method, path, query, body) -> (status, headers, body)`
+    on 127.0.0.1. `query` holds the last value of each parameter, `body` the
+    decoded JSON body (or None). Every request is recorded in `requests`.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+        self.lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _serve(self):
+                url = urlsplit(self.path)
+                query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                with stand_in.lock:
+                    stand_in.requests.append((self.command, url.path, query, body))
+                status, headers, payload = stand_in.handler(self.command, url.path, query, body)
+                if not isinstance(payload, bytes):
+                    payload = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = _serve
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stand_in():
+    """
+    stand_in(handler) -> running StandIn; shut down after the test.
+    """
+    servers = []
+
+    def start(handler):
+        server = StandIn(handler)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
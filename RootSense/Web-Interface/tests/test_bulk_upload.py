@@ -0,0 +1,144 @@
+"""
+test_bulk_upload.py
+
+bulk_update retries and thingspeak-bulk-upload.py resume behaviour against a
+stand-in ThingSpeak channel that stores what it is sent.
+"""
+
+from __future__ import annotations
+
+import json
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+import requests
+
+from soildata.thingspeak import bulk_update, make_session
+
+SCRIPT = Path(__file__).resolve().parent.parent / "prep-thingspeak-upload" / "thingspeak-bulk-upload.py"
+
+
+class Channel:
+    """
+    Stand-in channel 7: bulk_update.json stores entries, feeds.json reads them
+    back. `answers` scripts the bulk responses: an int status (nothing
+    stored unless 200), "slow" (store, then answer too late) or "lost"
+    (answer too late, store nothing). Once `answers` runs out every batch is
+    stored with a 200.
+    """
+
+    def __init__(self, answers=()):
+        self.answers = list(answers)
+        self.entries = []
+        self.lock = threading.Lock()
+
+    def __call__(self, method, path, query, body):
+        if method == "POST" and path == "/channels/7/bulk_update.json":
+            with self.lock:
+                answer = self.answers.pop(0) if self.answers else 200
+            if answer in (200, "slow"):
+                with self.lock:
+                    self.entries += body["updates"]
+            if answer in ("slow", "lost"):
+                time.sleep(1.5)
+                answer = 200
+            headers = {"Retry-After": "0"} if answer == 429 else {}
+            return answer, headers, {"success": answer == 200}
+        if method == "GET" and path == "/channels/7/feeds.json":
+            with self.lock:
+                feeds = [
+                    {"created_at": e["created_at"], **{k: v for k, v in e.items() if k.startswith("field")}}
+                    for e in self.entries
+                    if query["start"] <= e["created_at"].replace("T", " ").replace("Z", "") <= query["end"]
+                ]
+            return 200, {}, {"channel": {"id": 7}, "feeds": feeds}
+        return 404, {}, {"error": "not found"}
+
+
+def updates(n, first=0):
+    return [{"created_at": f"2026-01-10T00:{i // 60:02d}:{i % 60:02d}Z", "field1": "@w1q", "field2": f"Moist,+{i:06.2f}"}
+            for i in range(first, first + n)]
+
+
+def post(server, batch, **kw):
+    sleeps = []
+    with make_session(1) as session:
+        out = bulk_update(session, 7, "KEY", batch, base_url=server.url, backoff_s=0.01,
+                          sleep=sleeps.append, **kw)
+    return out, sleeps
+
+
+def posts(server):
+    return [r for r in server.requests if r[0] == "POST"]
+
+
+def test_rate_limit_and_server_errors_are_retried(stand_in):
+    channel = Channel([429, 503])
+    server = stand_in(channel)
+
+    out, sleeps = post(server, updates(5))
+
+    assert out == {"success": True}
+    assert len(posts(server)) == 3
+    assert sleeps[0] == 0  # Retry-After honoured
+    assert len(channel.entries) == 5
+
+
+def test_read_timeout_after_the_batch_was_stored_is_not_resent(stand_in):
+    channel = Channel(["slow"])
+    server = stand_in(channel)
+
+    out, _ = post(server, updates(5), timeout_s=0.5)
+
+    assert out == {"success": True, "verified": True}
+    assert len(posts(server)) == 1
+    assert len(channel.entries) == 5
+
+
+def test_read_timeout_without_the_batch_is_resent(stand_in):
+    channel = Channel(["lost"])
+    server = stand_in(channel)
+
+    out, _ = post(server, updates(5), timeout_s=0.5)
+
+    assert out == {"success": True}
+    assert len(posts(server)) == 2
+    assert len(channel.entries) == 5
+
+
+def test_connect_errors_are_retried_without_checking():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]  # nothing listens here once closed
+    sleeps = []
+    with make_session(1) as session, pytest.raises(requests.ConnectionError):
+        bulk_update(session, 7, "KEY", updates(2), base_url=f"http://127.0.0.1:{port}",
+                    max_retries=2, sleep=sleeps.append)
+    assert len(sleeps) == 2
+
+
+def test_interrupted_upload_resumes_after_the_last_stored_batch(stand_in, tmp_path):
+    csv_path = tmp_path / "edited.csv"
+    rows = updates(25)
+    csv_path.write_text("created_at,field1,field2\n"
+                        + "".join(f'{r["created_at"]},{r["field1"]},"{r["field2"]}"\n' for r in rows),
+                        encoding="utf-8")
+    channel = Channel([200, 400])  # second batch is rejected outright
+    server = stand_in(channel)
+    cmd = [sys.executable, str(SCRIPT), str(csv_path), "--channel", "7", "--write-key", "KEY",
+           "--batch", "10", "--interval", "0", "--base-url", server.url]
+
+    first = subprocess.run(cmd, capture_output=True, text=True)
+    assert first.returncode == 1
+    checkpoint = json.loads((tmp_path / "edited.csv.upload.json").read_text())
+    assert checkpoint["rows_done"] == 10
+
+    second = subprocess.run(cmd, capture_output=True, text=True)
+    assert second.returncode == 0, second.stderr
+    assert "Resuming after 10 rows" in second.stdout
+    assert [e["created_at"] for e in channel.entries] == [r["created_at"] for r in rows]
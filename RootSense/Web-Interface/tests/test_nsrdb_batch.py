@@ -0,0 +1,90 @@
+"""
+test_nsrdb_batch.py
+
+nsrdb_panel_sunlight.fetch_sites against a stand-in PSM3 endpoint whose grid
+is not the one a client would guess (0.04 degree cells centred on .02
+offsets): sites are grouped by the cell the API returns.
+"""
+
+from __future__ import annotations
+
+import math
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "sunlight-analysis"))
+import nsrdb_panel_sunlight as nsrdb
+
+YEARS = [2020, 2021]
+ATTRS = ["ghi", "dni", "dhi"]
+
+
+def centre(v):
+    return round(math.floor(v / 0.04) * 0.04 + 0.02, 2)
+
+
+def psm3(method, path, query, body):
+    lon, lat = map(float, query["wkt"][len("POINT("):-1].split())
+    if lat > 80:
+        return 400, {}, {"errors": ["outside the NSRDB domain"]}
+    year = int(query["names"])
+    clat, clon = centre(lat), centre(lon)
+    lines = ["Source,Location ID,City,State,Country,Latitude,Longitude,Time Zone,Elevation",
+             f"NSRDB,1,-,-,-,{clat},{clon},0,5",
+             "Year,Month,Day,Hour,Minute,GHI,DNI,DHI"]
+    lines += [f"{year},1,{d},{h},0,{400 if 10 <= h <= 14 else 0},0,0" for d in range(1, 4) for h in range(24)]
+    return 200, {}, ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def fetch(server, points, cache, **kw):
+    return nsrdb.fetch_sites(points, YEARS, 60, ATTRS, cache, "KEY", "me@example.com",
+                             min_interval_s=0, base_url=server.url + "/psm3.csv", **kw)
+
+
+def wkts(server):
+    return [r[2]["wkt"] for r in server.requests]
+
+
+def test_sites_in_one_returned_cell_share_its_downloads(stand_in, tmp_path):
+    server = stand_in(psm3)
+    same_a, same_b, other = (40.001, -90.001), (40.035, -90.035), (40.05, -90.05)  # a, b: one cell
+
+    out = fetch(server, [same_a, same_b, other], nsrdb.NsrdbCache(tmp_path))
+
+    assert out[same_a][0] == out[same_b][0] == (40.02, -90.02)
+    assert out[other][0] == (40.06, -90.06)
+    # First year once per site (that's how the cell is learned), later years once per cell
+    assert len(server.requests) == 3 + 2
+    assert all(f"POINT({lon} {lat})" in wkts(server) for lat, lon in (same_a, same_b, other))
+    for cell, series in out.values():
+        assert len(series.ts_utc) == len(YEARS) * 3 * 24
+
+
+def test_known_cells_are_served_from_the_cache(stand_in, tmp_path):
+    server = stand_in(psm3)
+    points = [(40.001, -90.001), (40.05, -90.05)]
+    fetch(server, points, nsrdb.NsrdbCache(tmp_path))
+    before = len(server.requests)
+
+    again = fetch(server, points, nsrdb.NsrdbCache(tmp_path))
+    offline = fetch(server, points, nsrdb.NsrdbCache(tmp_path), offline=True)
+
+    assert len(server.requests) == before
+    assert {p: c for p, (c, _) in again.items()} == {p: c for p, (c, _) in offline.items()}
+
+
+def test_a_failing_site_does_not_sink_the_batch(stand_in, tmp_path):
+    server = stand_in(psm3)
+    good, bad = (40.001, -90.001), (85.0, -90.0)
+
+    out = fetch(server, [good, bad], nsrdb.NsrdbCache(tmp_path))
+
+    assert out[bad][0] is None and isinstance(out[bad][1], Exception)
+    assert out[good][0] == (40.02, -90.02) and not isinstance(out[good][1], Exception)
+
+
+def test_offline_miss_is_reported_per_site(stand_in, tmp_path):
+    server = stand_in(psm3)
+    out = fetch(server, [(40.001, -90.001)], nsrdb.NsrdbCache(tmp_path), offline=True)
+    assert isinstance(out[(40.001, -90.001)][1], nsrdb.CacheMiss)
+    assert server.requests == []
@@ -0,0 +1,79 @@
+"""
+test_thingspeak_range.py
+
+fetch_feeds_range against a stand-in feeds.json that enforces a row cap the
+way ThingSpeak does (the newest `results` entries of the requested range).
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import requests
+
+from soildata.thingspeak import fetch_feeds_range
+
+T0 = datetime(2026, 1, 10, tzinfo=timezone.utc)
+STEP_S = 600  # one entry every 10 minutes
+
+
+def make_entries(days: int):
+    return [
+        {"entry_id": i + 1,
+         "created_at": (T0 + timedelta(seconds=i * STEP_S)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+         "field1": "@w1q", "field2": f"Moist,+{i % 100:06.2f}"}
+        for i in range(days * 86400 // STEP_S)
+    ]
+
+
+def feeds_handler(entries, cap):
+    def parse(value):
+        return datetime.strptime(value, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+
+    def handler(method, path, query, body):
+        if path != "/channels/42/feeds.json":
+            return 404, {}, {"error": "not found"}
+        start, end = parse(query["start"]), parse(query["end"])
+        hits = [e for e in entries
+                if start <= datetime.strptime(e["created_at"], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc) <= end]
+        limit = min(int(query.get("results", cap)), cap)
+        return 200, {}, {"channel": {"id": 42, "name": "stand-in"}, "feeds": hits[-limit:]}
+
+    return handler
+
+
+def test_full_windows_are_bisected_until_nothing_is_truncated(stand_in):
+    entries = make_entries(days=3)  # 144 entries a day
+    server = stand_in(feeds_handler(entries, cap=50))
+
+    data = fetch_feeds_range(42, T0, T0 + timedelta(days=3), window=timedelta(days=1),
+                             max_workers=3, max_results=50, base_url=server.url)
+
+    assert [f["entry_id"] for f in data["feeds"]] == [e["entry_id"] for e in entries]
+    assert data["channel"]["name"] == "stand-in"
+    assert len(server.requests) > 3  # the three day windows were split
+
+
+def test_window_edges_do_not_duplicate_entries(stand_in):
+    entries = make_entries(days=1)
+    server = stand_in(feeds_handler(entries, cap=8000))
+
+    # 10-minute windows: every edge lands exactly on an entry (start and end are inclusive)
+    data = fetch_feeds_range(42, T0, T0 + timedelta(hours=6), window=timedelta(minutes=10),
+                             max_workers=4, base_url=server.url)
+
+    ids = [f["entry_id"] for f in data["feeds"]]
+    assert ids == sorted(set(ids))
+    assert ids == list(range(1, 6 * 6 + 2))
+
+
+def test_http_error_raises(stand_in):
+    server = stand_in(lambda *a: (500, {}, {"error": "boom"}))
+    with pytest.raises(requests.HTTPError):
+        fetch_feeds_range(42, T0, T0 + timedelta(days=2), base_url=server.url)
+
+
+def test_empty_range_is_rejected():
+    with pytest.raises(ValueError):
+        fetch_feeds_range(42, T0, T0)